@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Low-overhead self-instrumentation for the upload agent.
+
+Latencies and sizes go into fixed log-spaced histograms, so recording a
+value is one bisect and two additions under a lock and memory use does not
+grow with uptime. The agent's own CPU and RSS come from the process clock
+and /proc/self/statm.
+"""
+import bisect
+import threading
+import time
+
+import procfs_reader
+
+# Bucket upper bounds, about x2 apart: 0.05 ms .. ~105 s and 64 B .. 128 MB.
+LATENCY_BOUNDS_MS = tuple(0.05 * 2 ** i for i in range(22))
+SIZE_BOUNDS_BYTES = tuple(64 * 2 ** i for i in range(22))
+
+
+class Histogram:
+    """Counts of values in fixed buckets, plus count, total and max."""
+
+    def __init__(self, bounds=LATENCY_BOUNDS_MS):
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (capped at the max seen)."""
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                bound = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self, unit):
+        if not self.count:
+            return "no samples"
+        return (f"n={self.count} mean={self.mean:.2f}{unit} p50<={self.percentile(50):.2f}{unit} "
+                f"p95<={self.percentile(95):.2f}{unit} max={self.max:.2f}{unit}")
+
+
+class AgentStats:
+    """Latency histograms, payload sizes and resource use of the agent.
+
+    The *_total histograms cover the whole run (for report()); the others
+    cover the time since the last metrics() call and are what gets published.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collectors = {}
+        self.ticks_total = Histogram()
+        self.uploads_total = Histogram()
+        self.payload_bytes = Histogram(SIZE_BOUNDS_BYTES)
+        self.ticks = Histogram()
+        self.uploads = Histogram()
+        self.uploader = None  # the BulkUploader whose byte and retry totals report() includes
+        self.started = (time.process_time(), time.monotonic())
+        self._cpu_since = self.started
+
+    def record_collector(self, name, seconds):
+        with self.lock:
+            histogram = self.collectors.get(name)
+            if histogram is None:
+                histogram = self.collectors[name] = Histogram()
+            histogram.record(seconds * 1000.0)
+
+    def record_tick(self, seconds):
+        with self.lock:
+            self.ticks.record(seconds * 1000.0)
+            self.ticks_total.record(seconds * 1000.0)
+
+    def record_upload(self, seconds, wire_bytes):
+        with self.lock:
+            self.uploads.record(seconds * 1000.0)
+            self.uploads_total.record(seconds * 1000.0)
+            self.payload_bytes.record(wire_bytes)
+
+    def cpu_percent(self, since):
+        """CPU time of the whole process (all threads) as a percentage of one core."""
+        cpu, wall = since
+        elapsed = time.monotonic() - wall
+        return (time.process_time() - cpu) / elapsed * 100.0 if elapsed > 0 else 0.0
+
+    def metrics(self):
+        """Agent keys for the interval since the previous call."""
+        with self.lock:
+            tick_ms = self.ticks.percentile(95)
+            upload_ms = self.uploads.percentile(95)
+            self.ticks.reset()
+            self.uploads.reset()
+        cpu_percent = self.cpu_percent(self._cpu_since)
+        self._cpu_since = (time.process_time(), time.monotonic())
+        return {
+            "Agent_Tick_ms": tick_ms,
+            "Agent_Upload_ms": upload_ms,
+            "Agent_CPU_Percent": cpu_percent,
+            "Agent_RSS_MB": procfs_reader.read_rss_bytes() / 1024.0 / 1024.0
+        }
+
+    def report(self):
+        """Multi-line summary of the whole run."""
+        with self.lock:
+            lines = [f"ticks:            {self.ticks_total.summary(' ms')}"]
+            for name in sorted(self.collectors):
+                lines.append(f"  {name:<16}{self.collectors[name].summary(' ms')}")
+            lines.append(f"uploads:          {self.uploads_total.summary(' ms')}")
+            lines.append(f"payload bytes:    {self.payload_bytes.summary(' B')}")
+        uploader = self.uploader
+        if uploader is not None:
+            lines.append(f"upload bytes:     {uploader.raw_bytes} encoded, {uploader.wire_bytes} on the wire "
+                         f"in {uploader.requests} requests, {uploader.retries} retried")
+        lines.append(f"agent CPU:        {self.cpu_percent(self.started):.2f}% of one core")
+        lines.append(f"agent RSS:        {procfs_reader.read_rss_bytes() / 1024.0 / 1024.0:.1f} MB")
+        return "\n".join(lines)
+
+
+def agent_collector(context, interval):
+    """Collector factory (see collectors.REGISTRY): the agent's own keys."""
+    return context['agent_stats'].metrics
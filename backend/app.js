@@ -5,11 +5,12 @@ const cors = require('cors');
 const helmet = require('helmet');
 const morgan = require('morgan');
 const logger = require('./utils/logger');
-const yaml = require('yamljs');
-const config = yaml.load('./config/config.yaml');
+const config = require('./config');
 
 // Middleware
-app.use(express.json());
+// Agents send gzip-compressed bulk bodies (Content-Encoding: gzip); `limit`
+// applies to the inflated size.
+app.use(express.json({ inflate: true, limit: config.server.bodyLimit || '5mb' }));
 app.use(cors());
 app.use(helmet());
 
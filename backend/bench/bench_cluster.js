@@ -0,0 +1,109 @@
+// bench/bench_cluster.js
+// Upload throughput against the number of backend worker processes.
+//
+// For each count in --workers it starts `node server.js` with WORKERS set to
+// it on --port, waits for the port, runs --clients processes of
+// bench/bench_ingest.js against it at once and adds up their requests per
+// second, then stops the backend. Needs what server.js needs (config,
+// certificates, MongoDB) and, like bench_ingest.js, the Bench_* keys and
+// the device.
+//
+//   node bench/bench_cluster.js --token <JWT> --device bench --workers 1,2,4,8 --clients 4
+const { spawn } = require('child_process');
+const path = require('path');
+const tls = require('tls');
+
+const option = (name, fallback) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index >= 0 ? process.argv[index + 1] : fallback;
+};
+
+const TOKEN = option('token', process.env.TOKEN);
+const DEVICE = option('device', 'bench');
+const PORT = Number(option('port', 3443));
+const WORKER_COUNTS = option('workers', '1,2,4').split(',').map(Number);
+const CLIENTS = Number(option('clients', 4));
+const CONCURRENCY = Number(option('concurrency', 16));
+const REQUESTS = Number(option('requests', 200));
+const BACKEND = path.join(__dirname, '..');
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+const waitForPort = async () => {
+  for (let attempt = 0; attempt < 100; attempt++) {
+    const open = await new Promise(resolve => {
+      const socket = tls.connect({ port: PORT, host: '127.0.0.1', rejectUnauthorized: false }, () => {
+        socket.end();
+        resolve(true);
+      });
+      socket.on('error', () => resolve(false));
+    });
+    if (open) {
+      return;
+    }
+    await sleep(200);
+  }
+  throw new Error(`The backend did not open port ${PORT}.`);
+};
+
+// Runs one bench_ingest.js client; resolves with its requests per second
+const client = (_, index) => new Promise((resolve, reject) => {
+  const child = spawn(process.execPath, [
+    path.join(__dirname, 'bench_ingest.js'),
+    '--url', `https://127.0.0.1:${PORT}/api`, '--token', TOKEN, '--device', DEVICE,
+    '--concurrency', String(CONCURRENCY), '--requests', String(REQUESTS),
+    '--offset-ms', String(index * 60 * 60 * 1000)
+  ], { cwd: BACKEND });
+  let output = '';
+  child.stdout.on('data', chunk => {
+    output += chunk;
+  });
+  child.stderr.on('data', chunk => {
+    output += chunk;
+  });
+  child.on('exit', code => {
+    const match = output.match(/(\d+) req\/s/);
+    if (code !== 0 || !match) {
+      reject(new Error(`bench_ingest.js failed:\n${output}`));
+    } else {
+      resolve(Number(match[1]));
+    }
+  });
+});
+
+const measure = async (workers) => {
+  const backend = spawn(process.execPath, ['server.js'], {
+    cwd: BACKEND,
+    env: { ...process.env, WORKERS: String(workers), PORT: String(PORT) },
+    stdio: 'ignore'
+  });
+  try {
+    await waitForPort();
+    // Let every worker connect to MongoDB
+    await sleep(1000);
+    const rates = await Promise.all(Array.from({ length: CLIENTS }, client));
+    const total = rates.reduce((sum, rate) => sum + rate, 0);
+    console.log(`${String(workers).padStart(7)} ${String(total).padStart(10)} req/s`);
+    return total;
+  } finally {
+    const exited = new Promise(resolve => backend.once('exit', resolve));
+    backend.kill('SIGTERM');
+    await exited;
+  }
+};
+
+const main = async () => {
+  if (!TOKEN) {
+    throw new Error('Pass --token <JWT> or set TOKEN.');
+  }
+  console.log(`${CLIENTS} clients x ${CONCURRENCY} connections, ${REQUESTS} requests each`);
+  console.log(`${'workers'.padStart(7)} ${'throughput'.padStart(16)}`);
+  for (const workers of WORKER_COUNTS) {
+    await measure(workers);
+  }
+};
+
+main().catch(err => {
+  console.error(err);
+  process.exit(1);
+});
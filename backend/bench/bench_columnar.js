@@ -0,0 +1,162 @@
+// bench/bench_columnar.js
+// Payload size and server CPU per 10k points: /data/bulk rows vs /data/columnar.
+//
+// Builds the same points in both formats, then measures what the server does
+// with each body before it reaches MongoDB: gunzip, parse (JSON or
+// MessagePack) and validation/expansion into DataValue documents. The row
+// path mirrors uploadDataValues, including its awaited per-point validation;
+// the columnar path calls utils/columnar.js as uploadColumnarValues does.
+// Mongoose's own casting in insertMany (skipped with lean on the columnar
+// path) is not included.
+//
+//   node bench/bench_columnar.js --keys 10 --rows 1000 --iterations 50
+const zlib = require('zlib');
+const { checkColumnarBatch, expandColumnarBatch } = require('../utils/columnar');
+const { decode } = require('../utils/msgpack');
+
+const arg = (name, fallback) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index >= 0 ? Number(process.argv[index + 1]) : fallback;
+};
+
+const KEYS = arg('keys', 10);
+const ROWS = arg('rows', 1000);
+const ITERATIONS = arg('iterations', 50);
+
+// Just enough MessagePack encoding to produce the bodies the agent sends.
+const encode = (value) => {
+  const chunks = [];
+  const header = (small, base, length) => {
+    if (length < small) chunks.push(Buffer.from([base + length]));
+    else if (length < 0x10000) { const b = Buffer.alloc(3); b[0] = base === 0xa0 ? 0xda : base === 0x90 ? 0xdc : 0xde; b.writeUInt16BE(length, 1); chunks.push(b); }
+    else { const b = Buffer.alloc(5); b[0] = base === 0xa0 ? 0xdb : base === 0x90 ? 0xdd : 0xdf; b.writeUInt32BE(length, 1); chunks.push(b); }
+  };
+  const write = (v) => {
+    if (v === null || v === undefined) chunks.push(Buffer.from([0xc0]));
+    else if (typeof v === 'boolean') chunks.push(Buffer.from([v ? 0xc3 : 0xc2]));
+    else if (typeof v === 'number') {
+      if (Number.isInteger(v) && v >= 0 && v < 128) chunks.push(Buffer.from([v]));
+      else { const b = Buffer.alloc(9); b[0] = 0xcb; b.writeDoubleBE(v, 1); chunks.push(b); }
+    } else if (typeof v === 'string') {
+      const s = Buffer.from(v, 'utf8');
+      header(32, 0xa0, s.length);
+      chunks.push(s);
+    } else if (Array.isArray(v)) {
+      header(16, 0x90, v.length);
+      v.forEach(write);
+    } else {
+      const entries = Object.entries(v);
+      header(16, 0x80, entries.length);
+      entries.forEach(([k, item]) => { write(k); write(item); });
+    }
+  };
+  write(value);
+  return Buffer.concat(chunks);
+};
+
+// Same checks and conversion as uploadDataValues in controllers/dataController.js
+const validateDataType = async (key, value, dataType) => {
+  if (dataType.dataType === 'float' && typeof value !== 'number') {
+    throw new Error(`Value for key '${key}' must be a number.`);
+  }
+  return dataType;
+};
+
+const parseAggregate = (key, agg) => {
+  if (agg === undefined || agg === null) {
+    return undefined;
+  }
+  const { min, max, mean, count } = agg;
+  if (![min, max, mean, count].every(v => typeof v === 'number' && Number.isFinite(v))) {
+    throw new Error(`Aggregate for key '${key}' must have numeric min, max, mean and count.`);
+  }
+  return { min, max, mean, count };
+};
+
+const processRows = async (dataValues, dataTypeMap) => {
+  const processed = [];
+  for (const data of dataValues) {
+    const { key, machine, value, timestamp, agg } = data;
+    if (!key || !machine || value === undefined) {
+      throw new Error('Each data value must include key, machine, and value.');
+    }
+    const target = dataTypeMap[key];
+    let convertedValue = value;
+    if (typeof value !== 'number') {
+      convertedValue = parseFloat(value);
+    }
+    await validateDataType(key, convertedValue, target);
+    processed.push({
+      key, machine, value: convertedValue,
+      timestamp: timestamp ? new Date(timestamp) : undefined,
+      agg: parseAggregate(key, agg)
+    });
+  }
+  return processed;
+};
+
+const buildPoints = () => {
+  const start = Date.UTC(2024, 4, 1);
+  const keys = Array.from({ length: KEYS }, (_, i) => `Metric_${i}`);
+  const rows = [];
+  const columnar = { machine: '01', timestamps: [], values: {}, agg: {} };
+  keys.forEach(key => { columnar.values[key] = []; columnar.agg[key] = []; });
+  for (let r = 0; r < ROWS; r++) {
+    const timestamp = new Date(start + r * 5000).toISOString().replace('.000Z', 'Z');
+    columnar.timestamps.push(timestamp);
+    keys.forEach((key, k) => {
+      const value = Math.round((30 + k + Math.sin(r / 20) * 5) * 100) / 100;
+      const agg = { min: value - 0.5, max: value + 0.5, mean: value, count: 5 };
+      rows.push({ key, machine: '01', value, timestamp, agg });
+      columnar.values[key].push(value);
+      columnar.agg[key].push(agg);
+    });
+  }
+  const dataTypeMap = {};
+  keys.forEach(key => { dataTypeMap[key] = { keyName: key, dataType: 'float' }; });
+  return { rows, columnar, dataTypeMap };
+};
+
+const measure = async (label, body, handle) => {
+  const gzipped = zlib.gzipSync(body, { level: 6 });
+  let documents = 0;
+  const cpuStart = process.cpuUsage();
+  const wallStart = process.hrtime.bigint();
+  for (let i = 0; i < ITERATIONS; i++) {
+    documents = (await handle(zlib.gunzipSync(gzipped))).length;
+  }
+  const wall = Number(process.hrtime.bigint() - wallStart) / 1e6 / ITERATIONS;
+  const cpu = process.cpuUsage(cpuStart);
+  const cpuMs = (cpu.user + cpu.system) / 1000 / ITERATIONS;
+  const per10k = 10000 / documents;
+  console.log(`${label.padEnd(22)} ${String(body.length).padStart(9)} B ${String(gzipped.length).padStart(8)} B gz `
+    + `${(body.length * per10k / 1024).toFixed(1).padStart(8)} KiB/10k ${(cpuMs * per10k).toFixed(2).padStart(8)} ms CPU/10k `
+    + `(${(wall * per10k).toFixed(2)} ms wall)`);
+};
+
+const main = async () => {
+  const { rows, columnar, dataTypeMap } = buildPoints();
+  const roundTrip = JSON.stringify(decode(encode(columnar)));
+  if (roundTrip !== JSON.stringify(columnar)) {
+    throw new Error('MessagePack round trip changed the batch.');
+  }
+
+  console.log(`${KEYS} keys x ${ROWS} timestamps = ${rows.length} points, ${ITERATIONS} iterations`);
+  console.log(`${'format'.padEnd(22)} ${'body'.padStart(11)} ${'gzipped'.padStart(11)}`);
+  await measure('bulk rows (JSON)', Buffer.from(JSON.stringify(rows)),
+    body => processRows(JSON.parse(body), dataTypeMap));
+  const expand = (batch) => {
+    const problem = checkColumnarBatch(batch);
+    if (problem) {
+      throw new Error(problem);
+    }
+    return expandColumnarBatch(batch, dataTypeMap, parseAggregate);
+  };
+  await measure('columnar (JSON)', Buffer.from(JSON.stringify(columnar)), body => expand(JSON.parse(body)));
+  await measure('columnar (MessagePack)', encode(columnar), body => expand(decode(body)));
+};
+
+main().catch(err => {
+  console.error(err);
+  process.exit(1);
+});
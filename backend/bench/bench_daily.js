@@ -0,0 +1,125 @@
+// bench/bench_daily.js
+// Latency and payload size of GET /api/data/daily for 1h, 24h and 7d ranges,
+// with every raw point and downsampled with points=N.
+//
+// Runs against a live backend. With --seed it first uploads --days of
+// synthetic points at --step-s resolution for --keys float keys (Bench_0,
+// Bench_1, ...) to --device through /api/data/columnar. The keys and the
+// device must exist (create them with backend_script.py); seeding again is
+// harmless, duplicates are skipped.
+//
+//   node bench/bench_daily.js --url https://localhost:3000/api --token <JWT> --device bench --seed
+//   node bench/bench_daily.js --url https://localhost:3000/api --token <JWT> --device bench --iterations 10
+const http = require('http');
+const https = require('https');
+const zlib = require('zlib');
+
+const option = (name, fallback) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index >= 0 ? process.argv[index + 1] : fallback;
+};
+
+const URL_BASE = option('url', 'https://localhost:3000/api');
+const TOKEN = option('token', process.env.TOKEN);
+const DEVICE = option('device', 'bench');
+const KEYS = Array.from({ length: Number(option('keys', 11)) }, (_, i) => `Bench_${i}`);
+const ITERATIONS = Number(option('iterations', 5));
+const POINTS = Number(option('points', 1000));
+const DAYS = Number(option('days', 7));
+const STEP_S = Number(option('step-s', 5));
+const RANGES = ['1h', '24h', '168h'];
+
+const request = (method, path, body, headers = {}) => new Promise((resolve, reject) => {
+  const url = new URL(URL_BASE + path);
+  const client = url.protocol === 'https:' ? https : http;
+  const req = client.request(url, {
+    method,
+    headers: { Authorization: `Bearer ${TOKEN}`, ...headers },
+    rejectUnauthorized: false
+  }, (res) => {
+    const chunks = [];
+    res.on('data', chunk => chunks.push(chunk));
+    res.on('end', () => resolve({ status: res.statusCode, body: Buffer.concat(chunks) }));
+  });
+  req.on('error', reject);
+  req.end(body);
+});
+
+// Uploads the synthetic series in columnar batches of one hour
+const seed = async () => {
+  const end = Math.floor(Date.now() / 1000 / STEP_S) * STEP_S;
+  const start = end - DAYS * 86400;
+  const batchSeconds = 3600;
+  let points = 0;
+  for (let from = start; from < end; from += batchSeconds) {
+    const timestamps = [];
+    for (let t = from; t < Math.min(end, from + batchSeconds); t += STEP_S) {
+      timestamps.push(new Date(t * 1000).toISOString());
+    }
+    const values = {};
+    KEYS.forEach((key, k) => {
+      values[key] = timestamps.map((_, i) => {
+        const t = from + i * STEP_S;
+        // A slow wave with a short spike every ~3 hours
+        return Math.round((40 + k + 10 * Math.sin(t / 7200) + (t % 10800 < STEP_S ? 40 : 0)) * 100) / 100;
+      });
+    });
+    const body = zlib.gzipSync(JSON.stringify({ machine: DEVICE, timestamps, values }));
+    const res = await request('POST', '/data/columnar', body,
+      { 'Content-Type': 'application/json', 'Content-Encoding': 'gzip' });
+    if (res.status !== 201) {
+      throw new Error(`Seeding failed with HTTP ${res.status}: ${res.body.toString().slice(0, 200)}`);
+    }
+    points += timestamps.length * KEYS.length;
+  }
+  console.log(`Seeded ${points} points (${KEYS.length} keys x ${DAYS} days at ${STEP_S} s) for device '${DEVICE}'.`);
+};
+
+const median = (values) => {
+  const sorted = values.slice().sort((a, b) => a - b);
+  return sorted[Math.floor(sorted.length / 2)];
+};
+
+const measure = async (range, points) => {
+  const params = new URLSearchParams({ device: DEVICE, range });
+  KEYS.forEach(key => params.append('keys', key));
+  if (points) {
+    params.set('points', points);
+  }
+  const latencies = [];
+  let bytes = 0;
+  let count = 0;
+  for (let i = 0; i < ITERATIONS; i++) {
+    const started = process.hrtime.bigint();
+    const res = await request('GET', `/data/daily?${params}`);
+    latencies.push(Number(process.hrtime.bigint() - started) / 1e6);
+    if (res.status !== 200) {
+      throw new Error(`HTTP ${res.status}: ${res.body.toString().slice(0, 200)}`);
+    }
+    bytes = res.body.length;
+    count = Object.values(JSON.parse(res.body).data).reduce((sum, series) => sum + series.values.length, 0);
+  }
+  const label = points ? `points=${points}` : 'raw';
+  console.log(`${range.padStart(5)} ${label.padEnd(12)} ${median(latencies).toFixed(1).padStart(9)} ms `
+    + `${(bytes / 1024).toFixed(1).padStart(10)} KiB ${String(count).padStart(9)} points`);
+};
+
+const main = async () => {
+  if (!TOKEN) {
+    throw new Error('Pass --token <JWT> or set TOKEN.');
+  }
+  if (process.argv.includes('--seed')) {
+    await seed();
+  }
+  console.log(`${KEYS.length} keys, device '${DEVICE}', median of ${ITERATIONS} requests`);
+  console.log(`${'range'.padStart(5)} ${'mode'.padEnd(12)} ${'latency'.padStart(12)} ${'payload'.padStart(14)} ${'points'.padStart(16)}`);
+  for (const range of RANGES) {
+    await measure(range, null);
+    await measure(range, POINTS);
+  }
+};
+
+main().catch(err => {
+  console.error(err);
+  process.exit(1);
+});
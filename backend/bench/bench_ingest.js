@@ -0,0 +1,91 @@
+// bench/bench_ingest.js
+// Requests per second of POST /api/data/bulk under concurrent load.
+//
+// Runs against a live backend: --concurrency clients each send --requests
+// bulk uploads of --rows points for --keys float keys (Bench_0, Bench_1, ...)
+// to --device, back to back. The keys and the device must exist (create them
+// with backend_script.py). Every request carries new timestamps, so all points
+// are inserted.
+//
+//   node bench/bench_ingest.js --url https://localhost:3000/api --token <JWT> --device bench --concurrency 16
+const http = require('http');
+const https = require('https');
+
+const option = (name, fallback) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index >= 0 ? process.argv[index + 1] : fallback;
+};
+
+const URL_BASE = option('url', 'https://localhost:3000/api');
+const TOKEN = option('token', process.env.TOKEN);
+const DEVICE = option('device', 'bench');
+const KEYS = Array.from({ length: Number(option('keys', 11)) }, (_, i) => `Bench_${i}`);
+const ROWS = Number(option('rows', 10));
+const CONCURRENCY = Number(option('concurrency', 16));
+const REQUESTS = Number(option('requests', 200));
+// Shifts the timestamps, so that clients run side by side do not send the same points
+const OFFSET_MS = Number(option('offset-ms', 0));
+
+const agent = {
+  'http:': new http.Agent({ keepAlive: true, maxSockets: CONCURRENCY }),
+  'https:': new https.Agent({ keepAlive: true, maxSockets: CONCURRENCY, rejectUnauthorized: false })
+};
+
+const post = (path, body) => new Promise((resolve, reject) => {
+  const url = new URL(URL_BASE + path);
+  const client = url.protocol === 'https:' ? https : http;
+  const req = client.request(url, {
+    method: 'POST',
+    agent: agent[url.protocol],
+    headers: { Authorization: `Bearer ${TOKEN}`, 'Content-Type': 'application/json' }
+  }, (res) => {
+    const chunks = [];
+    res.on('data', chunk => chunks.push(chunk));
+    res.on('end', () => resolve({ status: res.statusCode, body: Buffer.concat(chunks) }));
+  });
+  req.on('error', reject);
+  req.end(body);
+});
+
+// Millisecond timestamps handed out in order, so no two requests share a point
+let nextTimestamp = Date.now() - 24 * 60 * 60 * 1000 + OFFSET_MS;
+
+const body = () => {
+  const points = [];
+  for (let row = 0; row < ROWS; row++) {
+    const timestamp = new Date(nextTimestamp++).toISOString();
+    KEYS.forEach((key, k) => points.push({ key, machine: DEVICE, value: 40 + k + Math.random(), timestamp }));
+  }
+  return JSON.stringify(points);
+};
+
+const client = async (latencies) => {
+  for (let i = 0; i < REQUESTS; i++) {
+    const started = process.hrtime.bigint();
+    const res = await post('/data/bulk', body());
+    latencies.push(Number(process.hrtime.bigint() - started) / 1e6);
+    if (res.status !== 201) {
+      throw new Error(`HTTP ${res.status}: ${res.body.toString().slice(0, 200)}`);
+    }
+  }
+};
+
+const main = async () => {
+  if (!TOKEN) {
+    throw new Error('Pass --token <JWT> or set TOKEN.');
+  }
+  const latencies = [];
+  const started = process.hrtime.bigint();
+  await Promise.all(Array.from({ length: CONCURRENCY }, () => client(latencies)));
+  const seconds = Number(process.hrtime.bigint() - started) / 1e9;
+  latencies.sort((a, b) => a - b);
+  const percentile = (p) => latencies[Math.min(latencies.length - 1, Math.floor(p * latencies.length))].toFixed(1);
+  console.log(`${latencies.length} requests of ${ROWS * KEYS.length} points, concurrency ${CONCURRENCY}`);
+  console.log(`${(latencies.length / seconds).toFixed(0)} req/s, ${(latencies.length * ROWS * KEYS.length / seconds).toFixed(0)} points/s, `
+    + `latency p50 ${percentile(0.5)} ms, p99 ${percentile(0.99)} ms`);
+};
+
+main().catch(err => {
+  console.error(err);
+  process.exit(1);
+});
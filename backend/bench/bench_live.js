@@ -0,0 +1,136 @@
+// bench/bench_live.js
+// Backend read load and bytes per dashboard of the daily monitor: polling
+// GET /api/data/daily every 5 s, as the page used to, against loading the
+// range once and following GET /api/data/live.
+//
+// Runs against a live backend for --duration seconds per mode. --dashboards
+// simulated pages watch --keys float keys (Bench_0, Bench_1, ...) of
+// --device over --range, while an agent posts one point per key every
+// --step-s seconds. Every /data/daily request costs the backend its MongoDB
+// queries (one find and, with points=N, one aggregation); live updates cost
+// none. The keys and the device must exist (create them with backend_script.py).
+//
+//   node bench/bench_live.js --url https://localhost:3000/api --token <JWT> --device bench --dashboards 10
+const http = require('http');
+const https = require('https');
+
+const option = (name, fallback) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index >= 0 ? process.argv[index + 1] : fallback;
+};
+
+const URL_BASE = option('url', 'https://localhost:3000/api');
+const TOKEN = option('token', process.env.TOKEN);
+const DEVICE = option('device', 'bench');
+const KEYS = Array.from({ length: Number(option('keys', 11)) }, (_, i) => `Bench_${i}`);
+const DASHBOARDS = Number(option('dashboards', 10));
+const RANGE = option('range', '24h');
+const DURATION_S = Number(option('duration', 60));
+const STEP_S = Number(option('step-s', 5));
+const POLL_MS = 5000;
+const POINTS = 1000;
+
+const open = (method, path, body, onResponse) => {
+  const url = new URL(URL_BASE + path);
+  const client = url.protocol === 'https:' ? https : http;
+  const req = client.request(url, {
+    method,
+    headers: { Authorization: `Bearer ${TOKEN}`, 'Content-Type': 'application/json' },
+    rejectUnauthorized: false
+  }, onResponse);
+  req.end(body);
+  return req;
+};
+
+// Resolves with the number of body bytes received
+const request = (method, path, body) => new Promise((resolve, reject) => {
+  const req = open(method, path, body, (res) => {
+    let bytes = 0;
+    res.on('data', chunk => {
+      bytes += chunk.length;
+    });
+    res.on('end', () => (res.statusCode < 300 ? resolve(bytes) : reject(new Error(`HTTP ${res.statusCode} for ${path}`))));
+  });
+  req.on('error', reject);
+});
+
+const dailyPath = () => {
+  const params = new URLSearchParams({ device: DEVICE, range: RANGE, points: POINTS });
+  KEYS.forEach(key => params.append('keys', key));
+  return `/data/daily?${params}`;
+};
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// Posts one point per key every STEP_S seconds until `until`
+const agent = async (until) => {
+  while (Date.now() < until) {
+    const timestamp = new Date().toISOString();
+    const points = KEYS.map((key, k) => ({ key, machine: DEVICE, value: 40 + k + Math.random(), timestamp }));
+    await request('POST', '/data/bulk', JSON.stringify(points));
+    await sleep(STEP_S * 1000);
+  }
+};
+
+const poll = async (until, totals) => {
+  while (Date.now() < until) {
+    totals.bytes += await request('GET', dailyPath());
+    totals.dailyRequests += 1;
+    await sleep(POLL_MS);
+  }
+};
+
+const follow = (until, totals) => new Promise((resolve, reject) => {
+  const params = new URLSearchParams({ device: DEVICE });
+  KEYS.forEach(key => params.append('keys', key));
+  const req = open('GET', `/data/live?${params}`, undefined, (res) => {
+    if (res.statusCode !== 200) {
+      reject(new Error(`HTTP ${res.statusCode} for /data/live`));
+      return;
+    }
+    let loaded = false;
+    res.on('data', chunk => {
+      totals.bytes += chunk.length;
+      if (!loaded && chunk.toString().includes('event: ready')) {
+        loaded = true;
+        request('GET', dailyPath()).then(bytes => {
+          totals.bytes += bytes;
+          totals.dailyRequests += 1;
+        }, reject);
+      }
+    });
+    setTimeout(() => {
+      req.destroy();
+      resolve();
+    }, until - Date.now());
+  });
+  req.on('error', err => (req.destroyed ? resolve() : reject(err)));
+});
+
+const run = async (mode) => {
+  const until = Date.now() + DURATION_S * 1000;
+  const totals = { bytes: 0, dailyRequests: 0 };
+  const dashboard = mode === 'poll' ? poll : follow;
+  await Promise.all([
+    agent(until),
+    ...Array.from({ length: DASHBOARDS }, () => dashboard(until, totals))
+  ]);
+  const minutes = DURATION_S / 60;
+  console.log(`${mode.padEnd(5)} ${(totals.dailyRequests / minutes).toFixed(1).padStart(14)} `
+    + `${(totals.bytes / DASHBOARDS / minutes / 1024).toFixed(1).padStart(22)}`);
+};
+
+const main = async () => {
+  if (!TOKEN) {
+    throw new Error('Pass --token <JWT> or set TOKEN.');
+  }
+  console.log(`${DASHBOARDS} dashboards, ${KEYS.length} keys over ${RANGE}, ${DURATION_S} s per mode`);
+  console.log(`${'mode'.padEnd(5)} ${'daily req/min'.padStart(14)} ${'KiB/min per dashboard'.padStart(22)}`);
+  await run('poll');
+  await run('live');
+};
+
+main().catch(err => {
+  console.error(err);
+  process.exit(1);
+});
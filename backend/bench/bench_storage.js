@@ -0,0 +1,125 @@
+// bench/bench_storage.js
+// Insert throughput, query latency and storage size of the two DataValue
+// layouts (see models/DataValue.js): the plain collection with its unique
+// (key, machine, timestamp) index, and the time-series collection.
+//
+// Uses two scratch collections (bench_datavalues and bench_datavalues_ts) in
+// the configured database and drops them afterwards. Writes the same
+// synthetic series to both in batches of --batch points, then times 24h
+// range queries of single keys and reports the collections' sizes.
+//
+//   node bench/bench_storage.js --keys 10 --days 7 --step-s 5
+const mongoose = require('mongoose');
+
+// Load Configuration
+const config = require('../config');
+
+const arg = (name, fallback) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index >= 0 ? Number(process.argv[index + 1]) : fallback;
+};
+
+const KEYS = Array.from({ length: arg('keys', 10) }, (_, i) => `Bench_${i}`);
+const DAYS = arg('days', 7);
+const STEP_S = arg('step-s', 5);
+const BATCH = arg('batch', 5000);
+const QUERIES = arg('queries', 20);
+const MACHINE = 'bench';
+
+const LAYOUTS = {
+  plain: {
+    name: 'bench_datavalues',
+    create: async (db, name) => {
+      await db.createCollection(name);
+      await db.collection(name).createIndex({ key: 1, machine: 1, timestamp: -1 }, { unique: true });
+    },
+    toDoc: (point) => point,
+    filter: (key) => ({ key, machine: MACHINE })
+  },
+  timeSeries: {
+    name: 'bench_datavalues_ts',
+    create: async (db, name) => {
+      await db.createCollection(name, { timeseries: { timeField: 'timestamp', metaField: 'meta', granularity: 'seconds' } });
+      await db.collection(name).createIndex({ 'meta.key': 1, 'meta.machine': 1, timestamp: -1 });
+    },
+    toDoc: ({ key, machine, ...measurement }) => ({ meta: { key, machine }, ...measurement }),
+    filter: (key) => ({ 'meta.key': key, 'meta.machine': MACHINE })
+  }
+};
+
+// The synthetic points in upload order: one row of every key per time step
+function* points () {
+  const end = Math.floor(Date.now() / 1000 / STEP_S) * STEP_S;
+  for (let t = end - DAYS * 86400; t < end; t += STEP_S) {
+    const timestamp = new Date(t * 1000);
+    for (let k = 0; k < KEYS.length; k++) {
+      const value = Math.round((40 + k + 10 * Math.sin(t / 7200) + Math.random()) * 100) / 100;
+      yield { key: KEYS[k], machine: MACHINE, value, timestamp, createdAt: timestamp, updatedAt: timestamp };
+    }
+  }
+}
+
+const median = (values) => {
+  const sorted = values.slice().sort((a, b) => a - b);
+  return sorted[Math.floor(sorted.length / 2)];
+};
+
+const run = async (db, label, layout) => {
+  await db.collection(layout.name).drop().catch(() => {});
+  await layout.create(db, layout.name);
+  const collection = db.collection(layout.name);
+
+  let inserted = 0;
+  let batch = [];
+  const started = process.hrtime.bigint();
+  for (const point of points()) {
+    batch.push(layout.toDoc(point));
+    if (batch.length >= BATCH) {
+      await collection.insertMany(batch, { ordered: false });
+      inserted += batch.length;
+      batch = [];
+    }
+  }
+  if (batch.length > 0) {
+    await collection.insertMany(batch, { ordered: false });
+    inserted += batch.length;
+  }
+  const insertSeconds = Number(process.hrtime.bigint() - started) / 1e9;
+
+  const latencies = [];
+  let returned = 0;
+  for (let i = 0; i < QUERIES; i++) {
+    const key = KEYS[i % KEYS.length];
+    const since = new Date(Date.now() - 24 * 60 * 60 * 1000);
+    const queryStarted = process.hrtime.bigint();
+    const docs = await collection.find({ ...layout.filter(key), timestamp: { $gte: since } })
+      .project({ _id: 0, timestamp: 1, value: 1 })
+      .sort({ timestamp: 1 })
+      .toArray();
+    latencies.push(Number(process.hrtime.bigint() - queryStarted) / 1e6);
+    returned = docs.length;
+  }
+
+  const stats = await db.command({ collStats: layout.name });
+  const mib = (bytes) => (bytes / 1024 / 1024).toFixed(1).padStart(9);
+  console.log(`${label.padEnd(11)} ${Math.round(inserted / insertSeconds).toString().padStart(10)} pts/s `
+    + `${median(latencies).toFixed(1).padStart(9)} ms (${returned} pts) `
+    + `${mib(stats.storageSize)} MiB data ${mib(stats.totalIndexSize)} MiB index`);
+  await collection.drop();
+};
+
+mongoose.connect(config.database.uri, config.database.options)
+  .then(async () => {
+    const db = mongoose.connection.db;
+    console.log(`${KEYS.length} keys x ${DAYS} days at ${STEP_S} s, batches of ${BATCH}, median of ${QUERIES} 24h queries`);
+    console.log(`${'layout'.padEnd(11)} ${'insert'.padStart(16)} ${'query'.padStart(12)}`);
+    for (const [label, layout] of Object.entries(LAYOUTS)) {
+      await run(db, label, layout);
+    }
+    mongoose.disconnect();
+  })
+  .catch(err => {
+    console.error('Error:', err);
+    mongoose.disconnect();
+    process.exitCode = 1;
+  });
@@ -0,0 +1,7 @@
+// config/index.js
+// The parsed config/config.yaml, loaded once and shared by every module
+// that requires it.
+const path = require('path');
+const yaml = require('yamljs');
+
+module.exports = yaml.load(path.join(__dirname, 'config.yaml'));
@@ -1,8 +1,7 @@
 // controllers/authController.js
 const User = require('../models/User');
 const jwt = require('jsonwebtoken');
-const yaml = require('yamljs');
-const config = yaml.load('./config/config.yaml');
+const config = require('../config');
 
 
 const login = async (req, res) => {
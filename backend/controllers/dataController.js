@@ -1,10 +1,23 @@
 // controllers/dataController.js
 const DataValue = require('../models/DataValue');
-const DataType = require('../models/DataType');
-const Device = require('../models/Device');
+const { checkColumnarBatch, expandColumnarBatch } = require('../utils/columnar');
+const { updateRollups } = require('../utils/rollups');
+const { getDataType, getDataTypeMap } = require('../utils/metadataCache');
+const liveHub = require('../utils/liveHub');
+
+// Adds newly stored points to the minute/hour rollups. The rollups can be
+// rebuilt from the raw data (scripts/rebuildRollups.js), so a failure here is
+// logged instead of failing an upload whose points are already stored.
+const recordRollups = async (points) => {
+  try {
+    await updateRollups(points);
+  } catch (err) {
+    console.error(`Failed to update rollups: ${err.message}`);
+  }
+};
 
 // Helper function to validate DataType
-const validateDataType = async (key, value, dataType) => {
+const validateDataType = (key, value, dataType) => {
   if (dataType.dataType === 'float') {
     if (typeof value !== 'number') {
       throw new Error(`Value for key '${key}' must be a number.`);
@@ -24,6 +37,39 @@ const validateDataType = async (key, value, dataType) => {
   return dataType;
 };
 
+// Helper function to validate the optional per-window aggregate of a float value
+const parseAggregate = (key, agg) => {
+  if (agg === undefined || agg === null) {
+    return undefined;
+  }
+  const { min, max, mean, count } = agg;
+  if (![min, max, mean, count].every(v => typeof v === 'number' && Number.isFinite(v))) {
+    throw new Error(`Aggregate for key '${key}' must have numeric min, max, mean and count.`);
+  }
+  return { min, max, mean, count };
+};
+
+// An ingest token (req.ingestDevice, see middleware/authMiddleware.js) may
+// only upload data for its own device
+const forbiddenMachine = (req, machines) => Boolean(req.ingestDevice)
+  && machines.some(machine => machine !== req.ingestDevice);
+
+// Answers an upload that failed. The checks in this file throw plain Errors,
+// and Mongoose's ValidationError and CastError are bad input as well: 400,
+// which the agent does not retry. Anything else is a database or server
+// error: 503 while MongoDB is unreachable or timing out, 500 otherwise, so the
+// agent spools the points and sends them again instead of dropping them.
+const DATABASE_UNAVAILABLE = /Network|ServerSelection|NotConnected|TopologyClosed|Timeout/;
+
+const sendUploadError = (res, err) => {
+  console.error(err.message);
+  if (err.constructor === Error || err.name === 'ValidationError' || err.name === 'CastError') {
+    return res.status(400).json({ message: err.message });
+  }
+  const unavailable = DATABASE_UNAVAILABLE.test(err.name) || /buffering timed out/.test(err.message);
+  res.status(unavailable ? 503 : 500).json({ message: 'Server error while storing data values.' });
+};
+
 // controllers/dataController.js
 
 // Upload DataValue
@@ -31,14 +77,17 @@ const uploadDataValue  = async (req, res) => {
   // console.log('Received request to upload data');
   // console.log('Request body:', req.body);
 try {
-  const { key, machine, value, timestamp } = req.body;
+  const { key, machine, value, timestamp, agg } = req.body;
 
   if (!key || !machine || value === undefined) {
     return res.status(400).json({ message: 'Key, machine, and value are required.' });
   }
+  if (forbiddenMachine(req, [machine])) {
+    return res.status(403).json({ message: 'Token is not valid for this device.' });
+  }
 
   // Retrieve the dataType for validation and potential conversion
-  let target_dataType = await DataType.findOne({ keyName: key });
+  let target_dataType = await getDataType(key);
 
   if (!target_dataType) {
     throw new Error(`DataType with keyName '${key}' does not exist.`);
@@ -67,22 +116,27 @@ try {
   }
 
   // Validate DataType and value
-  await validateDataType(key, convertedValue, target_dataType);
+  validateDataType(key, convertedValue, target_dataType);
 
   // Create new DataValue
-  const dataValue = new DataValue({
+  const dataValue = {
     key,
     machine,
     value: convertedValue,
-    timestamp: timestamp ? new Date(timestamp) : undefined
-  });
+    timestamp: timestamp ? new Date(timestamp) : new Date(),
+    agg: target_dataType.dataType === 'float' ? parseAggregate(key, agg) : undefined
+  };
 
-  await dataValue.save();
+  const { duplicates } = await DataValue.insertPoints([dataValue]);
+  if (duplicates > 0) {
+    return res.status(200).json({ message: 'Data value already exists.', duplicates });
+  }
+  await recordRollups([dataValue]);
+  liveHub.publish([dataValue]);
 
   res.status(201).json({ message: 'Data uploaded successfully.' });
 } catch (err) {
-  console.error(err.message);
-  res.status(400).json({ message: err.message });
+  sendUploadError(res, err);
 }
 };
 // controllers/dataController.js
@@ -104,20 +158,17 @@ const uploadDataValues = async (req, res) => {
           return res.status(400).json({ message: 'No data values provided.' });
       }
 
+      if (forbiddenMachine(req, dataValues.map(data => data && data.machine))) {
+          return res.status(403).json({ message: 'Token is not valid for this device.' });
+      }
+
       // Extract unique keys from the data values
       const uniqueKeys = [...new Set(dataValues.map(data => data.key))];
 
-      // Fetch all required DataTypes in a single query
-      const dataTypes = await DataType.find({ keyName: { $in: uniqueKeys } });
-
-      // Create a map for quick DataType lookup
-      const dataTypeMap = {};
-      dataTypes.forEach(dt => {
-          dataTypeMap[dt.keyName] = dt;
-      });
+      // Look up all required DataTypes (cached, see utils/metadataCache.js)
+      const { dataTypeMap, missingKeys } = await getDataTypeMap(uniqueKeys);
 
       // Identify any missing DataTypes
-      const missingKeys = uniqueKeys.filter(key => !dataTypeMap[key]);
       if (missingKeys.length > 0) {
           throw new Error(`DataType(s) for keyName(s) '${missingKeys.join(', ')}' do not exist.`);
       }
@@ -126,7 +177,7 @@ const uploadDataValues = async (req, res) => {
 
       // Process each data point
       for (const data of dataValues) {
-          const { key, machine, value, timestamp } = data;
+          const { key, machine, value, timestamp, agg } = data;
 
           // Validate required fields
           if (!key || !machine || value === undefined) {
@@ -157,30 +208,71 @@ const uploadDataValues = async (req, res) => {
           }
 
           // Validate DataType and value
-          await validateDataType(key, convertedValue, target_dataType);
+          validateDataType(key, convertedValue, target_dataType);
 
           // Prepare the DataValue object
           const dataValue = {
               key,
               machine,
               value: convertedValue,
-              timestamp: timestamp ? new Date(timestamp) : undefined
+              timestamp: timestamp ? new Date(timestamp) : new Date(),
+              agg: target_dataType.dataType === 'float' ? parseAggregate(key, agg) : undefined
           };
 
           processedDataValues.push(dataValue);
       }
 
-      // Insert all processed DataValues into the database
-      await DataValue.insertMany(processedDataValues);
+      // Insert all processed DataValues into the database; points already
+      // stored (same key, machine and timestamp) are skipped
+      const { inserted, duplicates, insertedDocs } = await DataValue.insertPoints(processedDataValues);
+      await recordRollups(insertedDocs);
+      liveHub.publish(insertedDocs);
+
+      res.status(201).json({ message: 'Data uploaded successfully.', count: inserted, duplicates });
+  } catch (err) {
+      sendUploadError(res, err);
+  }
+};
+
+// controllers/dataController.js
+
+// Upload a columnar batch (see utils/columnar.js), JSON or MessagePack
+const uploadColumnarValues = async (req, res) => {
+  try {
+      const batch = req.body;
+      const problem = checkColumnarBatch(batch);
+      if (problem) {
+          return res.status(400).json({ message: problem });
+      }
+      if (forbiddenMachine(req, [batch.machine])) {
+          return res.status(403).json({ message: 'Token is not valid for this device.' });
+      }
+
+      // Each key is looked up and validated once per batch
+      const keys = Object.keys(batch.values);
+      const { dataTypeMap, missingKeys } = await getDataTypeMap(keys);
+      if (missingKeys.length > 0) {
+          throw new Error(`DataType(s) for keyName(s) '${missingKeys.join(', ')}' do not exist.`);
+      }
+
+      const documents = expandColumnarBatch(batch, dataTypeMap, parseAggregate);
+      if (documents.length === 0) {
+          return res.status(400).json({ message: 'No data values provided.' });
+      }
+
+      // Documents are fully validated above, so skip Mongoose hydration and validation
+      const { inserted, duplicates, insertedDocs } = await DataValue.insertPoints(documents, { lean: true });
+      await recordRollups(insertedDocs);
+      liveHub.publish(insertedDocs);
 
-      res.status(201).json({ message: 'Data uploaded successfully.', count: processedDataValues.length });
+      res.status(201).json({ message: 'Data uploaded successfully.', count: inserted, duplicates });
   } catch (err) {
-      console.error(err.message);
-      res.status(400).json({ message: err.message });
+      sendUploadError(res, err);
   }
 };
 
 module.exports = { 
   uploadDataValue,
-  uploadDataValues
+  uploadDataValues,
+  uploadColumnarValues
 };
@@ -1,8 +1,12 @@
 // backend/controllers/dataRetrievalController.js
 const DataValue = require('../models/DataValue');
-const DataType = require('../models/DataType');
-const Device = require('../models/Device');
+const DataRollup = require('../models/DataRollup');
 const mongoose = require('mongoose');
+const { bucketWidth, downsamplePipeline, bucketsToValues } = require('../utils/downsample');
+const { rollupSeries } = require('../utils/rollups');
+const { runTask } = require('../utils/analyticsPool');
+const { getDataType, getDataTypeMap, deviceExists } = require('../utils/metadataCache');
+const liveHub = require('../utils/liveHub');
 
 // Helper function to parse time range
 const parseTimeRange = (range) => {
@@ -33,9 +37,46 @@ const parseTimeRange = (range) => {
   return value * multiplier;
 };
 
+// How far the cursor returned by getDailyData trails the start of the query,
+// so that a point whose insert was still in flight then is not skipped. Points
+// in the overlap are returned again; clients de-duplicate them by timestamp.
+const CURSOR_LAG_MS = 5000;
+
+// Splits the range from `since` to `now` by where it can be read from: raw
+// points from rawFrom on, and before that (when raw points expire, see
+// models/DataValue.js) minute rollups while they are kept, hour rollups
+// before that. Tiers are returned oldest first.
+const storageTiers = (since, now) => {
+  if (!DataValue.rawRetentionMs) {
+    return { rawFrom: since, tiers: [] };
+  }
+  const rawFrom = new Date(Math.max(since.getTime(), now - DataValue.rawRetentionMs));
+  const minuteFrom = DataRollup.minuteRetentionMs
+    ? new Date(Math.min(rawFrom.getTime(), Math.max(since.getTime(), now - DataRollup.minuteRetentionMs)))
+    : since;
+  const tiers = [];
+  if (since < minuteFrom) {
+    tiers.push({ resolution: 'hour', from: since, to: minuteFrom });
+  }
+  if (minuteFrom < rawFrom) {
+    tiers.push({ resolution: 'minute', from: minuteFrom, to: rawFrom });
+  }
+  return { rawFrom, tiers };
+};
+
 // Get Daily Data
+// All keys are read with one lean query on the (key, machine, timestamp)
+// index. With `points=N` float keys are downsampled to at most N points each
+// (see utils/downsample.js), so the response size no longer grows with the
+// range; message keys are always returned in full. Where raw points have
+// expired, float keys are served from the rollups (see storageTiers).
+// With `since` (the `cursor` of an earlier response) only the points of the
+// range stored after that earlier query are returned, so a client that keeps
+// the points it already has only fetches the new tail, including points that
+// arrived late from an agent's spool.
 const getDailyData = async (req, res) => {
   try {
+    const queryStart = Date.now();
     const { device, keys, range } = req.query;
 
     // Validate parameters
@@ -44,17 +85,17 @@ const getDailyData = async (req, res) => {
     }
 
     // Validate device exists
-    const deviceExists = await Device.findOne({ deviceId: device });
-    if (!deviceExists) {
+    if (!(await deviceExists(device))) {
       return res.status(404).json({ message: 'Device not found.' });
     }
 
     // Validate keys
     const keyArray = Array.isArray(keys) ? keys : [keys];
-    const validKeys = await DataType.find({ keyName: { $in: keyArray } });
-    if (validKeys.length !== keyArray.length) {
+    const { dataTypeMap, missingKeys } = await getDataTypeMap(keyArray);
+    if (missingKeys.length > 0) {
       return res.status(400).json({ message: 'One or more keys are invalid.' });
     }
+    const validKeys = Object.values(dataTypeMap);
 
     // Parse time range
     const rangeMs = parseTimeRange(range);
@@ -62,46 +103,83 @@ const getDailyData = async (req, res) => {
       return res.status(400).json({ message: 'Invalid time range format. Use formats like 24h, 30m, 15s.' });
     }
 
-    const since = new Date(Date.now() - rangeMs);
+    let storedAfter = null;
+    if (req.query.since !== undefined) {
+      storedAfter = new Date(req.query.since);
+      if (isNaN(storedAfter.getTime())) {
+        return res.status(400).json({ message: 'Invalid since timestamp.' });
+      }
+    }
 
-    // Fetch data for each key
-    const data = {};
+    let maxPoints = null;
+    if (req.query.points !== undefined) {
+      maxPoints = parseInt(req.query.points, 10);
+      if (!(maxPoints >= 2)) {
+        return res.status(400).json({ message: 'points must be a number of at least 2.' });
+      }
+    }
 
-    for (const key of keyArray) {
-      const keyType = validKeys.find(k => k.keyName === key).dataType;
-
-      if (keyType === 'float') {
-        const floatData = await DataValue.find({
-          key,
-          machine: device,
-          timestamp: { $gte: since }
-        }).sort({ timestamp: 1 });
-
-        data[key] = {
-          type: 'float',
-          values: floatData.map(d => ({
-            timestamp: d.timestamp,
-            value: d.value
-          }))
-        };
-      } else if (keyType === 'message') {
-        const messageData = await DataValue.find({
-          key,
-          machine: device,
-          timestamp: { $gte: since }
-        }).sort({ timestamp: 1 });
-
-        data[key] = {
-          type: 'message',
-          values: messageData.map(d => ({
-            timestamp: d.timestamp,
-            value: d.value
-          }))
-        };
+    const since = new Date(queryStart - rangeMs);
+    const { rawFrom, tiers } = storageTiers(since, queryStart);
+    const match = (keyNames) => {
+      const filter = {
+        ...DataValue.seriesFilter({ $in: keyNames }, device),
+        timestamp: { $gte: rawFrom }
+      };
+      if (storedAfter) {
+        filter.createdAt = { $gt: storedAfter };
       }
+      return filter;
+    };
+
+    const floatKeys = validKeys.filter(k => k.dataType === 'float').map(k => k.keyName);
+    const messageKeys = validKeys.filter(k => k.dataType === 'message').map(k => k.keyName);
+    const rawKeys = maxPoints ? messageKeys : floatKeys.concat(messageKeys);
+    const bucketMs = maxPoints ? bucketWidth(rangeMs, maxPoints) : null;
+
+    // Rollups have no storage time, so incremental (since) queries skip them
+    const rollupTiers = storedAfter || floatKeys.length === 0 ? [] : tiers;
+    const [rawPoints, buckets, ...tierSeries] = await Promise.all([
+      rawKeys.length > 0
+        ? DataValue.find(match(rawKeys))
+          .select({ _id: 0, timestamp: 1, value: 1, ...DataValue.seriesProjection() })
+          .sort({ timestamp: 1 })
+          .lean()
+        : [],
+      maxPoints && floatKeys.length > 0
+        ? DataValue.aggregate(downsamplePipeline(match(floatKeys), since, bucketMs, DataValue.KEY))
+        : [],
+      ...rollupTiers.map(tier => rollupSeries(floatKeys, device, tier.resolution, tier.from, tier.to, since, bucketMs))
+    ]);
+
+    // Keys appear in the order they were requested
+    const typeOf = {};
+    validKeys.forEach(k => {
+      typeOf[k.keyName] = k.dataType;
+    });
+    const data = {};
+    keyArray.forEach(key => {
+      data[key] = { type: typeOf[key], values: [] };
+    });
+    rawPoints.forEach(doc => {
+      const point = DataValue.fromStored(doc);
+      data[point.key].values.push({ timestamp: point.timestamp, value: point.value });
+    });
+    if (maxPoints) {
+      const downsampled = bucketsToValues(buckets);
+      floatKeys.forEach(key => {
+        data[key].values = downsampled[key] || [];
+        data[key].bucketMs = bucketMs;
+      });
+    }
+    if (tierSeries.length > 0) {
+      floatKeys.forEach(key => {
+        const older = [].concat(...tierSeries.map(series => series[key] || []));
+        data[key].values = older.concat(data[key].values);
+      });
     }
 
-    res.status(200).json({ data });
+    res.status(200).json({ data, cursor: new Date(queryStart - CURSOR_LAG_MS).toISOString() });
   } catch (err) {
     console.error(err);
     res.status(500).json({ message: 'Server error while fetching daily data.' });
@@ -109,6 +187,9 @@ const getDailyData = async (req, res) => {
 };
 
 // Get Monthly Aggregated Data
+// Computed from the minute/hour rollups (see utils/rollups.js for how closely
+// they match the raw points), so the cost depends on the number of buckets
+// rather than the number of points; see monthlyStats in utils/analytics.js.
 const getMonthlyAggregatedData = async (req, res) => {
   try {
     const { device, key } = req.query;
@@ -119,68 +200,32 @@ const getMonthlyAggregatedData = async (req, res) => {
     }
 
     // Validate device exists
-    const deviceExists = await Device.findOne({ deviceId: device });
-    if (!deviceExists) {
+    if (!(await deviceExists(device))) {
       return res.status(404).json({ message: 'Device not found.' });
     }
 
     // Validate key exists
-    const dataType = await DataType.findOne({ keyName: key });
+    const dataType = await getDataType(key);
     if (!dataType) {
       return res.status(404).json({ message: 'Key not found.' });
     }
 
+    if (dataType.dataType !== 'float') {
+      return res.status(400).json({ message: 'Aggregated data is only available for float-type keys.' });
+    }
+
     // Define the time range (past month)
     const since = new Date();
     since.setMonth(since.getMonth() - 1);
 
-    // Fetch relevant data
-    const dataValues = await DataValue.find({
-      key,
-      machine: device,
-      timestamp: { $gte: since }
-    });
-
-    if (dataType.dataType !== 'float') {
-      return res.status(400).json({ message: 'Aggregated data is only available for float-type keys.' });
-    }
+    // On an analytics thread (utils/analyticsPool.js), off the event loop that serves uploads
+    const stats = await runTask('monthlyStats', { key, device, since });
 
-    if (dataValues.length === 0) {
+    if (!stats) {
       return res.status(200).json({ data: null, message: 'No data available for the selected key and device.' });
     }
 
-    // Extract values
-    //console.log(dataValues);
-    const sortedData = dataValues.sort((a, b) => a.timestamp - b.timestamp);
-
-    // Step 2: Extract values and convert timestamps
-    const values = sortedData.map((d) => parseFloat(d.value));
-    const timestamps = sortedData.map((d) => d.timestamp.getTime()); // in milliseconds
-
-    
-    // Step 2: Calculate min, max, mean, and median
-    const min = Math.min(...values);
-    const max = Math.max(...values);
-    const mean = values.reduce((sum, val) => sum + val, 0) / values.length;
-    const median = values.slice().sort((a, b) => a - b)[Math.floor(values.length / 2)];
-    
-    // Step 3: Calculate Area Under the Curve (AUC) using trapezoidal integration
-    let auc = 0;
-    for (let i = 1; i < values.length; i++) {
-      const deltaTime = (timestamps[i] - timestamps[i - 1]) / 1000; // Convert to seconds
-      //console.log('deltaTime:', deltaTime);
-      //console.log('values[i]:', values[i]);
-      //console.log('values[i - 1]:', values[i - 1]);
-      auc += ((values[i] + values[i - 1]) / 2) * deltaTime;
-    }
-    
-    // Output the results
-    ////console.log('Min:', min);
-    //console.log('Max:', max);
-    //console.log('Mean:', mean);
-    //console.log('Median:', median);
-    //console.log('Area Under the Curve (AUC):', auc, 'value-seconds');
-
+    const { min, max, median, mean, auc } = stats;
     const aggregatedData = {
       min,
       max,
@@ -196,4 +241,141 @@ const getMonthlyAggregatedData = async (req, res) => {
   }
 };
 
-module.exports = { getDailyData, getMonthlyAggregatedData };
+// Points per MongoDB batch and bytes per response write while exporting
+const EXPORT_BATCH_SIZE = 1000;
+const EXPORT_WRITE_BYTES = 64 * 1024;
+
+// Resolves once the response can take more data or the client has gone away
+const waitForDrain = (res) => new Promise((resolve) => {
+  const done = () => {
+    res.off('drain', done);
+    res.off('close', done);
+    resolve();
+  };
+  res.on('drain', done);
+  res.on('close', done);
+});
+
+// Export Raw Data
+// Streams every point of one key as NDJSON straight from a MongoDB cursor,
+// in timestamp order, so memory stays the same however many points match:
+//
+//   {"key":"GPU_Temperature","type":"float"}
+//   {"timestamp":"2024-05-01T12:00:00.000Z","value":35}
+//   ...
+//   {"end":true,"count":2}
+//
+// `from` (inclusive) and `to` (exclusive) bound the timestamps; `after`
+// (exclusive) resumes an interrupted export from the last point received.
+// A stream without the final `end` line was cut short.
+const exportData = async (req, res) => {
+  let cursor = null;
+  try {
+    const { device, key } = req.query;
+
+    if (!device || !key) {
+      return res.status(400).json({ message: 'device and key are required.' });
+    }
+
+    const bounds = {};
+    for (const [name, operator] of [['from', '$gte'], ['to', '$lt'], ['after', '$gt']]) {
+      if (req.query[name] !== undefined) {
+        const date = new Date(req.query[name]);
+        if (isNaN(date.getTime())) {
+          return res.status(400).json({ message: `Invalid ${name} timestamp.` });
+        }
+        bounds[operator] = date;
+      }
+    }
+
+    if (!(await deviceExists(device))) {
+      return res.status(404).json({ message: 'Device not found.' });
+    }
+    const dataType = await getDataType(key);
+    if (!dataType) {
+      return res.status(404).json({ message: 'Key not found.' });
+    }
+
+    const filter = DataValue.seriesFilter(key, device);
+    if (Object.keys(bounds).length > 0) {
+      filter.timestamp = bounds;
+    }
+    cursor = DataValue.find(filter)
+      .select({ _id: 0, timestamp: 1, value: 1 })
+      .sort({ timestamp: 1 })
+      .lean()
+      .cursor({ batchSize: EXPORT_BATCH_SIZE });
+    res.on('close', () => cursor.close().catch(() => {}));
+
+    res.status(200).type('application/x-ndjson');
+    res.write(JSON.stringify({ key, type: dataType.dataType }) + '\n');
+    let count = 0;
+    let chunk = '';
+    for await (const point of cursor) {
+      if (res.destroyed) {
+        return;
+      }
+      chunk += JSON.stringify({ timestamp: point.timestamp, value: point.value }) + '\n';
+      count++;
+      if (chunk.length >= EXPORT_WRITE_BYTES) {
+        const flushed = res.write(chunk);
+        chunk = '';
+        if (!flushed) {
+          await waitForDrain(res);
+        }
+      }
+    }
+    res.end(chunk + JSON.stringify({ end: true, count }) + '\n');
+  } catch (err) {
+    console.error(err);
+    if (!res.headersSent) {
+      res.status(500).json({ message: 'Server error while exporting data.' });
+    } else {
+      // Without the end line the client knows to resume
+      res.destroy();
+    }
+  }
+};
+
+// Live updates for the daily monitor as Server-Sent Events (see utils/liveHub.js):
+// GET /api/data/live?device=..&keys=..&keys=.. sends a `ready` event once
+// subscribed, then a `points` event with the new points of the watched keys
+// whenever an upload stores some. Load the range with /data/daily after
+// `ready` so that no point falls between the two.
+const streamLiveData = async (req, res) => {
+  try {
+    const { device, keys } = req.query;
+    if (!device || !keys) {
+      return res.status(400).json({ message: 'device and keys are required.' });
+    }
+    if (!(await deviceExists(device))) {
+      return res.status(404).json({ message: 'Device not found.' });
+    }
+    const keyArray = Array.isArray(keys) ? keys : [keys];
+    const { missingKeys } = await getDataTypeMap(keyArray);
+    if (missingKeys.length > 0) {
+      return res.status(400).json({ message: 'One or more keys are invalid.' });
+    }
+
+    res.status(200).set({
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache',
+      'Connection': 'keep-alive',
+      'X-Accel-Buffering': 'no' // for nginx in front of the backend
+    });
+    res.flushHeaders();
+    liveHub.subscribe(res, device, keyArray);
+  } catch (err) {
+    console.error(err);
+    if (!res.headersSent) {
+      res.status(500).json({ message: 'Server error while opening live updates.' });
+    }
+  }
+};
+
+// Live update subscribers and counters since start
+const getLiveStats = (req, res) => {
+  res.status(200).json(liveHub.stats());
+};
+
+module.exports = { getDailyData, getMonthlyAggregatedData, exportData, streamLiveData, getLiveStats };
@@ -1,5 +1,7 @@
 // backend/controllers/datatypeController.js
 const DataType = require('../models/DataType');
+const { insertManyUnordered, isDuplicateKeyError } = require('../utils/bulkWrite');
+const { invalidateDataTypes } = require('../utils/metadataCache');
 
 // Create DataType
 const createDataType = async (req, res) => {
@@ -35,6 +37,7 @@ const createDataType = async (req, res) => {
     });
 
     await dataTypeObj.save();
+    invalidateDataTypes();
 
     res.status(201).json({ message: 'DataType created successfully.', dataType: dataTypeObj });
   } catch (err) {
@@ -89,6 +92,7 @@ const updateDataType = async (req, res) => {
       { dataType, normalRange, warningRange, missingDataAllowance, emailAlertRange },
       { new: true, runValidators: true }
     ).select('-__v');
+    invalidateDataTypes();
 
     if (!updatedDataType) {
       return res.status(404).json({ message: 'DataType not found.' });
@@ -108,6 +112,7 @@ const deleteDataType = async (req, res) => {
 
     // Find and delete the DataType
     const deletedDataType = await DataType.findOneAndDelete({ keyName });
+    invalidateDataTypes();
 
     if (!deletedDataType) {
       return res.status(404).json({ message: 'DataType not found.' });
@@ -120,8 +125,92 @@ const deleteDataType = async (req, res) => {
   }
 };
 
+// Create many DataTypes in one request (see utils/bulkWrite.js for the response)
+const createDataTypes = async (req, res) => {
+  try {
+    const items = req.body;
+    if (!Array.isArray(items) || items.length === 0) {
+      return res.status(400).json({ message: 'Expected a non-empty array of DataTypes.' });
+    }
+
+    const results = new Array(items.length);
+    const candidates = [];
+    const seen = new Set();
+    items.forEach((item, index) => {
+      const { keyName, dataType, missingDataAllowance } = item || {};
+      if (!keyName || !dataType || missingDataAllowance === undefined) {
+        results[index] = { keyName, status: 400, message: 'keyName, dataType, and missingDataAllowance are required.' };
+      } else if (!['float', 'message'].includes(dataType)) {
+        results[index] = { keyName, status: 400, message: 'Invalid dataType. Must be "float" or "message".' };
+      } else if (seen.has(keyName)) {
+        results[index] = { keyName, status: 400, message: 'DataType with this keyName already exists.' };
+      } else {
+        seen.add(keyName);
+        candidates.push(index);
+      }
+    });
+
+    // One query for the existing keys instead of one per item
+    const existing = new Set((await DataType.find({ keyName: { $in: [...seen] } }).select('keyName').lean())
+      .map(dt => dt.keyName));
+    const toInsert = [];
+    candidates.forEach(index => {
+      const { keyName, dataType, normalRange, warningRange, missingDataAllowance, emailAlertRange } = items[index];
+      if (existing.has(keyName)) {
+        results[index] = { keyName, status: 400, message: 'DataType with this keyName already exists.' };
+      } else {
+        toInsert.push({ index, doc: { keyName, dataType, normalRange, warningRange, missingDataAllowance, emailAlertRange } });
+      }
+    });
+
+    const errors = await insertManyUnordered(DataType, toInsert.map(item => item.doc));
+    invalidateDataTypes();
+    toInsert.forEach(({ index, doc }, i) => {
+      const err = errors[i];
+      if (!err) {
+        results[index] = { keyName: doc.keyName, status: 201, message: 'DataType created successfully.' };
+      } else if (isDuplicateKeyError(err)) {
+        results[index] = { keyName: doc.keyName, status: 400, message: 'DataType with this keyName already exists.' };
+      } else {
+        console.error(err);
+        results[index] = { keyName: doc.keyName, status: 500, message: 'Server error while creating DataType.' };
+      }
+    });
+
+    res.status(200).json({ results });
+  } catch (err) {
+    console.error(err);
+    res.status(500).json({ message: 'Server error while creating DataTypes.' });
+  }
+};
+
+// Delete many DataTypes by keyName in one request
+const deleteDataTypes = async (req, res) => {
+  try {
+    const { keyNames } = req.body;
+    if (!Array.isArray(keyNames) || keyNames.length === 0) {
+      return res.status(400).json({ message: 'keyNames must be a non-empty array.' });
+    }
+
+    const existing = new Set((await DataType.find({ keyName: { $in: keyNames } }).select('keyName').lean())
+      .map(dt => dt.keyName));
+    await DataType.deleteMany({ keyName: { $in: [...existing] } });
+    invalidateDataTypes();
+
+    const results = keyNames.map(keyName => (existing.delete(keyName)
+      ? { keyName, status: 200, message: 'DataType deleted successfully.' }
+      : { keyName, status: 404, message: 'DataType not found.' }));
+    res.status(200).json({ results });
+  } catch (err) {
+    console.error(err);
+    res.status(500).json({ message: 'Server error while deleting DataTypes.' });
+  }
+};
+
 module.exports = {
   createDataType,
+  createDataTypes,
+  deleteDataTypes,
   getAllDataTypes,
   getDataType,
   updateDataType,
@@ -1,5 +1,9 @@
 // backend/controllers/deviceController.js
+const jwt = require('jsonwebtoken');
 const Device = require('../models/Device');
+const config = require('../config');
+const { insertManyUnordered, isDuplicateKeyError } = require('../utils/bulkWrite');
+const { invalidateDevices } = require('../utils/metadataCache');
 
 // Get All Devices
 const getAllDevices = async (req, res) => {
@@ -31,6 +35,7 @@ const createDevice = async (req, res) => {
     // Create new device
     const device = new Device({ deviceId, name, description });
     await device.save();
+    invalidateDevices();
 
     res.status(201).json({ message: 'Device created successfully.', device });
   } catch (err) {
@@ -51,6 +56,7 @@ const updateDevice = async (req, res) => {
       { name, description },
       { new: true }
     );
+    invalidateDevices();
 
     if (!device) {
       return res.status(404).json({ message: 'Device not found.' });
@@ -70,6 +76,7 @@ const deleteDevice = async (req, res) => {
 
     // Find and delete the device
     const device = await Device.findOneAndDelete({ deviceId });
+    invalidateDevices();
 
     if (!device) {
       return res.status(404).json({ message: 'Device not found.' });
@@ -82,4 +89,114 @@ const deleteDevice = async (req, res) => {
   }
 };
 
-module.exports = { getAllDevices, createDevice, updateDevice, deleteDevice };
+// Create many Devices in one request (Admin Only, see utils/bulkWrite.js for the response)
+const createDevices = async (req, res) => {
+  try {
+    const items = req.body;
+    if (!Array.isArray(items) || items.length === 0) {
+      return res.status(400).json({ message: 'Expected a non-empty array of devices.' });
+    }
+
+    const results = new Array(items.length);
+    const candidates = [];
+    const seen = new Set();
+    items.forEach((item, index) => {
+      const { deviceId, name } = item || {};
+      if (!deviceId || !name) {
+        results[index] = { deviceId, status: 400, message: 'deviceId and name are required.' };
+      } else if (seen.has(deviceId)) {
+        results[index] = { deviceId, status: 400, message: 'Device with this deviceId already exists.' };
+      } else {
+        seen.add(deviceId);
+        candidates.push(index);
+      }
+    });
+
+    const existing = new Set((await Device.find({ deviceId: { $in: [...seen] } }).select('deviceId').lean())
+      .map(device => device.deviceId));
+    const toInsert = [];
+    candidates.forEach(index => {
+      const { deviceId, name, description } = items[index];
+      if (existing.has(deviceId)) {
+        results[index] = { deviceId, status: 400, message: 'Device with this deviceId already exists.' };
+      } else {
+        toInsert.push({ index, doc: { deviceId, name, description } });
+      }
+    });
+
+    const errors = await insertManyUnordered(Device, toInsert.map(item => item.doc));
+    invalidateDevices();
+    toInsert.forEach(({ index, doc }, i) => {
+      const err = errors[i];
+      if (!err) {
+        results[index] = { deviceId: doc.deviceId, status: 201, message: 'Device created successfully.' };
+      } else if (isDuplicateKeyError(err)) {
+        results[index] = { deviceId: doc.deviceId, status: 400, message: 'Device with this deviceId already exists.' };
+      } else {
+        console.error(err);
+        results[index] = { deviceId: doc.deviceId, status: 500, message: 'Server error while creating device.' };
+      }
+    });
+
+    res.status(200).json({ results });
+  } catch (err) {
+    console.error(err);
+    res.status(500).json({ message: 'Server error while creating devices.' });
+  }
+};
+
+// Delete many Devices in one request (Admin Only)
+const deleteDevices = async (req, res) => {
+  try {
+    const { deviceIds } = req.body;
+    if (!Array.isArray(deviceIds) || deviceIds.length === 0) {
+      return res.status(400).json({ message: 'deviceIds must be a non-empty array.' });
+    }
+
+    const existing = new Set((await Device.find({ deviceId: { $in: deviceIds } }).select('deviceId').lean())
+      .map(device => device.deviceId));
+    await Device.deleteMany({ deviceId: { $in: [...existing] } });
+    invalidateDevices();
+
+    const results = deviceIds.map(deviceId => (existing.delete(deviceId)
+      ? { deviceId, status: 200, message: 'Device deleted successfully.' }
+      : { deviceId, status: 404, message: 'Device not found.' }));
+    res.status(200).json({ results });
+  } catch (err) {
+    console.error(err);
+    res.status(500).json({ message: 'Server error while deleting devices.' });
+  }
+};
+
+// Issue an ingest token for a Device (Admin Only). Agents can upload data for
+// that device with it instead of logging in (see middleware/authMiddleware.js).
+// It expires after auth.ingestTokenExpiry; issuing a new one invalidates the
+// previous one.
+const issueIngestToken = async (req, res) => {
+  try {
+    const { deviceId } = req.params;
+
+    const device = await Device.findOneAndUpdate(
+      { deviceId },
+      { $inc: { ingestTokenVersion: 1 } },
+      { new: true }
+    );
+    invalidateDevices();
+
+    if (!device) {
+      return res.status(404).json({ message: 'Device not found.' });
+    }
+
+    const token = jwt.sign(
+      { deviceId, scope: 'ingest', version: device.ingestTokenVersion },
+      config.auth.jwtSecret,
+      { expiresIn: config.auth.ingestTokenExpiry || '365d' }
+    );
+    res.status(201).json({ message: 'Ingest token issued successfully.', deviceId, token });
+  } catch (err) {
+    console.error(err);
+    res.status(500).json({ message: 'Server error while issuing ingest token.' });
+  }
+};
+
+module.exports = { getAllDevices, createDevice, createDevices, updateDevice, deleteDevice, deleteDevices, issueIngestToken };
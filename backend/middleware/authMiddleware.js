@@ -1,30 +1,78 @@
 // middleware/authMiddleware.js
 const jwt = require('jsonwebtoken');
-const yaml = require('yamljs');
-const config = yaml.load('./config/config.yaml');
+const config = require('../config');
+const { createTokenCache } = require('../utils/tokenCache');
+const { getDevice } = require('../utils/metadataCache');
 
-const authenticate = (req, res, next) => {
-  // console.log('Authenticating user...');
-  // console.log('Request headers:', req.headers);
-  // console.log('Request body:', req.body); 
+// Verified tokens are remembered (utils/tokenCache.js): agents send the same
+// token with every upload, and verifying its signature each time is a
+// measurable share of the CPU time of an upload.
+const tokenCache = createTokenCache(config.auth.tokenCacheSize === undefined ? 10000 : config.auth.tokenCacheSize);
+
+// Payload of a valid token; throws if the token is invalid or expired
+const verifyToken = (token) => {
+  const cached = tokenCache.get(token);
+  if (cached) {
+    return cached;
+  }
+  const payload = jwt.verify(token, config.auth.jwtSecret);
+  tokenCache.set(token, payload);
+  return payload;
+};
+
+// Verified payload of the request's bearer token, or sends the error response and returns null
+const requestToken = (req, res) => {
   const authHeader = req.headers.authorization;
+  if (!authHeader || !authHeader.startsWith('Bearer ')) {
+    res.status(401).json({ message: 'Authorization header missing.' });
+    return null;
+  }
+  try {
+    return verifyToken(authHeader.split(' ')[1]);
+  } catch (err) {
+    res.status(403).json({ message: 'Invalid token.' });
+    return null;
+  }
+};
 
-  if (authHeader && authHeader.startsWith('Bearer ')) {
-    const token = authHeader.split(' ')[1];
-    // console.log('Token:', token);
-    // console.log('JWT Secret:', config.auth.jwtSecret);
+// Accepts user tokens (from /auth/login)
+const authenticate = (req, res, next) => {
+  const user = requestToken(req, res);
+  if (!user) {
+    return;
+  }
+  if (user.scope === 'ingest') {
+    return res.status(403).json({ message: 'Ingest tokens can only upload data.' });
+  }
+  req.user = user; // Attach user information to the request
+  next();
+};
 
-    jwt.verify(token, config.auth.jwtSecret, (err, user) => {
-      if (err) {
+// Accepts user tokens and device ingest tokens (see issueIngestToken in
+// controllers/deviceController.js). An ingest token is valid while its device
+// exists and no newer token has been issued for it; req.ingestDevice then
+// holds the device it may upload for.
+const authenticateIngest = async (req, res, next) => {
+  const user = requestToken(req, res);
+  if (!user) {
+    return;
+  }
+  if (user.scope === 'ingest') {
+    try {
+      const device = await getDevice(user.deviceId);
+      if (!device || (device.ingestTokenVersion || 0) !== user.version) {
         return res.status(403).json({ message: 'Invalid token.' });
       }
-      req.user = user; // Attach user information to the request
-      // console.log('User authenticated:', user);
-      next();
-    });
-  } else {
-    res.status(401).json({ message: 'Authorization header missing.' });
+    } catch (err) {
+      return next(err);
+    }
+    req.ingestDevice = user.deviceId;
   }
+  req.user = user;
+  next();
 };
 
 module.exports = authenticate;
+module.exports.authenticateIngest = authenticateIngest;
+module.exports.verifyToken = verifyToken;
+module.exports.tokenCache = tokenCache;
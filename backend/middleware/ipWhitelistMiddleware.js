@@ -1,6 +1,5 @@
 // middleware/ipWhitelistMiddleware.js
-const yaml = require('yamljs');
-const config = yaml.load('./config/config.yaml');
+const config = require('../config');
 
 const ipWhitelist = (req, res, next) => {
   const allowedIPs = config.apiSecurity.allowedIPs;
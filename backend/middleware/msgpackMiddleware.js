@@ -0,0 +1,23 @@
+// middleware/msgpackMiddleware.js
+const express = require('express');
+const { decode } = require('../utils/msgpack');
+const config = require('../config');
+
+// Parses application/msgpack bodies (gzip allowed, like JSON ones) into req.body.
+// JSON bodies are already handled by express.json in app.js.
+const msgpackBody = [
+  express.raw({ type: 'application/msgpack', inflate: true, limit: config.server.bodyLimit || '5mb' }),
+  (req, res, next) => {
+    if (!Buffer.isBuffer(req.body)) {
+      return next();
+    }
+    try {
+      req.body = decode(req.body);
+    } catch (err) {
+      return res.status(400).json({ message: `Invalid MessagePack body: ${err.message}` });
+    }
+    next();
+  }
+];
+
+module.exports = msgpackBody;
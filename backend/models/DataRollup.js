@@ -0,0 +1,65 @@
+// models/DataRollup.js
+const mongoose = require('mongoose');
+const { syncTtlIndex } = require('../utils/ttlIndex');
+
+// Load Configuration
+const config = require('../config');
+const storage = config.storage || {};
+
+// A point at the edge of a bucket, kept so that the area between this bucket
+// and its neighbours can be added when buckets are combined
+const edgeSchema = new mongoose.Schema({
+  t: Date,
+  v: Number
+}, { _id: false });
+
+// Per-minute and per-hour statistics of one float key on one machine,
+// maintained as data is ingested (see utils/rollups.js)
+const dataRollupSchema = new mongoose.Schema({
+  key: {
+    type: String,
+    required: true
+  },
+  machine: {
+    type: String,
+    required: true
+  },
+  resolution: {
+    type: String,
+    enum: ['minute', 'hour'],
+    required: true
+  },
+  bucket: {
+    type: Date, // start of the minute or hour (UTC)
+    required: true
+  },
+  min: Number,
+  max: Number,
+  sum: Number,
+  count: Number,
+  auc: Number, // trapezoid area between the bucket's own points, in value-seconds
+  first: edgeSchema,
+  last: edgeSchema,
+  sketch: {
+    type: Map, // quantile sketch: counts per log-spaced value bucket
+    of: Number
+  }
+}, { versionKey: false });
+
+dataRollupSchema.index({ key: 1, machine: 1, resolution: 1, bucket: 1 }, { unique: true });
+
+// Minute rollups expire after storage.minuteRollupRetentionDays; hour rollups are kept
+const MINUTE_RETENTION_SECONDS = Math.round((storage.minuteRollupRetentionDays || 0) * 24 * 60 * 60);
+const MINUTE_EXPIRY = { partialFilterExpression: { resolution: 'minute' } };
+if (MINUTE_RETENTION_SECONDS) {
+  dataRollupSchema.index({ bucket: 1 }, { expireAfterSeconds: MINUTE_RETENTION_SECONDS, ...MINUTE_EXPIRY });
+}
+// Minute rollups older than this (ms) may have expired; 0 when they are kept
+dataRollupSchema.statics.minuteRetentionMs = MINUTE_RETENTION_SECONDS * 1000;
+
+// Applies a changed minuteRollupRetentionDays to an existing collection
+dataRollupSchema.statics.checkIndexes = function () {
+  return syncTtlIndex(this, { bucket: 1 }, MINUTE_RETENTION_SECONDS, MINUTE_EXPIRY);
+};
+
+module.exports = mongoose.model('DataRollup', dataRollupSchema);
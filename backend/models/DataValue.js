@@ -1,17 +1,30 @@
 // models/DataValue.js
 const mongoose = require('mongoose');
+const { insertManyIgnoringDuplicates } = require('../utils/bulkWrite');
+const { syncTtlIndex } = require('../utils/ttlIndex');
 
-const dataValueSchema = new mongoose.Schema({
-  key: {
-    type: String,
-    required: true,
-    index: true
-  },
-  machine: {
-    type: String,
-    required: true,
-    index: true
-  },
+// Load Configuration
+const config = require('../config');
+const storage = config.storage || {};
+
+// With storage.timeSeries the raw points live in a MongoDB time-series
+// collection (datavalues_ts) with { key, machine } as metaField, instead of
+// the plain datavalues collection; scripts/migrateDataValues.js copies the
+// data over. With storage.rawRetentionDays raw points expire after that many
+// days (TTL) and older ranges are served from the rollups.
+const TIME_SERIES = Boolean(storage.timeSeries);
+const RAW_RETENTION_SECONDS = Math.round((storage.rawRetentionDays || 0) * 24 * 60 * 60);
+
+// Reduction of the samples an agent took within one upload window;
+// `value` then holds the last sample of the window.
+const aggregateSchema = new mongoose.Schema({
+  min: Number,
+  max: Number,
+  mean: Number,
+  count: Number
+}, { _id: false });
+
+const measurementFields = {
   value: {
     type: mongoose.Schema.Types.Mixed, // Can be Number or String
     required: true
@@ -19,11 +32,163 @@ const dataValueSchema = new mongoose.Schema({
   timestamp: {
     type: Date,
     default: Date.now,
-    index: true
+    required: TIME_SERIES
+  },
+  agg: {
+    type: aggregateSchema,
+    default: undefined
+  }
+};
+
+let dataValueSchema;
+if (TIME_SERIES) {
+  const timeseries = { timeField: 'timestamp', metaField: 'meta', granularity: 'seconds' };
+  dataValueSchema = new mongoose.Schema({
+    meta: {
+      key: { type: String, required: true },
+      machine: { type: String, required: true }
+    },
+    ...measurementFields
+  }, {
+    timestamps: true,
+    timeseries,
+    expireAfterSeconds: RAW_RETENTION_SECONDS || undefined,
+    collection: 'datavalues_ts'
+  });
+  // Time-series collections cannot have unique indexes; see insertPoints
+  dataValueSchema.index({ 'meta.key': 1, 'meta.machine': 1, timestamp: -1 });
+} else {
+  dataValueSchema = new mongoose.Schema({
+    key: {
+      type: String,
+      required: true
+    },
+    machine: {
+      type: String,
+      required: true
+    },
+    ...measurementFields
+  }, { timestamps: true });
+
+  // Compound index for efficient querying. It is unique so that uploading the
+  // same point again (agent retries, spool replays, re-run imports) is a no-op;
+  // run scripts/dedupeDataValues.js once on databases created before.
+  dataValueSchema.index({ key: 1, machine: 1, timestamp: -1 }, { unique: true });
+  if (RAW_RETENTION_SECONDS) {
+    dataValueSchema.index({ timestamp: 1 }, { expireAfterSeconds: RAW_RETENTION_SECONDS });
+  }
+}
+
+// Paths of the key and machine in stored documents
+dataValueSchema.statics.KEY = TIME_SERIES ? 'meta.key' : 'key';
+dataValueSchema.statics.MACHINE = TIME_SERIES ? 'meta.machine' : 'machine';
+dataValueSchema.statics.timeSeries = TIME_SERIES;
+// Raw points older than this (ms) may have expired; 0 when they are kept
+dataValueSchema.statics.rawRetentionMs = RAW_RETENTION_SECONDS * 1000;
+
+// Filter on the series of `key` (a key name or a query such as { $in: [...] }) on `machine`
+dataValueSchema.statics.seriesFilter = function (key, machine) {
+  return { [this.KEY]: key, [this.MACHINE]: machine };
+};
+
+// Projection of the stored key and machine fields
+dataValueSchema.statics.seriesProjection = function () {
+  return TIME_SERIES ? { meta: 1 } : { key: 1, machine: 1 };
+};
+
+// Converts a point ({ key, machine, value, timestamp, ... }) to a stored document
+dataValueSchema.statics.toStored = function (point) {
+  if (!TIME_SERIES) {
+    return point;
+  }
+  const { key, machine, ...measurement } = point;
+  return { meta: { key, machine }, ...measurement };
+};
+
+// Converts a stored (lean) document back to a point
+dataValueSchema.statics.fromStored = function (doc) {
+  if (!TIME_SERIES || !doc.meta) {
+    return doc;
+  }
+  const { meta, ...measurement } = doc;
+  return { key: meta.key, machine: meta.machine, ...measurement };
+};
+
+// Inserts points, skipping those already stored (same key, machine and
+// timestamp). Returns { inserted, duplicates, insertedDocs } with the points
+// that were stored. The plain collection relies on its unique index; the
+// time-series collection looks the timestamps up first, which covers retries
+// and re-run imports but not two concurrent uploads of the same point.
+dataValueSchema.statics.insertPoints = async function (points, options = {}) {
+  if (!TIME_SERIES) {
+    return insertManyIgnoringDuplicates(this, points, options);
   }
-}, { timestamps: true });
 
-// Compound index for efficient querying
-dataValueSchema.index({ key: 1, machine: 1, timestamp: -1 });
+  const seriesOf = (point) => `${point.key}\u0000${point.machine}`;
+  const series = new Map();
+  points.forEach(point => {
+    const id = seriesOf(point);
+    if (!series.has(id)) {
+      series.set(id, { key: point.key, machine: point.machine, timestamps: [] });
+    }
+    series.get(id).timestamps.push(point.timestamp);
+  });
+  const existing = await this.find({
+    $or: [...series.values()].map(({ key, machine, timestamps }) => ({
+      ...this.seriesFilter(key, machine),
+      timestamp: { $in: timestamps }
+    }))
+  }).select({ _id: 0, meta: 1, timestamp: 1 }).lean();
+  const seen = new Set(existing.map(doc => `${doc.meta.key}\u0000${doc.meta.machine}\u0000${doc.timestamp.getTime()}`));
+
+  const insertedDocs = points.filter(point => {
+    const id = `${seriesOf(point)}\u0000${point.timestamp.getTime()}`;
+    if (seen.has(id)) {
+      return false;
+    }
+    seen.add(id);
+    return true;
+  });
+  if (insertedDocs.length > 0) {
+    await this.insertMany(insertedDocs.map(point => this.toStored(point)), { ...options, ordered: false });
+  }
+  return {
+    inserted: insertedDocs.length,
+    duplicates: points.length - insertedDocs.length,
+    insertedDocs
+  };
+};
+
+// Checks the indexes of an existing collection, which autoIndex cannot change
+// (an index of the same name but other options is left as it is). Applies
+// storage.rawRetentionDays to the collection's expiry, and logs an error if the
+// (key, machine, timestamp) index is not unique yet: until
+// scripts/dedupeDataValues.js has been run, a point uploaded again is stored twice.
+dataValueSchema.statics.checkIndexes = async function () {
+  if (TIME_SERIES) {
+    const [info] = await this.db.db.listCollections({ name: this.collection.collectionName }).toArray();
+    if (info && info.options.expireAfterSeconds !== (RAW_RETENTION_SECONDS || undefined)) {
+      await this.db.db.command({ collMod: this.collection.collectionName, expireAfterSeconds: RAW_RETENTION_SECONDS || 'off' });
+      console.log(`${this.collection.collectionName}: raw data retention set to ${storage.rawRetentionDays || 'unlimited'} days.`);
+    }
+    return;
+  }
+  let indexes;
+  try {
+    indexes = await this.collection.indexes();
+  } catch (err) {
+    if (err.codeName === 'NamespaceNotFound') {
+      return; // a new database; autoIndex creates the indexes
+    }
+    throw err;
+  }
+  const series = indexes.find(index => index.name === 'key_1_machine_1_timestamp_-1');
+  if (series && !series.unique) {
+    console.error('DataValue: the (key, machine, timestamp) index is not unique, so points uploaded again are '
+      + 'stored twice. Stop the backend and run `node scripts/dedupeDataValues.js` once.');
+  }
+  // Databases from before retention existed have a plain timestamp_1 index
+  await syncTtlIndex(this, { timestamp: 1 }, RAW_RETENTION_SECONDS);
+};
 
 module.exports = mongoose.model('DataValue', dataValueSchema);
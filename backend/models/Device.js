@@ -21,6 +21,10 @@ const deviceSchema = new mongoose.Schema({
     type: Date,
     default: Date.now
   },
+  ingestTokenVersion: {
+    type: Number, // bumped by each new ingest token, which invalidates the previous one
+    default: 0
+  },
   // Add more fields as necessary
 });
 
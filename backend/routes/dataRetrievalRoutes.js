@@ -3,7 +3,10 @@ const express = require('express');
 const router = express.Router();
 const {
   getDailyData,
-  getMonthlyAggregatedData
+  getMonthlyAggregatedData,
+  exportData,
+  streamLiveData,
+  getLiveStats
 } = require('../controllers/dataRetrievalController');
 const authenticate = require('../middleware/authMiddleware');
 
@@ -16,4 +19,13 @@ router.get('/daily', getDailyData);
 // GET /api/data/month - Get monthly aggregated data
 router.get('/month', getMonthlyAggregatedData);
 
+// GET /api/data/export - Stream the raw data of one key (NDJSON)
+router.get('/export', exportData);
+
+// GET /api/data/live - New points of some keys of a device (Server-Sent Events)
+router.get('/live', streamLiveData);
+
+// GET /api/data/live/stats - Live update subscribers and counters
+router.get('/live/stats', getLiveStats);
+
 module.exports = router;
@@ -1,11 +1,13 @@
 // backend/routes/dataRoutes.js
 const express = require('express');
 const router = express.Router();
-const { uploadDataValue, uploadDataValues } = require('../controllers/dataController');
-const authenticate = require('../middleware/authMiddleware');
+const { uploadDataValue, uploadDataValues, uploadColumnarValues } = require('../controllers/dataController');
+const { authenticateIngest } = require('../middleware/authMiddleware');
+const msgpackBody = require('../middleware/msgpackMiddleware');
 
-// Apply authentication middleware to all routes in this router
-router.use(authenticate);
+// Apply authentication middleware to all routes in this router; device
+// ingest tokens are accepted here
+router.use(authenticateIngest);
 
 // POST /api/data - Upload a single DataValue
 router.post('/', uploadDataValue);
@@ -13,4 +15,7 @@ router.post('/', uploadDataValue);
 // POST /api/data/bulk - Upload multiple DataValues
 router.post('/bulk', uploadDataValues);
 
+// POST /api/data/columnar - Upload a columnar batch (JSON or application/msgpack)
+router.post('/columnar', msgpackBody, uploadColumnarValues);
+
 module.exports = router;
@@ -4,8 +4,11 @@ const router = express.Router();
 const {
   getAllDevices,
   createDevice,
+  createDevices,
   updateDevice,
-  deleteDevice
+  deleteDevice,
+  deleteDevices,
+  issueIngestToken
 } = require('../controllers/deviceController');
 const authenticate = require('../middleware/authMiddleware');
 const authorizeAdmin = require('../middleware/authorizeAdminMiddleware');
@@ -20,9 +23,18 @@ router.get('/', getAllDevices);
 // POST /api/devices - Create a new device
 router.post('/', createDevice);
 
+// POST /api/devices/bulk - Create many devices (one result per item)
+router.post('/bulk', createDevices);
+
+// POST /api/devices/bulk-delete - Delete many devices by deviceId
+router.post('/bulk-delete', deleteDevices);
+
 // PUT /api/devices/:deviceId - Update a device
 router.put('/:deviceId', updateDevice);
 
+// POST /api/devices/:deviceId/token - Issue an ingest token for a device
+router.post('/:deviceId/token', issueIngestToken);
+
 // DELETE /api/devices/:deviceId - Delete a device
 router.delete('/:deviceId', deleteDevice);
 
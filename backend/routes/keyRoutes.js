@@ -3,6 +3,8 @@ const express = require('express');
 const router = express.Router();
 const {
   createDataType,
+  createDataTypes,
+  deleteDataTypes,
   getAllDataTypes,
   getDataType,
   updateDataType,
@@ -21,6 +23,12 @@ router.get('/', getAllDataTypes);
 // POST /api/keys - Create a new key
 router.post('/', createDataType);
 
+// POST /api/keys/bulk - Create many keys (one result per item)
+router.post('/bulk', createDataTypes);
+
+// POST /api/keys/bulk-delete - Delete many keys by keyName
+router.post('/bulk-delete', deleteDataTypes);
+
 // GET /api/keys/:keyName - Get a specific key
 router.get('/:keyName', getDataType);
 
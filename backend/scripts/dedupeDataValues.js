@@ -0,0 +1,62 @@
+// scripts/dedupeDataValues.js
+// One-off migration for databases created before DataValue's
+// (key, machine, timestamp) index became unique: removes duplicate points,
+// keeping the first one stored, then rebuilds the indexes.
+//
+//   node scripts/dedupeDataValues.js
+//
+// Not needed with storage.timeSeries: the time-series collection has no
+// unique index and DataValue.insertPoints skips duplicates itself.
+const mongoose = require('mongoose');
+const DataValue = require('../models/DataValue');
+
+// Load Configuration
+const config = require('../config');
+
+// Duplicate ids are deleted in batches of this size
+const DELETE_BATCH_SIZE = 10000;
+
+const removeDuplicates = async () => {
+  const groups = DataValue.aggregate([
+    { $group: { _id: { key: '$key', machine: '$machine', timestamp: '$timestamp' }, ids: { $push: '$_id' }, count: { $sum: 1 } } },
+    { $match: { count: { $gt: 1 } } }
+  ]).allowDiskUse(true).cursor({ batchSize: 1000 });
+
+  let removed = 0;
+  let batch = [];
+  for await (const group of groups) {
+    // ObjectIds grow with insertion time, so the smallest is the first stored
+    const ids = group.ids.sort((a, b) => a.toString().localeCompare(b.toString()));
+    batch.push(...ids.slice(1));
+    if (batch.length >= DELETE_BATCH_SIZE) {
+      removed += (await DataValue.deleteMany({ _id: { $in: batch } })).deletedCount;
+      batch = [];
+    }
+  }
+  if (batch.length > 0) {
+    removed += (await DataValue.deleteMany({ _id: { $in: batch } })).deletedCount;
+  }
+  return removed;
+};
+
+if (DataValue.timeSeries) {
+  console.log('storage.timeSeries is set; the time-series collection needs no deduplication.');
+  process.exit(0);
+}
+
+// Connect to MongoDB
+mongoose.connect(config.database.uri, config.database.options)
+  .then(async () => {
+    console.log('Connected to MongoDB');
+    const removed = await removeDuplicates();
+    console.log(`Removed ${removed} duplicate data values.`);
+    // Replaces the old non-unique index with the unique one
+    await DataValue.syncIndexes();
+    console.log('Indexes rebuilt.');
+    mongoose.disconnect();
+  })
+  .catch(err => {
+    console.error('Error:', err);
+    mongoose.disconnect();
+    process.exitCode = 1;
+  });
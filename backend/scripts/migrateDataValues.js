@@ -0,0 +1,92 @@
+// scripts/migrateDataValues.js
+// Copies the raw points of the plain datavalues collection into the
+// time-series collection (datavalues_ts) used with storage.timeSeries.
+//
+// Set storage.timeSeries in config/config.yaml, then run this while the
+// backend still writes to the old collection; once the backend is restarted
+// on the new layout, run it again with --since <time of the first run> to
+// copy the points that arrived in between. Points already copied are
+// skipped, so it can also simply be run again after a failure. With
+// storage.rawRetentionDays only the points that would not expire at once are
+// copied. The old collection is left in place; drop it when satisfied.
+//
+//   node scripts/migrateDataValues.js [--since <ISO time>]
+const mongoose = require('mongoose');
+const DataValue = require('../models/DataValue');
+
+// Load Configuration
+const config = require('../config');
+
+const SOURCE_COLLECTION = 'datavalues';
+// Points per insert
+const CHUNK_POINTS = 5000;
+
+const option = (name) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index >= 0 ? process.argv[index + 1] : undefined;
+};
+
+const migrate = async () => {
+  // Creates the time-series collection and its index
+  await DataValue.init();
+
+  const filter = {};
+  const since = option('since');
+  let start = since ? new Date(since) : null;
+  if (start && isNaN(start)) {
+    throw new Error(`Invalid --since value: ${since}`);
+  }
+  if (DataValue.rawRetentionMs) {
+    const cutoff = new Date(Date.now() - DataValue.rawRetentionMs);
+    if (!start || start < cutoff) {
+      start = cutoff;
+    }
+  }
+  if (start) {
+    filter.timestamp = { $gte: start };
+  }
+
+  const cursor = mongoose.connection.collection(SOURCE_COLLECTION)
+    .find(filter, { projection: { _id: 0, key: 1, machine: 1, value: 1, timestamp: 1, agg: 1, createdAt: 1, updatedAt: 1 } })
+    .batchSize(CHUNK_POINTS);
+
+  let copied = 0;
+  let skipped = 0;
+  let chunk = [];
+  const flush = async () => {
+    const result = await DataValue.insertPoints(chunk);
+    copied += result.inserted;
+    skipped += result.duplicates;
+    chunk = [];
+    console.log(`${copied} points copied, ${skipped} already present`);
+  };
+  for await (const point of cursor) {
+    chunk.push(point);
+    if (chunk.length >= CHUNK_POINTS) {
+      await flush();
+    }
+  }
+  if (chunk.length > 0) {
+    await flush();
+  }
+  return { copied, skipped };
+};
+
+if (!DataValue.timeSeries) {
+  console.log('Set storage.timeSeries in config/config.yaml first.');
+  process.exit(1);
+}
+
+// Connect to MongoDB
+mongoose.connect(config.database.uri, config.database.options)
+  .then(async () => {
+    console.log('Connected to MongoDB');
+    const { copied, skipped } = await migrate();
+    console.log(`Copied ${copied} data values (${skipped} were already present).`);
+    mongoose.disconnect();
+  })
+  .catch(err => {
+    console.error('Error:', err);
+    mongoose.disconnect();
+    process.exitCode = 1;
+  });
@@ -0,0 +1,106 @@
+// scripts/rebuildRollups.js
+// Rebuilds the minute/hour rollups (utils/rollups.js) from the raw data, for
+// data stored before rollups existed or after out-of-order backfills.
+//
+//   node scripts/rebuildRollups.js [--key <keyName>] [--machine <deviceId>] [--from <time>]
+//
+// Only the buckets from --from on are rebuilt. With storage.rawRetentionDays
+// that defaults to, and cannot be before, the first full hour whose raw points
+// are all still stored: the rollups of older ranges are the only copy left.
+const mongoose = require('mongoose');
+const DataType = require('../models/DataType');
+const DataValue = require('../models/DataValue');
+const DataRollup = require('../models/DataRollup');
+const { updateRollups } = require('../utils/rollups');
+
+// Load Configuration
+const config = require('../config');
+
+// Points per rollup update; chunks are applied in time order, so the area
+// across chunk boundaries is joined exactly
+const CHUNK_POINTS = 10000;
+// Raw points keep expiring while the rebuild runs; stay this far clear of the cutoff
+const RETENTION_MARGIN_MS = 60 * 60 * 1000;
+const HOUR_MS = 60 * 60 * 1000;
+
+const option = (name) => {
+  const index = process.argv.indexOf(`--${name}`);
+  return index >= 0 ? process.argv[index + 1] : undefined;
+};
+
+const rebuild = async () => {
+  const keyName = option('key');
+  const machine = option('machine');
+
+  let from = option('from') ? new Date(option('from')) : null;
+  if (from && isNaN(from)) {
+    throw new Error(`Invalid --from time '${option('from')}'.`);
+  }
+  if (from) {
+    // Whole hours, so that no hour rollup is rebuilt from part of its points
+    from = new Date(Math.floor(from.getTime() / HOUR_MS) * HOUR_MS);
+  }
+  if (DataValue.rawRetentionMs) {
+    const retained = new Date(Math.ceil((Date.now() - DataValue.rawRetentionMs + RETENTION_MARGIN_MS) / HOUR_MS) * HOUR_MS);
+    if (from && from < retained) {
+      throw new Error(`Raw points before ${retained.toISOString()} may have expired (storage.rawRetentionDays); `
+        + 'rebuilding from --from would lose the rollups of that range.');
+    }
+    from = from || retained;
+  }
+
+  const floatKeys = (await DataType.find({ dataType: 'float', ...(keyName ? { keyName } : {}) }).lean())
+    .map(dt => dt.keyName);
+  const filter = { key: { $in: floatKeys } };
+  if (machine) {
+    filter.machine = machine;
+  }
+  if (from) {
+    console.log(`Rebuilding the rollups from ${from.toISOString()} on.`);
+    filter.bucket = { $gte: from };
+  }
+  await DataRollup.deleteMany(filter);
+
+  const valueFilter = DataValue.seriesFilter(filter.key, machine);
+  if (!machine) {
+    delete valueFilter[DataValue.MACHINE];
+  }
+  if (from) {
+    valueFilter.timestamp = { $gte: from };
+  }
+
+  // Walks the (key, machine, timestamp) index backwards: time order per series
+  const cursor = DataValue.find(valueFilter)
+    .select({ _id: 0, timestamp: 1, value: 1, ...DataValue.seriesProjection() })
+    .sort({ [DataValue.KEY]: -1, [DataValue.MACHINE]: -1, timestamp: 1 })
+    .lean()
+    .cursor({ batchSize: CHUNK_POINTS });
+
+  let points = 0;
+  let chunk = [];
+  for await (const doc of cursor) {
+    chunk.push(DataValue.fromStored(doc));
+    if (chunk.length >= CHUNK_POINTS) {
+      await updateRollups(chunk);
+      points += chunk.length;
+      chunk = [];
+      console.log(`${points} points rolled up`);
+    }
+  }
+  await updateRollups(chunk);
+  return points + chunk.length;
+};
+
+// Connect to MongoDB
+mongoose.connect(config.database.uri, config.database.options)
+  .then(async () => {
+    console.log('Connected to MongoDB');
+    const points = await rebuild();
+    console.log(`Rebuilt rollups from ${points} points.`);
+    mongoose.disconnect();
+  })
+  .catch(err => {
+    console.error('Error:', err);
+    mongoose.disconnect();
+    process.exitCode = 1;
+  });
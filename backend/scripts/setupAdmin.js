@@ -1,11 +1,10 @@
 // scripts/setupAdmin.js
 const mongoose = require('mongoose');
 const bcrypt = require('bcrypt');
-const yaml = require('yamljs');
 const User = require('../models/User');
 
 // Load Configuration
-const config =  yaml.load('./config/config.yaml');
+const config = require('../config');
 
 // Connect to MongoDB
 mongoose.connect(config.database.uri, config.database.options)
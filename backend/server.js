@@ -1,31 +1,190 @@
 require('dotenv').config(); // Load environment variables
 const fs = require('fs');
+const os = require('os');
 const https = require('https');
-const app = require('./app');
-const mongoose = require('mongoose');
-const yaml = require('yamljs');
-const config = yaml.load('./config/config.yaml');
-
-// Connect to MongoDB
-mongoose.connect(config.database.uri, config.database.options)
-  .then(() => {
-    console.log('MongoDB connected');
-  })
-  .catch(err => {
-    console.error('MongoDB connection error:', err);
-    process.exit(1);
+const cluster = require('cluster');
+const config = require('./config');
+
+// Number of server processes: server.workers (or WORKERS), 'auto' for one per
+// CPU. With more than one, a primary process forks that many workers, which
+// share the port and each have their own MongoDB connection pool.
+const WORKERS = (() => {
+  const workers = process.env.WORKERS || config.server.workers || 1;
+  if (workers === 'auto') {
+    return os.availableParallelism ? os.availableParallelism() : os.cpus().length;
+  }
+  return Math.max(1, parseInt(workers, 10) || 1);
+})();
+// Seconds a stopping server waits for its open requests before it exits anyway
+const SHUTDOWN_TIMEOUT_MS = (config.server.shutdownTimeout || 30) * 1000;
+// A worker that died is replaced after this delay, so a crash loop cannot spin
+const RESTART_DELAY_MS = 1000;
+
+// Serves the API in this process
+const runServer = () => {
+  const mongoose = require('mongoose');
+  const app = require('./app');
+  const liveHub = require('./utils/liveHub');
+  const analyticsPool = require('./utils/analyticsPool');
+  const name = cluster.isWorker ? `Worker ${process.pid}` : 'Server';
+
+  // Connect to MongoDB
+  mongoose.connect(config.database.uri, config.database.options)
+    .then(() => {
+      console.log('MongoDB connected');
+      // Once per cluster: the workers share the database
+      if (!cluster.isWorker || cluster.worker.id === 1) {
+        require('./models/DataValue').checkIndexes()
+          .catch(err => console.error('Could not check the DataValue indexes:', err));
+        require('./models/DataRollup').checkIndexes()
+          .catch(err => console.error('Could not check the DataRollup indexes:', err));
+      }
+    })
+    .catch(err => {
+      console.error('MongoDB connection error:', err);
+      process.exit(1);
+    });
+
+  // SSL options
+  const sslOptions = {
+    key: fs.readFileSync('./server.key'), // Replace with the actual path to your key file
+    cert: fs.readFileSync('./server.cert') // Replace with the actual path to your cert file
+  };
+
+  // Start the HTTPS server
+  const PORT = process.env.PORT || config.server.port || 3000;
+  const HOST = process.env.HOST || config.server.host || '0.0.0.0';
+
+  const server = https.createServer(sslOptions, app);
+
+  // Agents reuse one keep-alive connection and post every few seconds, so keep
+  // idle sockets open well past that instead of Node's 5s default; otherwise
+  // most uploads would pay for a new TLS handshake.
+  server.keepAliveTimeout = (config.server.keepAliveTimeout || 65) * 1000;
+  server.headersTimeout = server.keepAliveTimeout + 1000;
+
+  server.listen(PORT, HOST, () => {
+    console.log(`${name}: HTTPS Server is running on https://${HOST}:${PORT}`);
   });
 
-// SSL options
-const sslOptions = {
-  key: fs.readFileSync('./server.key'), // Replace with the actual path to your key file
-  cert: fs.readFileSync('./server.cert') // Replace with the actual path to your cert file
+  // Stops accepting connections, lets open requests finish, then exits.
+  // Keep-alive connections are closed as soon as they are idle, and live
+  // update streams right away (the dashboards reconnect to another worker).
+  let stopping = false;
+  const shutdown = (reason) => {
+    if (stopping) {
+      return;
+    }
+    stopping = true;
+    console.log(`${name}: shutting down (${reason})`);
+    const closeIdle = setInterval(() => server.closeIdleConnections(), 1000);
+    server.close(async () => {
+      clearInterval(closeIdle);
+      await analyticsPool.close();
+      await mongoose.disconnect();
+      process.exit(0);
+    });
+    liveHub.closeAll();
+    server.closeIdleConnections();
+    setTimeout(() => {
+      console.error(`${name}: open requests did not finish within ${SHUTDOWN_TIMEOUT_MS / 1000} s; exiting.`);
+      process.exit(1);
+    }, SHUTDOWN_TIMEOUT_MS).unref();
+  };
+  process.on('SIGTERM', () => shutdown('SIGTERM'));
+  process.on('SIGINT', () => shutdown('SIGINT'));
+  if (cluster.isWorker) {
+    process.on('message', message => {
+      if (message === 'shutdown') {
+        shutdown('restart');
+      }
+    });
+  }
 };
 
-// Start the HTTPS server
-const PORT = process.env.PORT || config.server.port || 3000;
-const HOST = process.env.HOST || config.server.host || '0.0.0.0';
+// Forks the workers, replaces those that die, restarts them one at a time on
+// SIGHUP (e.g. after a deploy) and stops them on SIGTERM/SIGINT
+const runPrimary = () => {
+  const bus = require('./utils/clusterBus');
+  console.log(`Primary ${process.pid}: starting ${WORKERS} workers`);
+
+  // Workers being replaced or stopped on purpose
+  const retiring = new Set();
+  let stopping = false;
+  let restarting = false;
+
+  const fork = () => {
+    const worker = cluster.fork();
+    bus.relay(worker);
+    return worker;
+  };
+
+  cluster.on('exit', (worker, code, signal) => {
+    bus.announceExit(worker);
+    if (retiring.delete(worker.id)) {
+      if (stopping && Object.keys(cluster.workers).length === 0) {
+        process.exit(0);
+      }
+      return;
+    }
+    if (!stopping) {
+      console.error(`Primary: worker ${worker.process.pid} died (${signal || code}); starting a new one`);
+      setTimeout(fork, RESTART_DELAY_MS);
+    }
+  });
+
+  // Replaces one worker after another, each once its replacement is listening,
+  // so the port is served throughout
+  process.on('SIGHUP', async () => {
+    if (restarting || stopping) {
+      return;
+    }
+    restarting = true;
+    console.log('Primary: restarting workers');
+    for (const worker of Object.values(cluster.workers)) {
+      const replacement = fork();
+      const listening = await new Promise(resolve => {
+        replacement.once('listening', () => resolve(true));
+        replacement.once('exit', () => resolve(false));
+      });
+      if (!listening) {
+        console.error('Primary: a new worker failed to start; restart aborted');
+        restarting = false;
+        return;
+      }
+      retiring.add(worker.id);
+      const exited = new Promise(resolve => worker.once('exit', resolve));
+      worker.send('shutdown');
+      await exited;
+    }
+    restarting = false;
+    console.log('Primary: workers restarted');
+  });
+
+  const stop = () => {
+    if (stopping) {
+      return;
+    }
+    stopping = true;
+    const workers = Object.values(cluster.workers);
+    if (workers.length === 0) {
+      process.exit(0);
+    }
+    workers.forEach(worker => {
+      retiring.add(worker.id);
+      worker.send('shutdown');
+    });
+  };
+  process.on('SIGTERM', stop);
+  process.on('SIGINT', stop);
+
+  for (let i = 0; i < WORKERS; i++) {
+    fork();
+  }
+};
 
-https.createServer(sslOptions, app).listen(PORT, HOST, () => {
-  console.log(`HTTPS Server is running on https://${HOST}:${PORT}`);
-});
+if (cluster.isPrimary && WORKERS > 1) {
+  runPrimary();
+} else {
+  runServer();
+}
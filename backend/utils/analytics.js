@@ -0,0 +1,21 @@
+// utils/analytics.js
+// Analytics tasks that may take a while, run on the analytics threads
+// (utils/analyticsPool.js) so that they do not hold up the event loop that
+// serves uploads. Each task takes one plain argument object and returns a
+// plain result.
+const DataValue = require('../models/DataValue');
+const { rangeStats } = require('./rollups');
+
+// Statistics of key on device since `since` (see rangeStats), or null without data
+const monthlyStats = async ({ key, device, since }) => {
+  const loadRaw = async (from, to) => (await DataValue.find({
+    ...DataValue.seriesFilter(key, device),
+    timestamp: { $gte: from, $lt: to }
+  })
+    .select({ _id: 0, timestamp: 1, value: 1, ...DataValue.seriesProjection() })
+    .sort({ timestamp: 1 })
+    .lean()).map(doc => DataValue.fromStored(doc));
+  return rangeStats(key, device, since, null, loadRaw);
+};
+
+module.exports = { monthlyStats };
@@ -0,0 +1,77 @@
+// utils/analyticsPool.js
+// A small pool of worker threads for the tasks of utils/analytics.js (e.g.
+// the monthly statistics), so that one slow analytics request cannot stall
+// the event loop that serves uploads. Each thread has its own MongoDB
+// connection and runs several tasks at a time; a task goes to the thread with
+// the fewest running. server.analyticsThreads sets the number of threads
+// (default 2); with 0 the tasks run on the main thread.
+//
+// Threads are started on first use and restarted when one dies, failing only
+// the tasks it was running.
+const path = require('path');
+const { Worker } = require('worker_threads');
+const config = require('../config');
+const tasks = require('./analytics');
+
+const THREADS = config.server.analyticsThreads === undefined ? 2 : config.server.analyticsThreads;
+// MongoDB connections per thread
+const THREAD_POOL_SIZE = 5;
+
+const threads = [];
+let nextId = 1;
+
+const startThread = () => {
+  const thread = {
+    worker: new Worker(path.join(__dirname, 'analyticsWorker.js'), { workerData: { maxPoolSize: THREAD_POOL_SIZE } }),
+    pending: new Map()
+  };
+  thread.worker.on('message', ({ id, result, error }) => {
+    const task = thread.pending.get(id);
+    if (!task) {
+      return;
+    }
+    thread.pending.delete(id);
+    if (thread.pending.size === 0) {
+      thread.worker.unref();
+    }
+    if (error) {
+      task.reject(new Error(error));
+    } else {
+      task.resolve(result);
+    }
+  });
+  const fail = (err) => {
+    const index = threads.indexOf(thread);
+    if (index >= 0) {
+      threads.splice(index, 1);
+    }
+    thread.pending.forEach(task => task.reject(err));
+    thread.pending.clear();
+  };
+  thread.worker.on('error', fail);
+  thread.worker.on('exit', code => fail(new Error(`Analytics thread exited with code ${code}.`)));
+  threads.push(thread);
+  return thread;
+};
+
+// Runs a task of utils/analytics.js; resolves with its result
+const runTask = (task, args) => {
+  if (THREADS <= 0) {
+    return tasks[task](args);
+  }
+  const thread = threads.length < THREADS
+    ? startThread()
+    : threads.reduce((least, candidate) => (candidate.pending.size < least.pending.size ? candidate : least));
+  const id = nextId++;
+  return new Promise((resolve, reject) => {
+    // Only threads with running tasks keep the process alive
+    thread.worker.ref();
+    thread.pending.set(id, { resolve, reject });
+    thread.worker.postMessage({ id, task, args });
+  });
+};
+
+// Stops the threads, e.g. on shutdown
+const close = () => Promise.all(threads.slice().map(thread => thread.worker.terminate()));
+
+module.exports = { runTask, close };
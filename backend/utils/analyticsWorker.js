@@ -0,0 +1,25 @@
+// utils/analyticsWorker.js
+// Entry point of an analytics thread (see utils/analyticsPool.js): runs the
+// tasks of utils/analytics.js posted by the pool over its own MongoDB
+// connection and posts back { id, result } or { id, error }.
+const { parentPort, workerData } = require('worker_threads');
+const mongoose = require('mongoose');
+const config = require('../config');
+const tasks = require('./analytics');
+
+const connected = mongoose.connect(config.database.uri, {
+  ...config.database.options,
+  maxPoolSize: workerData.maxPoolSize
+});
+
+parentPort.on('message', async ({ id, task, args }) => {
+  try {
+    await connected;
+    if (!tasks[task]) {
+      throw new Error(`Unknown analytics task '${task}'.`);
+    }
+    parentPort.postMessage({ id, result: await tasks[task](args) });
+  } catch (err) {
+    parentPort.postMessage({ id, error: err.message });
+  }
+});
@@ -0,0 +1,48 @@
+// utils/bulkWrite.js
+// Helpers for the bulk admin endpoints, which answer 200 with one result per
+// item: { results: [{ <id field>: ..., status, message }] }, where status and
+// message are what the single-item endpoint would have answered.
+
+// Inserts docs with one unordered insertMany.
+// Returns an array with, per doc, null on success or the validation/write error.
+const insertManyUnordered = async (Model, docs) => {
+  const errors = docs.map(doc => new Model(doc).validateSync() || null);
+  const valid = docs.map((doc, index) => index).filter(index => !errors[index]);
+  if (valid.length > 0) {
+    try {
+      await Model.insertMany(valid.map(index => docs[index]), { ordered: false });
+    } catch (err) {
+      if (!Array.isArray(err.writeErrors)) {
+        throw err;
+      }
+      err.writeErrors.forEach(writeError => {
+        errors[valid[writeError.index]] = writeError;
+      });
+    }
+  }
+  return errors;
+};
+
+const isDuplicateKeyError = (err) => err && err.code === 11000;
+
+// Inserts docs with one unordered insertMany, skipping the ones that hit a
+// unique index. Returns { inserted, duplicates, insertedDocs } (insertedDocs
+// are the given docs that were stored); any other error is thrown.
+const insertManyIgnoringDuplicates = async (Model, docs, options = {}) => {
+  try {
+    await Model.insertMany(docs, { ...options, ordered: false });
+    return { inserted: docs.length, duplicates: 0, insertedDocs: docs };
+  } catch (err) {
+    if (!Array.isArray(err.writeErrors) || !err.writeErrors.every(isDuplicateKeyError)) {
+      throw err;
+    }
+    const skipped = new Set(err.writeErrors.map(writeError => writeError.index));
+    return {
+      inserted: docs.length - skipped.size,
+      duplicates: skipped.size,
+      insertedDocs: docs.filter((doc, index) => !skipped.has(index))
+    };
+  }
+};
+
+module.exports = { insertManyUnordered, insertManyIgnoringDuplicates, isDuplicateKeyError };
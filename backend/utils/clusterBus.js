@@ -0,0 +1,53 @@
+// utils/clusterBus.js
+// Messages between the worker processes of a clustered backend (see
+// server.js): broadcast() sends a message to the primary, which relays it to
+// every other worker, where the handler registered with on() for its type is
+// called. Outside a cluster broadcast() does nothing, so callers need not care
+// how the backend runs.
+const cluster = require('cluster');
+
+const handlers = new Map();
+
+const broadcast = (type, payload) => {
+  if (cluster.isWorker && process.connected) {
+    process.send({ bus: type, payload });
+  }
+};
+
+// handler(payload, fromWorkerId); one handler per type
+const on = (type, handler) => {
+  handlers.set(type, handler);
+};
+
+if (cluster.isWorker) {
+  process.on('message', (message) => {
+    if (message && message.bus && handlers.has(message.bus)) {
+      handlers.get(message.bus)(message.payload, message.from);
+    }
+  });
+}
+
+// Relays the bus messages of `worker` to the other workers; called by the primary
+const relay = (worker) => {
+  worker.on('message', (message) => {
+    if (!message || !message.bus) {
+      return;
+    }
+    Object.values(cluster.workers).forEach(other => {
+      if (other && other.id !== worker.id && other.isConnected()) {
+        other.send({ ...message, from: worker.id });
+      }
+    });
+  });
+};
+
+// Tells the remaining workers that a worker has exited; called by the primary
+const announceExit = (worker) => {
+  Object.values(cluster.workers).forEach(other => {
+    if (other && other.id !== worker.id && other.isConnected()) {
+      other.send({ bus: 'worker-exit', payload: null, from: worker.id });
+    }
+  });
+};
+
+module.exports = { broadcast, on, relay, announceExit };
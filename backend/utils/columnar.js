@@ -0,0 +1,108 @@
+// utils/columnar.js
+// Columnar upload batches: one machine, one timestamp array and one value
+// array per key, with null where a key has no value at that timestamp.
+//
+//   {
+//     "machine": "01",
+//     "timestamps": ["2024-05-01T12:00:00Z", "2024-05-01T12:00:05Z"],
+//     "values": { "GPU_Temperature": [35, 36], "SYS_Memory_Usage": [3.2, null] },
+//     "agg": { "GPU_Temperature": [{ "min": 34, "max": 35, "mean": 34.6, "count": 5 }, null] }
+//   }
+//
+// `agg` is optional, per key and per timestamp.
+
+// Checks the shape of a batch; returns an error message or null.
+const checkColumnarBatch = (batch) => {
+  if (!batch || typeof batch !== 'object' || Array.isArray(batch)) {
+    return 'Expected a columnar batch object.';
+  }
+  const { machine, timestamps, values, agg } = batch;
+  if (!machine || typeof machine !== 'string') {
+    return 'machine is required.';
+  }
+  if (!Array.isArray(timestamps) || timestamps.length === 0) {
+    return 'timestamps must be a non-empty array.';
+  }
+  if (!values || typeof values !== 'object' || Array.isArray(values) || Object.keys(values).length === 0) {
+    return 'values must map at least one key to an array of values.';
+  }
+  for (const [key, column] of Object.entries(values)) {
+    if (!Array.isArray(column) || column.length !== timestamps.length) {
+      return `values of key '${key}' must be an array as long as timestamps.`;
+    }
+  }
+  if (agg !== undefined && agg !== null) {
+    if (typeof agg !== 'object' || Array.isArray(agg)) {
+      return 'agg must map keys to arrays of aggregates.';
+    }
+    for (const [key, column] of Object.entries(agg)) {
+      if (!Array.isArray(column) || column.length !== timestamps.length) {
+        return `agg of key '${key}' must be an array as long as timestamps.`;
+      }
+    }
+  }
+  return null;
+};
+
+// Converts one value to the key's DataType, as the bulk endpoint does.
+const converter = (key, dataType) => {
+  if (dataType === 'float') {
+    return (value) => {
+      if (typeof value === 'number') {
+        return value;
+      }
+      const converted = parseFloat(value);
+      if (isNaN(converted)) {
+        throw new Error(`Value for key '${key}' must be convertible to a number.`);
+      }
+      return converted;
+    };
+  }
+  if (dataType === 'message') {
+    return (value) => {
+      const converted = typeof value === 'string' ? value : String(value);
+      if (converted.length > 200) {
+        throw new Error(`Message length for key '${key}' exceeds 200 characters.`);
+      }
+      return converted;
+    };
+  }
+  throw new Error(`Unsupported dataType '${dataType}' for key '${key}'.`);
+};
+
+// Expands a checked batch into DataValue documents ready for insertMany.
+// dataTypeMap maps every key of the batch to its DataType; parseAggregate
+// validates one aggregate. `now` fills the createdAt/updatedAt timestamps
+// that Mongoose would otherwise add.
+const expandColumnarBatch = (batch, dataTypeMap, parseAggregate, now = new Date()) => {
+  const { machine, timestamps, values, agg } = batch;
+  const dates = timestamps.map((timestamp) => {
+    const date = new Date(timestamp);
+    if (isNaN(date.getTime())) {
+      throw new Error(`Invalid timestamp '${timestamp}'.`);
+    }
+    return date;
+  });
+
+  const documents = [];
+  for (const [key, column] of Object.entries(values)) {
+    const dataType = dataTypeMap[key].dataType;
+    const convert = converter(key, dataType);
+    const aggColumn = dataType === 'float' && agg ? agg[key] : undefined;
+    for (let i = 0; i < column.length; i++) {
+      const value = column[i];
+      if (value === null || value === undefined) {
+        continue;
+      }
+      const document = { key, machine, value: convert(value), timestamp: dates[i], createdAt: now, updatedAt: now };
+      const aggregate = aggColumn ? parseAggregate(key, aggColumn[i]) : undefined;
+      if (aggregate) {
+        document.agg = aggregate;
+      }
+      documents.push(document);
+    }
+  }
+  return documents;
+};
+
+module.exports = { checkColumnarBatch, expandColumnarBatch };
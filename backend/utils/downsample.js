@@ -0,0 +1,46 @@
+// utils/downsample.js
+// Server-side downsampling of float series into fixed time buckets.
+//
+// Each bucket keeps its lowest and its highest point (min/max decimation), so
+// a chart drawn from the result still shows every spike, with at most two
+// points per bucket. Where a point carries the agent's window aggregate, its
+// agg.min/agg.max count instead of the last sample, so short spikes inside an
+// upload window stay visible too.
+
+// Bucket width for at most maxPoints points (two per bucket) over rangeMs
+const bucketWidth = (rangeMs, maxPoints) => Math.max(1000, Math.ceil(rangeMs / Math.max(1, Math.floor(maxPoints / 2))));
+
+// Aggregation pipeline over the DataValues matched by `match`, grouping them by
+// key (stored at keyPath) and bucket. Documents compare field by field, so
+// $min/$max of { v, t } give the extreme value together with its timestamp.
+const downsamplePipeline = (match, since, bucketMs, keyPath = 'key') => [
+  { $match: match },
+  {
+    $group: {
+      _id: {
+        key: `$${keyPath}`,
+        bucket: { $floor: { $divide: [{ $subtract: ['$timestamp', since] }, bucketMs] } }
+      },
+      low: { $min: { v: { $ifNull: ['$agg.min', '$value'] }, t: '$timestamp' } },
+      high: { $max: { v: { $ifNull: ['$agg.max', '$value'] }, t: '$timestamp' } },
+      count: { $sum: 1 }
+    }
+  },
+  { $sort: { '_id.key': 1, '_id.bucket': 1 } }
+];
+
+// Turns the pipeline's output into { key: [{ timestamp, value }] } in time order
+const bucketsToValues = (groups) => {
+  const values = {};
+  for (const { _id, low, high } of groups) {
+    const series = values[_id.key] || (values[_id.key] = []);
+    const points = low.t <= high.t ? [low, high] : [high, low];
+    series.push({ timestamp: points[0].t, value: points[0].v });
+    if (points[1].t.getTime() !== points[0].t.getTime() || points[1].v !== points[0].v) {
+      series.push({ timestamp: points[1].t, value: points[1].v });
+    }
+  }
+  return values;
+};
+
+module.exports = { bucketWidth, downsamplePipeline, bucketsToValues };
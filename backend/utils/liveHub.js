@@ -0,0 +1,168 @@
+// utils/liveHub.js
+// Fan-out of newly stored points to live dashboards (GET /api/data/live) as
+// Server-Sent Events.
+//
+// Each subscriber watches some keys of one device. publish() is called by the
+// upload endpoints with the points they stored; it serializes the points of
+// each (device, key) series once and sends every subscriber of that device a
+// single `points` event with the series it watches:
+//
+//   event: points
+//   data: {"CPU_Usage": [{"timestamp": "...", "value": 12.5}], ...}
+//
+// A subscriber that does not keep up (more than MAX_BUFFERED_BYTES waiting to
+// be sent) is disconnected; the dashboard reconnects and reloads its range.
+//
+// In a clustered backend (see server.js) each worker announces the devices
+// its subscribers watch over utils/clusterBus.js, and an upload forwards the
+// points of devices watched on other workers to them.
+const bus = require('./clusterBus');
+
+const HEARTBEAT_MS = 25 * 1000;
+const MAX_BUFFERED_BYTES = 1024 * 1024;
+
+// Subscribers by device
+const subscribers = new Map();
+// Devices watched on the other workers, by worker id
+const remoteDevices = new Map();
+const counters = {
+  pointsPublished: 0,
+  eventsSent: 0,
+  bytesSent: 0,
+  subscribersDropped: 0
+};
+
+const send = (subscriber, chunk) => {
+  if (subscriber.res.writableEnded) {
+    return;
+  }
+  if (subscriber.res.writableLength > MAX_BUFFERED_BYTES) {
+    counters.subscribersDropped += 1;
+    subscriber.res.end();
+    return;
+  }
+  subscriber.res.write(chunk);
+  counters.bytesSent += Buffer.byteLength(chunk);
+};
+
+// Tells the other workers which devices are watched here
+const announceDevices = () => {
+  bus.broadcast('live-devices', [...subscribers.keys()]);
+};
+
+// Registers res (an open SSE response) for the given keys of device; the
+// subscription ends when the client disconnects
+const subscribe = (res, device, keys) => {
+  const subscriber = { res, keys: new Set(keys) };
+  if (!subscribers.has(device)) {
+    subscribers.set(device, new Set());
+    announceDevices();
+  }
+  subscribers.get(device).add(subscriber);
+
+  const heartbeat = setInterval(() => send(subscriber, ': ping\n\n'), HEARTBEAT_MS);
+  res.on('close', () => {
+    clearInterval(heartbeat);
+    const viewers = subscribers.get(device);
+    if (viewers) {
+      viewers.delete(subscriber);
+      if (viewers.size === 0) {
+        subscribers.delete(device);
+        announceDevices();
+      }
+    }
+  });
+
+  send(subscriber, 'event: ready\ndata: {}\n\n');
+};
+
+// Sends points to the subscribers of this worker
+const publishLocal = (points) => {
+  if (subscribers.size === 0 || points.length === 0) {
+    return;
+  }
+  // { device: { key: [values] } } for the devices someone watches
+  const series = new Map();
+  points.forEach(point => {
+    if (!subscribers.has(point.machine)) {
+      return;
+    }
+    if (!series.has(point.machine)) {
+      series.set(point.machine, new Map());
+    }
+    const byKey = series.get(point.machine);
+    if (!byKey.has(point.key)) {
+      byKey.set(point.key, []);
+    }
+    byKey.get(point.key).push({ timestamp: point.timestamp, value: point.value });
+    counters.pointsPublished += 1;
+  });
+
+  series.forEach((byKey, device) => {
+    // Each series is serialized once, however many dashboards watch it
+    const encoded = new Map();
+    byKey.forEach((values, key) => {
+      encoded.set(key, `${JSON.stringify(key)}:${JSON.stringify(values)}`);
+    });
+    subscribers.get(device).forEach(subscriber => {
+      const parts = [];
+      encoded.forEach((json, key) => {
+        if (subscriber.keys.has(key)) {
+          parts.push(json);
+        }
+      });
+      if (parts.length > 0) {
+        send(subscriber, `event: points\ndata: {${parts.join(',')}}\n\n`);
+        counters.eventsSent += 1;
+      }
+    });
+  });
+};
+
+// Sends newly stored points ({ key, machine, value, timestamp }) to the
+// subscribers of their device and key, here and on the other workers
+const publish = (points) => {
+  publishLocal(points);
+  if (remoteDevices.size === 0) {
+    return;
+  }
+  const watched = new Set();
+  remoteDevices.forEach(devices => devices.forEach(device => watched.add(device)));
+  const forwarded = points
+    .filter(point => watched.has(point.machine))
+    .map(({ key, machine, value, timestamp }) => ({ key, machine, value, timestamp }));
+  if (forwarded.length > 0) {
+    bus.broadcast('live-points', forwarded);
+  }
+};
+
+bus.on('live-points', publishLocal);
+bus.on('live-devices', (devices, from) => {
+  if (devices.length > 0) {
+    remoteDevices.set(from, new Set(devices));
+  } else {
+    remoteDevices.delete(from);
+  }
+});
+bus.on('worker-exit', (payload, from) => {
+  remoteDevices.delete(from);
+});
+// A new worker asks the others which devices they watch
+bus.on('live-hello', announceDevices);
+bus.broadcast('live-hello');
+
+// Ends every stream, e.g. when the worker shuts down; the dashboards reconnect
+const closeAll = () => {
+  subscribers.forEach(viewers => viewers.forEach(subscriber => subscriber.res.end()));
+};
+
+// Current subscribers and counters since start (of this worker)
+const stats = () => {
+  let count = 0;
+  subscribers.forEach(viewers => {
+    count += viewers.size;
+  });
+  return { subscribers: count, devices: subscribers.size, ...counters };
+};
+
+module.exports = { subscribe, publish, closeAll, stats };
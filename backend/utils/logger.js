@@ -2,9 +2,8 @@
 const morgan = require('morgan');
 const fs = require('fs');
 const path = require('path');
-const yaml = require('yamljs');
 
-const config = yaml.load('./config/config.yaml');
+const config = require('../config');
 const logStream = fs.createWriteStream(path.join(__dirname, '../logs/app.log'), { flags: 'a' });
 
 
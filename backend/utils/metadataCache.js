@@ -0,0 +1,126 @@
+// utils/metadataCache.js
+// Process-local cache of the DataTypes (by keyName) and Devices (by deviceId)
+// for the ingest and query paths, which would otherwise look them up on every
+// request although they rarely change.
+//
+// Each collection is loaded whole on first use and kept until the key and
+// device controllers invalidate it after a change, or until it is older than
+// metadataCache.ttlSeconds (for changes made outside this process, e.g. by
+// another backend instance or directly in MongoDB). A lookup that misses
+// reloads the collection first, at most once per MISS_RELOAD_MS, so a key or
+// device created elsewhere is usable right away. In a clustered backend (see
+// server.js) an invalidation is passed on to the other workers.
+const DataType = require('../models/DataType');
+const Device = require('../models/Device');
+const bus = require('./clusterBus');
+
+// Load Configuration
+const config = require('../config');
+const TTL_MS = ((config.metadataCache || {}).ttlSeconds || 60) * 1000;
+const MISS_RELOAD_MS = 1000;
+
+// Map of one collection's documents by `field`, loaded on demand
+const createCache = (load, field) => {
+  let entries = null;
+  let loadedAt = 0;
+  let loading = null;
+  let loadingGeneration = 0;
+  // Bumped by invalidate so that a load started before it is not kept
+  let generation = 0;
+
+  // Joins the load in flight, unless it started before the last invalidation
+  // and may miss the change; then a new one is started
+  const reload = () => {
+    if (!loading || loadingGeneration !== generation) {
+      const started = generation;
+      const promise = load()
+        .then(docs => {
+          const map = new Map(docs.map(doc => [doc[field], doc]));
+          if (started === generation) {
+            entries = map;
+            loadedAt = Date.now();
+          }
+          return map;
+        })
+        .finally(() => {
+          if (loading === promise) {
+            loading = null;
+          }
+        });
+      loading = promise;
+      loadingGeneration = started;
+    }
+    return loading;
+  };
+
+  // Map of all documents, fresh within TTL_MS
+  const all = async () => {
+    if (entries && Date.now() - loadedAt < TTL_MS) {
+      return entries;
+    }
+    return reload();
+  };
+
+  // Map of the documents with the given ids; ids that do not exist are left out
+  const many = async (ids) => {
+    let map = await all();
+    if (ids.some(id => !map.has(id)) && Date.now() - loadedAt >= MISS_RELOAD_MS) {
+      map = await reload();
+    }
+    const found = new Map();
+    ids.forEach(id => {
+      if (map.has(id)) {
+        found.set(id, map.get(id));
+      }
+    });
+    return found;
+  };
+
+  const invalidate = () => {
+    generation += 1;
+    entries = null;
+  };
+
+  return { all, many, invalidate };
+};
+
+const dataTypes = createCache(
+  () => DataType.find().select('keyName dataType missingDataAllowance normalRange warningRange emailAlertRange').lean(),
+  'keyName'
+);
+const devices = createCache(() => Device.find().select('deviceId name ingestTokenVersion').lean(), 'deviceId');
+
+// DataTypes of the given keyNames as { keyName: dataType }, plus the keyNames that do not exist
+const getDataTypeMap = async (keyNames) => {
+  const found = await dataTypes.many(keyNames);
+  return {
+    dataTypeMap: Object.fromEntries(found),
+    missingKeys: keyNames.filter(keyName => !found.has(keyName))
+  };
+};
+
+// DataType of one keyName, or null
+const getDataType = async (keyName) => (await dataTypes.many([keyName])).get(keyName) || null;
+
+// Device of one deviceId, or null
+const getDevice = async (deviceId) => (await devices.many([deviceId])).get(deviceId) || null;
+
+const deviceExists = async (deviceId) => (await devices.many([deviceId])).has(deviceId);
+
+// Invalidates a cache here and on the other workers
+const invalidateEverywhere = (name, cache) => {
+  bus.on(`invalidate-${name}`, cache.invalidate);
+  return () => {
+    cache.invalidate();
+    bus.broadcast(`invalidate-${name}`);
+  };
+};
+
+module.exports = {
+  getDataTypeMap,
+  getDataType,
+  getDevice,
+  deviceExists,
+  invalidateDataTypes: invalidateEverywhere('dataTypes', dataTypes),
+  invalidateDevices: invalidateEverywhere('devices', devices)
+};
@@ -0,0 +1,114 @@
+// utils/msgpack.js
+// Minimal MessagePack decoder for agent uploads (Content-Type: application/msgpack).
+// Supports every type the agents send: nil, booleans, integers, floats,
+// strings, binary, arrays and maps. Extension types are rejected.
+const decode = (buffer) => {
+  const view = new DataView(buffer.buffer, buffer.byteOffset, buffer.byteLength);
+  let offset = 0;
+
+  const need = (n) => {
+    if (offset + n > buffer.length) {
+      throw new Error('Truncated MessagePack body.');
+    }
+  };
+  const str = (length) => {
+    need(length);
+    const value = buffer.toString('utf8', offset, offset + length);
+    offset += length;
+    return value;
+  };
+  const bin = (length) => {
+    need(length);
+    const value = buffer.subarray(offset, offset + length);
+    offset += length;
+    return value;
+  };
+  const array = (length) => {
+    const value = new Array(length);
+    for (let i = 0; i < length; i++) {
+      value[i] = read();
+    }
+    return value;
+  };
+  const map = (length) => {
+    const value = {};
+    for (let i = 0; i < length; i++) {
+      const key = read();
+      if (typeof key !== 'string') {
+        throw new Error('MessagePack map keys must be strings.');
+      }
+      if (key === '__proto__') {
+        // Like JSON.parse, make it an own property instead of replacing the prototype
+        Object.defineProperty(value, key, { value: read(), writable: true, enumerable: true, configurable: true });
+      } else {
+        value[key] = read();
+      }
+    }
+    return value;
+  };
+  const uint = (bytes) => {
+    need(bytes);
+    let value;
+    if (bytes === 1) value = view.getUint8(offset);
+    else if (bytes === 2) value = view.getUint16(offset);
+    else if (bytes === 4) value = view.getUint32(offset);
+    else value = Number(view.getBigUint64(offset));
+    offset += bytes;
+    return value;
+  };
+  const int = (bytes) => {
+    need(bytes);
+    let value;
+    if (bytes === 1) value = view.getInt8(offset);
+    else if (bytes === 2) value = view.getInt16(offset);
+    else if (bytes === 4) value = view.getInt32(offset);
+    else value = Number(view.getBigInt64(offset));
+    offset += bytes;
+    return value;
+  };
+
+  const read = () => {
+    need(1);
+    const type = buffer[offset++];
+    if (type <= 0x7f) return type;
+    if (type >= 0xe0) return type - 0x100;
+    if ((type & 0xf0) === 0x80) return map(type & 0x0f);
+    if ((type & 0xf0) === 0x90) return array(type & 0x0f);
+    if ((type & 0xe0) === 0xa0) return str(type & 0x1f);
+    switch (type) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return bin(uint(1));
+      case 0xc5: return bin(uint(2));
+      case 0xc6: return bin(uint(4));
+      case 0xca: { need(4); const v = view.getFloat32(offset); offset += 4; return v; }
+      case 0xcb: { need(8); const v = view.getFloat64(offset); offset += 8; return v; }
+      case 0xcc: return uint(1);
+      case 0xcd: return uint(2);
+      case 0xce: return uint(4);
+      case 0xcf: return uint(8);
+      case 0xd0: return int(1);
+      case 0xd1: return int(2);
+      case 0xd2: return int(4);
+      case 0xd3: return int(8);
+      case 0xd9: return str(uint(1));
+      case 0xda: return str(uint(2));
+      case 0xdb: return str(uint(4));
+      case 0xdc: return array(uint(2));
+      case 0xdd: return array(uint(4));
+      case 0xde: return map(uint(2));
+      case 0xdf: return map(uint(4));
+      default:
+        throw new Error(`Unsupported MessagePack type 0x${type.toString(16)}.`);
+    }
+  };
+
+  const value = read();
+  if (offset !== buffer.length) {
+    throw new Error('Trailing bytes after MessagePack body.');
+  }
+  return value;
+};
+
+module.exports = { decode };
@@ -0,0 +1,263 @@
+// utils/rollups.js
+// Per-minute and per-hour rollups of float DataValues (models/DataRollup.js),
+// updated as points are ingested, and range statistics computed from them.
+//
+// Each bucket keeps min, max, sum and count, the trapezoid area between its
+// own points (auc), its first and last point, and a quantile sketch. The
+// sketch counts values in log-spaced buckets SKETCH_ACCURACY apart, which
+// merge by addition.
+//
+// Compared with the same statistics computed from the raw points:
+// - min, max, mean and count are exact.
+// - The median is within SKETCH_ACCURACY (0.5%) relative error.
+// - auc is exact when each bucket receives its points in time order, as the
+//   agents send them. A batch that lands before points already in its bucket
+//   (e.g. a late backfill) loses the trapezoids that join it to its
+//   neighbours. Running scripts/rebuildRollups.js afterwards makes it exact
+//   again.
+const DataRollup = require('../models/DataRollup');
+const { bucketsToValues } = require('./downsample');
+
+const RESOLUTIONS = { minute: 60 * 1000, hour: 60 * 60 * 1000 };
+const SKETCH_ACCURACY = 0.005;
+const GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY);
+const LOG_GAMMA = Math.log(GAMMA);
+// Values closer to zero than this are counted as zero
+const SKETCH_MIN_VALUE = 1e-9;
+
+// Sketch field of a value: p<i> for positive, n<i> for negative values, z for zero
+const sketchField = (value) => {
+  const magnitude = Math.abs(value);
+  if (magnitude < SKETCH_MIN_VALUE) {
+    return 'z';
+  }
+  return `${value > 0 ? 'p' : 'n'}${Math.ceil(Math.log(magnitude) / LOG_GAMMA)}`;
+};
+
+// Value a sketch field stands for (within SKETCH_ACCURACY of every value counted in it)
+const sketchValue = (field) => {
+  if (field === 'z') {
+    return 0;
+  }
+  const magnitude = 2 * Math.pow(GAMMA, Number(field.slice(1))) / (GAMMA + 1);
+  return field[0] === 'p' ? magnitude : -magnitude;
+};
+
+// Value at 0-based rank in a merged sketch ({ field: count })
+const sketchRank = (sketch, rank) => {
+  const order = (field) => {
+    if (field === 'z') {
+      return 0;
+    }
+    const index = Number(field.slice(1));
+    // Negative values: larger index = further below zero
+    return field[0] === 'p' ? 1e6 + index : -1e6 - index;
+  };
+  const fields = Object.keys(sketch).sort((a, b) => order(a) - order(b));
+  let seen = 0;
+  for (const field of fields) {
+    seen += sketch[field];
+    if (seen > rank) {
+      return sketchValue(field);
+    }
+  }
+  return fields.length > 0 ? sketchValue(fields[fields.length - 1]) : null;
+};
+
+// Groups points ({ key, machine, value, timestamp }, numeric values only) into
+// one summary per key, machine, resolution and bucket
+const summarize = (points) => {
+  const groups = new Map();
+  const sorted = points
+    .filter(point => typeof point.value === 'number' && Number.isFinite(point.value))
+    .sort((a, b) => a.timestamp - b.timestamp);
+  for (const point of sorted) {
+    const t = point.timestamp.getTime();
+    for (const [resolution, width] of Object.entries(RESOLUTIONS)) {
+      const bucket = Math.floor(t / width) * width;
+      const id = `${point.key}\u0000${point.machine}\u0000${resolution}\u0000${bucket}`;
+      let group = groups.get(id);
+      if (!group) {
+        group = {
+          key: point.key, machine: point.machine, resolution, bucket: new Date(bucket),
+          min: point.value, max: point.value, sum: 0, count: 0, auc: 0,
+          first: { t: point.timestamp, v: point.value }, last: null, sketch: {}
+        };
+        groups.set(id, group);
+      }
+      if (group.last) {
+        group.auc += (group.last.v + point.value) / 2 * (t - group.last.t.getTime()) / 1000;
+      }
+      group.min = Math.min(group.min, point.value);
+      group.max = Math.max(group.max, point.value);
+      group.sum += point.value;
+      group.count += 1;
+      group.last = { t: point.timestamp, v: point.value };
+      const field = sketchField(point.value);
+      group.sketch[field] = (group.sketch[field] || 0) + 1;
+    }
+  }
+  return [...groups.values()];
+};
+
+// Pipeline update that merges a summary into its rollup document (or creates it).
+// The stored last point is joined to the summary's first point when it comes
+// before it; all expressions of the $set stage see the document as it was.
+const mergeUpdate = (group) => {
+  const hasLast = { $ne: [{ $type: '$last' }, 'missing'] };
+  const join = {
+    $cond: [
+      { $and: [hasLast, { $lt: ['$last.t', group.first.t] }] },
+      { $multiply: [{ $divide: [{ $add: ['$last.v', group.first.v] }, 2] }, { $divide: [{ $subtract: [group.first.t, '$last.t'] }, 1000] }] },
+      0
+    ]
+  };
+  const set = {
+    min: { $min: ['$min', group.min] },
+    max: { $max: ['$max', group.max] },
+    sum: { $add: [{ $ifNull: ['$sum', 0] }, group.sum] },
+    count: { $add: [{ $ifNull: ['$count', 0] }, group.count] },
+    auc: { $add: [{ $ifNull: ['$auc', 0] }, group.auc, join] },
+    first: {
+      $cond: [{ $or: [{ $eq: [{ $type: '$first' }, 'missing'] }, { $lt: [group.first.t, '$first.t'] }] },
+        { $literal: group.first }, '$first']
+    },
+    last: {
+      $cond: [{ $or: [{ $not: [hasLast] }, { $gt: [group.last.t, '$last.t'] }] },
+        { $literal: group.last }, '$last']
+    }
+  };
+  for (const [field, count] of Object.entries(group.sketch)) {
+    set[`sketch.${field}`] = { $add: [{ $ifNull: [`$sketch.${field}`, 0] }, count] };
+  }
+  return [{ $set: set }];
+};
+
+// Adds newly stored points to the minute and hour rollups. Only pass points
+// that were actually inserted (not skipped duplicates).
+const updateRollups = async (points) => {
+  const groups = summarize(points);
+  if (groups.length === 0) {
+    return;
+  }
+  // Through the driver: Mongoose would try to cast the pipeline against the schema
+  await DataRollup.collection.bulkWrite(groups.map(group => ({
+    updateOne: {
+      filter: { key: group.key, machine: group.machine, resolution: group.resolution, bucket: group.bucket },
+      update: mergeUpdate(group),
+      upsert: true
+    }
+  })), { ordered: false });
+};
+
+// Statistics over buckets (rollup documents or summaries) in time order:
+// { count, min, max, mean, median, auc }, or null without data
+const combineBuckets = (buckets) => {
+  let count = 0;
+  let sum = 0;
+  let min = Infinity;
+  let max = -Infinity;
+  let auc = 0;
+  let previous = null;
+  const sketch = {};
+  for (const bucket of buckets) {
+    if (!bucket.count) {
+      continue;
+    }
+    count += bucket.count;
+    sum += bucket.sum;
+    min = Math.min(min, bucket.min);
+    max = Math.max(max, bucket.max);
+    auc += bucket.auc;
+    if (previous) {
+      auc += (previous.v + bucket.first.v) / 2 * (bucket.first.t - previous.t) / 1000;
+    }
+    previous = bucket.last;
+    const fields = bucket.sketch instanceof Map ? bucket.sketch : Object.entries(bucket.sketch || {});
+    for (const [field, n] of fields) {
+      sketch[field] = (sketch[field] || 0) + n;
+    }
+  }
+  if (count === 0) {
+    return null;
+  }
+  // Same rank as the raw computation: the upper median
+  return { count, min, max, mean: sum / count, median: sketchRank(sketch, Math.floor(count / 2)), auc };
+};
+
+// Rollups of key/machine with resolution from `from` to `to` (open if null), in time order
+const loadRollups = (key, machine, resolution, from, to) => {
+  const bucket = { $gte: from };
+  if (to) {
+    bucket.$lt = to;
+  }
+  return DataRollup.find({ key, machine, resolution, bucket })
+    .select({ _id: 0, key: 0, machine: 0, resolution: 0 })
+    .sort({ bucket: 1 })
+    .lean();
+};
+
+// Statistics of key/machine from `from` to `to` (null: everything after
+// `from`): hour rollups for whole hours, minute rollups for the minutes around
+// them and raw points, read through loadRaw(from, to) in time order, for the
+// partial minute at the start.
+const rangeStats = async (key, machine, from, to, loadRaw) => {
+  const ceil = (date, width) => new Date(Math.ceil(date.getTime() / width) * width);
+  const floor = (date, width) => new Date(Math.floor(date.getTime() / width) * width);
+  const firstMinute = ceil(from, RESOLUTIONS.minute);
+  const firstHour = ceil(firstMinute, RESOLUTIONS.hour);
+  const lastHour = floor(to || new Date(), RESOLUTIONS.hour);
+
+  let parts;
+  if (firstHour < lastHour) {
+    parts = await Promise.all([
+      loadRaw(from, firstMinute),
+      loadRollups(key, machine, 'minute', firstMinute, firstHour),
+      loadRollups(key, machine, 'hour', firstHour, lastHour),
+      loadRollups(key, machine, 'minute', lastHour, to)
+    ]);
+  } else {
+    parts = await Promise.all([
+      loadRaw(from, firstMinute),
+      loadRollups(key, machine, 'minute', firstMinute, to)
+    ]);
+  }
+  parts[0] = summarize(parts[0]).filter(group => group.resolution === 'minute');
+  return combineBuckets([].concat(...parts));
+};
+
+// Series of the given keys on machine read from the rollups of one resolution
+// in [from, to), for ranges whose raw points have expired: { key: [points] }.
+// Without bucketMs each rollup becomes one point at its start with the mean
+// as value plus min and max; with it the rollups are downsampled like raw
+// points (see utils/downsample.js), bucketed from `since`.
+const rollupSeries = async (keys, machine, resolution, from, to, since, bucketMs) => {
+  const match = { key: { $in: keys }, machine, resolution, bucket: { $gte: from, $lt: to } };
+  if (bucketMs) {
+    const groups = await DataRollup.aggregate([
+      { $match: match },
+      {
+        $group: {
+          _id: { key: '$key', bucket: { $floor: { $divide: [{ $subtract: ['$bucket', since] }, bucketMs] } } },
+          low: { $min: { v: '$min', t: '$bucket' } },
+          high: { $max: { v: '$max', t: '$bucket' } }
+        }
+      },
+      { $sort: { '_id.key': 1, '_id.bucket': 1 } }
+    ]);
+    return bucketsToValues(groups);
+  }
+  const rollups = await DataRollup.find(match)
+    .select({ _id: 0, key: 1, bucket: 1, min: 1, max: 1, sum: 1, count: 1 })
+    .sort({ bucket: 1 })
+    .lean();
+  const series = {};
+  rollups.forEach(rollup => {
+    (series[rollup.key] || (series[rollup.key] = [])).push({
+      timestamp: rollup.bucket, value: rollup.sum / rollup.count, min: rollup.min, max: rollup.max
+    });
+  });
+  return series;
+};
+
+module.exports = { RESOLUTIONS, SKETCH_ACCURACY, summarize, updateRollups, combineBuckets, rangeStats, rollupSeries };
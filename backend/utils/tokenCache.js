@@ -0,0 +1,58 @@
+// utils/tokenCache.js
+// Bounded LRU cache of verified JWT payloads, so that a token presented again
+// (every agent upload carries the same one) skips signature verification.
+//
+// Entries are keyed by a SHA-256 hash of the token, so the cache holds no
+// usable credentials, and expire at the token's own `exp`. A Map keeps its
+// insertion order, which makes it the LRU list: a hit moves the entry to the
+// end and the first entry is evicted when full.
+const crypto = require('crypto');
+
+const hashToken = (token) => crypto.createHash('sha256').update(token).digest('base64');
+
+// Cache of at most maxEntries payloads; maxEntries 0 disables it
+const createTokenCache = (maxEntries) => {
+  const entries = new Map();
+  const counters = { hits: 0, misses: 0 };
+
+  // Payload of a token verified before and not yet expired, or null
+  const get = (token) => {
+    if (maxEntries <= 0) {
+      return null;
+    }
+    const id = hashToken(token);
+    const entry = entries.get(id);
+    if (!entry) {
+      counters.misses += 1;
+      return null;
+    }
+    entries.delete(id);
+    if (entry.expiresAt <= Date.now()) {
+      counters.misses += 1;
+      return null;
+    }
+    entries.set(id, entry);
+    counters.hits += 1;
+    return entry.payload;
+  };
+
+  // Remembers the payload of a verified token until its exp (seconds since the epoch)
+  const set = (token, payload) => {
+    if (maxEntries <= 0) {
+      return;
+    }
+    const expiresAt = payload.exp ? payload.exp * 1000 : Infinity;
+    entries.set(hashToken(token), { payload, expiresAt });
+    if (entries.size > maxEntries) {
+      entries.delete(entries.keys().next().value);
+    }
+  };
+
+  const clear = () => entries.clear();
+
+  const stats = () => ({ size: entries.size, maxEntries, ...counters });
+
+  return { get, set, clear, stats };
+};
+
+module.exports = { createTokenCache, hashToken };
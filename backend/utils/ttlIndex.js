@@ -0,0 +1,39 @@
+// utils/ttlIndex.js
+// Brings the expiry of an existing index in line with config.yaml. autoIndex
+// only creates missing indexes: an index on the same keys with another (or no)
+// expireAfterSeconds is left as it is, so a retention set or changed later
+// would never apply to an existing collection. Called once at startup.
+const syncTtlIndex = async (model, keyPattern, seconds, options = {}) => {
+  const collection = model.collection;
+  let indexes;
+  try {
+    indexes = await collection.indexes();
+  } catch (err) {
+    if (err.codeName === 'NamespaceNotFound') {
+      return; // a new database; autoIndex creates the index
+    }
+    throw err;
+  }
+  const keys = JSON.stringify(keyPattern);
+  const index = indexes.find(existing => JSON.stringify(existing.key) === keys);
+  if (!index || index.expireAfterSeconds === (seconds || undefined)) {
+    return;
+  }
+  const name = index.name;
+  if (!seconds) {
+    // The retention was removed; the schema no longer declares the index
+    await collection.dropIndex(name);
+    console.log(`${collection.collectionName}: dropped the TTL index ${name}; documents no longer expire.`);
+    return;
+  }
+  try {
+    await model.db.db.command({ collMod: collection.collectionName, index: { keyPattern, expireAfterSeconds: seconds } });
+  } catch (err) {
+    // MongoDB before 5.1 cannot turn a plain index into a TTL index; build it again
+    await collection.dropIndex(name);
+    await collection.createIndex(keyPattern, { ...options, name, expireAfterSeconds: seconds });
+  }
+  console.log(`${collection.collectionName}: index ${name} now expires documents after ${seconds / 86400} days.`);
+};
+
+module.exports = { syncTtlIndex };
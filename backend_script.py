@@ -2,9 +2,23 @@
 import requests
 import getpass
 import sys
+import csv
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+import daily_cache
+import data_export
+import data_import
 
 # Backend server URL
 BASE_URL = 'https://localhost:port/api'
+# Points already fetched by fetch_daily_data, so that repeat queries only fetch
+# what is new (see daily_cache.py); the bound is in points, across all series.
+DAILY_CACHE_PATH = 'daily_cache.sqlite3'
+DAILY_CACHE_MAX_POINTS = 1000000
 original_session_init = requests.Session.__init__
 
 # Override the session initialization to disable SSL verification
@@ -147,6 +161,25 @@ def delete_device(token):
     except requests.exceptions.RequestException as e:
         print(f"An error occurred while deleting device: {e}")
 
+def issue_ingest_token(token):
+    print("=== Issue Device Ingest Token ===")
+    device_id = input("Device ID: ")
+    confirm = input(f"Any earlier ingest token of device '{device_id}' stops working. Continue? (y/n): ").strip().lower()
+    if confirm != 'y':
+        print("Cancelled.")
+        return
+
+    try:
+        response = requests.post(f"{BASE_URL}/devices/{device_id}/token",
+                                 headers={"Authorization": f"Bearer {token}"})
+        if response.status_code == 201:
+            print("Ingest token issued. Set it as INGEST_TOKEN in upload_stat_loop.py on the device:")
+            print(response.json().get('token'))
+        else:
+            print(f"Failed to issue ingest token: {response.json().get('message')}")
+    except requests.exceptions.RequestException as e:
+        print(f"An error occurred while issuing ingest token: {e}")
+
 def list_keys(token):
     print("=== List All Keys ===")
     try:
@@ -292,6 +325,13 @@ def upload_data_value(token):
     except requests.exceptions.RequestException as e:
         print(f"An error occurred while uploading DataValue: {e}")
 
+def parse_time_range(range_):
+    """Seconds in a range like 24h, 30m or 15s (as the backend parses it), or None."""
+    match = re.match(r'^(\d+)([hms])$', range_)
+    if not match:
+        return None
+    return int(match.group(1)) * {'h': 3600, 'm': 60, 's': 1}[match.group(2)]
+
 def fetch_daily_data(token):
     print("=== Fetch Daily Data ===")
     device = input("Device ID: ")
@@ -304,31 +344,73 @@ def fetch_daily_data(token):
         print("No valid keys provided.")
         return
 
-    params = {
-        "device": device,
-        "keys": keys,
-        "range": range_
-    }
+    range_seconds = parse_time_range(range_)
+    if range_seconds is None:
+        print("Invalid time range format. Use formats like 24h, 30m, 15s.")
+        return
+    window_start = daily_cache.isoformat(time.time() - range_seconds)
 
+    cache = daily_cache.DailyCache(DAILY_CACHE_PATH, DAILY_CACHE_MAX_POINTS)
     try:
-        response = requests.get(f"{BASE_URL}/data/daily",
-                                headers={"Authorization": f"Bearer {token}"},
-                                params=params)
-        if response.status_code == 200:
-            data = response.json().get('data', {})
-            if not data:
-                print("No data available for the selected parameters.")
+        # Keys without a usable cached series are fetched in full, the rest
+        # from the oldest of their cursors on (the overlap is de-duplicated).
+        cursors = {key: cache.cursor_for(device, key, window_start) for key in keys}
+        requests_to_send = []
+        full_keys = [key for key in keys if cursors[key] is None]
+        if full_keys:
+            requests_to_send.append((full_keys, None))
+        cached_keys = [key for key in keys if cursors[key] is not None]
+        if cached_keys:
+            requests_to_send.append((cached_keys, min(cursors[key] for key in cached_keys)))
+
+        fetched = 0
+        uncached = {}  # from a backend that returns no cursor
+        for request_keys, since in requests_to_send:
+            params = {
+                "device": device,
+                "keys": request_keys,
+                "range": range_
+            }
+            if since is not None:
+                params["since"] = since
+            response = requests.get(f"{BASE_URL}/data/daily",
+                                    headers={"Authorization": f"Bearer {token}"},
+                                    params=params)
+            if response.status_code != 200:
+                print(f"Failed to fetch daily data: {response.json().get('message')}")
                 return
-            for key, details in data.items():
-                print(f"\nKey: {key}")
-                print(f"Type: {details.get('type')}")
-                print("Values:")
-                for entry in details.get('values', []):
-                    print(f" - {entry.get('timestamp')}: {entry.get('value')}")
-        else:
-            print(f"Failed to fetch daily data: {response.json().get('message')}")
+            body = response.json()
+            cursor = body.get('cursor')
+            for key, details in body.get('data', {}).items():
+                fetched += len(details.get('values', []))
+                if cursor is not None:
+                    cache.merge(device, key, details, window_start, cursor, full=since is None)
+                else:
+                    uncached[key] = details
+
+        data = {}
+        for key in keys:
+            details = uncached.get(key) or cache.read(device, key, window_start)
+            if details is not None:
+                data[key] = details
+        cache.evict()
     except requests.exceptions.RequestException as e:
         print(f"An error occurred while fetching daily data: {e}")
+        return
+    finally:
+        cache.close()
+
+    if not data:
+        print("No data available for the selected parameters.")
+        return
+    for key, details in data.items():
+        print(f"\nKey: {key}")
+        print(f"Type: {details.get('type')}")
+        print("Values:")
+        for entry in details.get('values', []):
+            print(f" - {entry.get('timestamp')}: {entry.get('value')}")
+    cached = sum(len(details.get('values', [])) for details in data.values())
+    print(f"\n{fetched} points fetched, {cached} shown from the local cache ({DAILY_CACHE_PATH}).")
 
 def fetch_monthly_data(token):
     print("=== Fetch Monthly Aggregated Data ===")
@@ -359,106 +441,286 @@ def fetch_monthly_data(token):
             print(f"Failed to fetch monthly data: {response.json().get('message')}")
     except requests.exceptions.RequestException as e:
         print(f"An error occurred while fetching monthly data: {e}")
+# Bulk admin operations (delete all keys/devices, create keys from CSV) use the
+# backend's bulk endpoints when it has them, and otherwise run the per-item
+# requests on a bounded pool of workers sharing one keep-alive session.
+MAX_WORKERS = 8
+BULK_CHUNK_SIZE = 500  # items per request to a bulk endpoint
+
+def create_pooled_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def response_message(response):
+    try:
+        return response.json().get('message')
+    except ValueError:
+        return response.text
+
+def print_results(lines, total, done=0):
+    """Prints one result line per item with its progress; returns the new count of items done."""
+    for line in lines:
+        done += 1
+        print(f"[{done}/{total}] {line}")
+    return done
+
+def run_concurrently(session, items, action):
+    """Calls action(session, item) for every item on up to MAX_WORKERS threads.
+
+    action returns the line to print for its item; lines are printed as items finish.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(action, session, item) for item in items]
+        print_results((future.result() for future in as_completed(futures)), len(items))
+
+def run_bulk(session, token, path, items, body, describe):
+    """Sends items to a bulk endpoint in chunks and prints describe(item, status, message) for each.
+
+    Returns False, before printing anything, if the backend has no such endpoint.
+    """
+    done = 0
+    for start in range(0, len(items), BULK_CHUNK_SIZE):
+        chunk = items[start:start + BULK_CHUNK_SIZE]
+        try:
+            response = session.post(f"{BASE_URL}{path}",
+                                    headers={"Authorization": f"Bearer {token}"},
+                                    json=body(chunk))
+        except requests.exceptions.RequestException as e:
+            if start == 0:
+                raise
+            done = print_results((describe(item, None, str(e)) for item in chunk), len(items), done)
+            continue
+        if response.status_code == 404 and start == 0:
+            return False
+        if response.status_code == 200:
+            results = response.json().get('results', [])
+            lines = (describe(item, result.get('status'), result.get('message'))
+                     for item, result in zip(chunk, results))
+        else:
+            message = response_message(response)
+            lines = (describe(item, response.status_code, message) for item in chunk)
+        done = print_results(lines, len(items), done)
+    return True
+
+def describe_key_deletion(key_name, status, message):
+    if status == 200:
+        return f"Deleted key: {key_name}"
+    return f"Failed to delete key '{key_name}': {message}"
+
+def delete_key_item(token):
+    def action(session, key_name):
+        try:
+            response = session.delete(f"{BASE_URL}/keys/{key_name}",
+                                      headers={"Authorization": f"Bearer {token}"})
+            return describe_key_deletion(key_name, response.status_code, response_message(response))
+        except requests.exceptions.RequestException as e:
+            return f"An error occurred while deleting key '{key_name}': {e}"
+    return action
+
 def delete_all_keys(token):
     print("=== Delete All Keys ===")
+    session = create_pooled_session()
     try:
-        response = requests.get(f"{BASE_URL}/keys",
-                                headers={"Authorization": f"Bearer {token}"})
+        response = session.get(f"{BASE_URL}/keys",
+                               headers={"Authorization": f"Bearer {token}"})
         if response.status_code == 200:
             keys = response.json().get('dataTypes', []) or response.json().get('keys', [])
             if keys:
-                for key in keys:
-                    key_name = key.get('keyName')
-                    delete_response = requests.delete(f"{BASE_URL}/keys/{key_name}",
-                                                      headers={"Authorization": f"Bearer {token}"})
-                    if delete_response.status_code == 200:
-                        print(f"Deleted key: {key_name}")
-                    else:
-                        print(f"Failed to delete key '{key_name}': {delete_response.json().get('message')}")
+                key_names = [key.get('keyName') for key in keys]
+                if not run_bulk(session, token, "/keys/bulk-delete", key_names,
+                                lambda chunk: {"keyNames": chunk}, describe_key_deletion):
+                    run_concurrently(session, key_names, delete_key_item(token))
             else:
                 print("No keys found.")
         else:
             print(f"Failed to retrieve keys: {response.json().get('message')}")
     except requests.exceptions.RequestException as e:
         print(f"An error occurred while deleting all keys: {e}")
+    finally:
+        session.close()
+
+def describe_device_deletion(device_id, status, message):
+    if status == 200:
+        return f"Deleted device: {device_id}"
+    return f"Failed to delete device '{device_id}': {message}"
+
+def delete_device_item(token):
+    def action(session, device_id):
+        try:
+            response = session.delete(f"{BASE_URL}/devices/{device_id}",
+                                      headers={"Authorization": f"Bearer {token}"})
+            return describe_device_deletion(device_id, response.status_code, response_message(response))
+        except requests.exceptions.RequestException as e:
+            return f"An error occurred while deleting device '{device_id}': {e}"
+    return action
+
 def delete_all_devices(token):
     print("=== Delete All Devices ===")
+    session = create_pooled_session()
     try:
-        response = requests.get(f"{BASE_URL}/devices",
-                                headers={"Authorization": f"Bearer {token}"})
+        response = session.get(f"{BASE_URL}/devices",
+                               headers={"Authorization": f"Bearer {token}"})
         if response.status_code == 200:
             devices = response.json().get('devices', [])
             if devices:
-                for device in devices:
-                    device_id = device.get('deviceId')
-                    delete_response = requests.delete(f"{BASE_URL}/devices/{device_id}",
-                                                      headers={"Authorization": f"Bearer {token}"})
-                    if delete_response.status_code == 200:
-                        print(f"Deleted device: {device_id}")
-                    else:
-                        print(f"Failed to delete device '{device_id}': {delete_response.json().get('message')}")
+                device_ids = [device.get('deviceId') for device in devices]
+                if not run_bulk(session, token, "/devices/bulk-delete", device_ids,
+                                lambda chunk: {"deviceIds": chunk}, describe_device_deletion):
+                    run_concurrently(session, device_ids, delete_device_item(token))
             else:
                 print("No devices found.")
         else:
             print(f"Failed to retrieve devices: {response.json().get('message')}")
     except requests.exceptions.RequestException as e:
         print(f"An error occurred while deleting all devices: {e}")
-import csv
+    finally:
+        session.close()
+
+def describe_key_creation(payload, status, message):
+    if status == 201:
+        return f"Created key: {payload['keyName']}"
+    if status is None:
+        return f"An error occurred while creating key '{payload['keyName']}': {message}"
+    return f"Failed to create key '{payload['keyName']}': {message}"
+
+def create_key_item(token):
+    def action(session, payload):
+        try:
+            response = session.post(f"{BASE_URL}/keys",
+                                    headers={"Authorization": f"Bearer {token}"},
+                                    json=payload)
+            return describe_key_creation(payload, response.status_code, response_message(response))
+        except requests.exceptions.RequestException as e:
+            return describe_key_creation(payload, None, e)
+    return action
+
+def read_key_payloads(csv_path):
+    """Reads the key definitions of a config CSV into /keys payloads."""
+    payloads = []
+    with open(csv_path, mode='r') as csvfile:
+        csv_reader = csv.DictReader(csvfile)
+
+        for row in csv_reader:
+            key_name = row.get('keyName')
+            data_type = row.get('dataType')
+            normal_range = {
+                "min": float(row['normalMin']) if row.get('normalMin') else None,
+                "max": float(row['normalMax']) if row.get('normalMax') else None
+            } if row.get('normalMin') and row.get('normalMax') else None
+
+            warning_range = {
+                "min": float(row['warningMin']) if row.get('warningMin') else None,
+                "max": float(row['warningMax']) if row.get('warningMax') else None
+            } if row.get('warningMin') and row.get('warningMax') else None
+
+            email_alert_range = {
+                "min": float(row['emailAlertMin']) if row.get('emailAlertMin') else None,
+                "max": float(row['emailAlertMax']) if row.get('emailAlertMax') else None
+            } if row.get('emailAlertMin') and row.get('emailAlertMax') else None
+
+            missing_data_allowance = float(row['missingDataAllowance']) if row.get('missingDataAllowance') else None
+
+            payload = {
+                "keyName": key_name,
+                "dataType": data_type,
+                "normalRange": normal_range,
+                "warningRange": warning_range,
+                "missingDataAllowance": missing_data_allowance,
+                "emailAlertRange": email_alert_range
+            }
+
+            # Clean up None values in payload
+            payloads.append({k: v for k, v in payload.items() if v is not None})
+    return payloads
 
 def create_keys_from_csv(token, csv_path):
     print(f"=== Create Keys from CSV ({csv_path}) ===")
-    
+
+    session = create_pooled_session()
     try:
-        with open(csv_path, mode='r') as csvfile:
-            csv_reader = csv.DictReader(csvfile)
-            
-            for row in csv_reader:
-                key_name = row.get('keyName')
-                data_type = row.get('dataType')
-                normal_range = {
-                    "min": float(row['normalMin']) if row.get('normalMin') else None,
-                    "max": float(row['normalMax']) if row.get('normalMax') else None
-                } if row.get('normalMin') and row.get('normalMax') else None
-
-                warning_range = {
-                    "min": float(row['warningMin']) if row.get('warningMin') else None,
-                    "max": float(row['warningMax']) if row.get('warningMax') else None
-                } if row.get('warningMin') and row.get('warningMax') else None
-
-                email_alert_range = {
-                    "min": float(row['emailAlertMin']) if row.get('emailAlertMin') else None,
-                    "max": float(row['emailAlertMax']) if row.get('emailAlertMax') else None
-                } if row.get('emailAlertMin') and row.get('emailAlertMax') else None
-
-                missing_data_allowance = float(row['missingDataAllowance']) if row.get('missingDataAllowance') else None
-
-                payload = {
-                    "keyName": key_name,
-                    "dataType": data_type,
-                    "normalRange": normal_range,
-                    "warningRange": warning_range,
-                    "missingDataAllowance": missing_data_allowance,
-                    "emailAlertRange": email_alert_range
-                }
-
-                # Clean up None values in payload
-                payload = {k: v for k, v in payload.items() if v is not None}
-
-                try:
-                    response = requests.post(f"{BASE_URL}/keys",
-                                             headers={"Authorization": f"Bearer {token}"},
-                                             json=payload)
-                    if response.status_code == 201:
-                        print(f"Created key: {key_name}")
-                    else:
-                        print(f"Failed to create key '{key_name}': {response.json().get('message')}")
-                except requests.exceptions.RequestException as e:
-                    print(f"An error occurred while creating key '{key_name}': {e}")
+        payloads = read_key_payloads(csv_path)
+        if not payloads:
+            return
+        try:
+            created = run_bulk(session, token, "/keys/bulk", payloads, lambda chunk: chunk, describe_key_creation)
+        except requests.exceptions.RequestException:
+            created = False
+        if not created:
+            run_concurrently(session, payloads, create_key_item(token))
 
     except FileNotFoundError:
         print(f"File not found: {csv_path}")
     except Exception as e:
         print(f"An error occurred while reading the CSV file: {e}")
+    finally:
+        session.close()
+
+def export_data(token):
+    print("=== Export Raw Data ===")
+    device = input("Device ID: ")
+    keys_input = input("Keys (comma-separated): ")
+    start = input("From (e.g., 2024-05-01 or 2024-05-01T12:00:00Z, blank for the beginning): ").strip() or None
+    end = input("To (exclusive, blank for now): ").strip() or None
+    file_format = input("Format (csv/parquet) [csv]: ").strip().lower() or 'csv'
+    directory = input("Output directory [export]: ").strip() or 'export'
+
+    keys = [k.strip() for k in keys_input.split(',') if k.strip()]
+    if not keys:
+        print("No valid keys provided.")
+        return
+    if file_format not in ('csv', 'parquet'):
+        print("Invalid format. Use csv or parquet.")
+        return
+    os.makedirs(directory, exist_ok=True)
+
+    # Keys are exported in parallel, each streamed into its own file
+    def action(session, key):
+        try:
+            written, path = data_export.export_key(session, BASE_URL, token, device, key, directory,
+                                                   file_format, start, end)
+            return f"Exported key '{key}': {written} new points to {path}"
+        except data_export.ExportError as e:
+            return f"Failed to export key '{key}': {e}"
+        except requests.exceptions.RequestException as e:
+            return f"An error occurred while exporting key '{key}': {e} (run the export again to resume)"
+
+    session = create_pooled_session()
+    try:
+        run_concurrently(session, keys, action)
+    finally:
+        session.close()
+
+def import_data(token):
+    print("=== Import Historical Data ===")
+    path = input("CSV or spool file: ").strip()
+    device = input("Device ID (if the file has no machine column): ").strip() or None
+    key = input("Key (if the file has no key column): ").strip() or None
+    rate = input("Max rows per second [unlimited]: ").strip()
+
+    try:
+        max_rows_per_sec = float(rate) if rate else 0
+    except ValueError:
+        print("Invalid rate. Enter a number of rows per second.")
+        return
+
+    try:
+        if path.endswith('.csv'):
+            chunks = data_import.csv_chunks(path, data_import.CHUNK_ROWS, device, key)
+        else:
+            chunks = data_import.spool_chunks(path, data_import.CHUNK_ROWS)
+        session = create_pooled_session()
+        try:
+            importer = data_import.Importer(session, BASE_URL, token, MAX_WORKERS, max_rows_per_sec)
+            print(f"Imported {importer.run(chunks)}")
+        finally:
+            session.close()
+    except FileNotFoundError:
+        print(f"File not found: {path}")
+    except data_import.DataImportError as e:
+        print(f"Failed to import data: {e}")
 
 def main_menu(token):
     while True:
@@ -526,9 +788,12 @@ def main_menu(token):
         print("13. Delete All Keys")
         print("14. Delete All Devices")
         print("15. Create Keys from CSV")
-        print("16. Exit")
+        print("16. Export Raw Data")
+        print("17. Import Historical Data")
+        print("18. Issue Device Ingest Token")
+        print("19. Exit")
 
-        choice = input("Select an option (1-16): ").strip()
+        choice = input("Select an option (1-19): ").strip()
 
         if choice == '1':
             register_user(token)
@@ -562,10 +827,16 @@ def main_menu(token):
             csv_path = "config.csv"
             create_keys_from_csv(token, csv_path)
         elif choice == '16':
+            export_data(token)
+        elif choice == '17':
+            import_data(token)
+        elif choice == '18':
+            issue_ingest_token(token)
+        elif choice == '19':
             print("Exiting CLI. Goodbye!")
             sys.exit(0)
         else:
-            print("Invalid option. Please select a number between 1 and 16.")
+            print("Invalid option. Please select a number between 1 and 19.")
 
 def main():
     print("Welcome to the System Monitor API CLI")
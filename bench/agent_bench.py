@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the upload agent on a plain Linux box.
+
+Runs upload_metrics() for a fixed number of ticks with every input faked:
+a generated /proc (meminfo, net/dev), a hwmon temperature file, the fake
+nvidia-smi from bench/fake_bin and the stand-in HTTPS backend, which runs
+in its own process so its CPU is not counted. No GPU and no MongoDB are
+needed, and the fixtures are static, so results can be compared across
+commits.
+
+Reports per tick: agent CPU time (all agent threads), wall latency, bytes
+sent and, in a separate tracemalloc pass, allocated memory. The intervals in
+config.csv are divided by --speedup so a run takes seconds.
+
+    python3 bench/agent_bench.py --ticks 300 --json before.json
+    python3 bench/agent_bench.py --ticks 300 --compare before.json
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+# A CA bundle from the environment would override the agent's verify=False
+# for the stand-in's self-signed certificate.
+for name in ('REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE'):
+    os.environ.pop(name, None)
+os.environ['PATH'] = os.path.join(BENCH_DIR, 'fake_bin') + os.pathsep + os.environ['PATH']
+os.environ['FAKE_NVIDIA_SMI_STARTUP_MS'] = '0'
+
+import procfs_reader  # noqa: E402
+import upload_stat_loop as agent  # noqa: E402
+# Imported up front so module loading is not counted as tick cost.
+import agent_stats  # noqa: E402
+import gpu_sampler  # noqa: E402,F401
+
+MEMINFO = """MemTotal:       32768000 kB
+MemFree:         8192000 kB
+MemAvailable:   20480000 kB
+Buffers:          512000 kB
+Cached:         10240000 kB
+SwapCached:            0 kB
+Active:         12000000 kB
+Inactive:        9000000 kB
+SReclaimable:     900000 kB
+"""
+
+NET_DEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: 1048576    1024    0    0    0     0          0         0  1048576    1024    0    0    0     0       0          0
+ bench0: 987654321 654321    0    0    0     0          0         0 123456789  98765    0    0    0     0       0          0
+"""
+
+STAT = """cpu  104812 12 30567 5512345 2301 0 1720 0 0 0
+cpu0 52406 6 15283 2756172 1150 0 860 0 0 0
+cpu1 52406 6 15284 2756173 1151 0 860 0 0 0
+intr 4123456 0 9 0 0 0
+ctxt 9876543
+btime 1700000000
+processes 54321
+"""
+
+DISKSTATS = """ 259       0 nvme0n1 81234 1234 9876543 45678 123456 7890 23456789 345678 0 234567 391356 0 0 0 0 0 0
+ 259       1 nvme0n1p1 81000 1234 9870000 45600 123400 7890 23450000 345600 0 234500 391200 0 0 0 0 0 0
+"""
+
+# The agent's upload interval before --speedup is applied
+AGENT_UPDATE_INTERVAL = agent.DEFAULT_UPDATE_INTERVAL
+# Relative change that --compare reports as a regression. Wall latency on a
+# shared box is noisier than CPU time, bytes and allocations.
+REGRESSION_THRESHOLDS = {
+    'cpu_ms_per_tick': 0.10,
+    'tick_ms_mean': 0.25,
+    'tick_ms_p95': 0.25,
+    'bytes_per_tick': 0.05,
+    'alloc_peak_kib': 0.10,
+}
+
+
+class RecordingStats(agent_stats.AgentStats):
+    """AgentStats that also keeps every tick time, for exact percentiles."""
+
+    def __init__(self):
+        super().__init__()
+        self.tick_ms = []
+
+    def record_tick(self, seconds):
+        super().record_tick(seconds)
+        self.tick_ms.append(seconds * 1000.0)
+
+
+def make_fixtures(directory, config_path, speedup, keep_deadband):
+    """Writes the fake /proc, hwmon and a sped-up config.csv; returns their paths."""
+    proc = os.path.join(directory, 'proc')
+    os.makedirs(os.path.join(proc, 'net'))
+    with open(os.path.join(proc, 'meminfo'), 'w') as f:
+        f.write(MEMINFO)
+    with open(os.path.join(proc, 'net', 'dev'), 'w') as f:
+        f.write(NET_DEV)
+    with open(os.path.join(proc, 'stat'), 'w') as f:
+        f.write(STAT)
+    with open(os.path.join(proc, 'diskstats'), 'w') as f:
+        f.write(DISKSTATS)
+    # The agent's own RSS still comes from the real process.
+    os.symlink('/proc/self', os.path.join(proc, 'self'))
+
+    hwmon = os.path.join(directory, 'hwmon0')
+    os.makedirs(hwmon)
+    with open(os.path.join(hwmon, 'temp1_input'), 'w') as f:
+        f.write('47250\n')
+
+    config = os.path.join(directory, 'config.csv')
+    with open(config_path, newline='') as src, open(config, 'w', newline='') as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames, lineterminator='\n')
+        writer.writeheader()
+        for row in reader:
+            if row.get('sampleInterval'):
+                row['sampleInterval'] = float(row['sampleInterval']) / speedup
+            if row.get('missingDataAllowance'):
+                row['missingDataAllowance'] = float(row['missingDataAllowance']) / speedup
+            if not keep_deadband and 'deadband' in row:
+                # With static fixtures a deadband would suppress nearly every
+                # upload, and what it lets through depends on timing.
+                row['deadband'] = ''
+            writer.writerow(row)
+    return proc, os.path.join(hwmon, 'temp1_input'), config
+
+
+def start_backend():
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'standin_server.py'), '--port', '0'],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    return process, line.rsplit(' ', 1)[-1].strip()
+
+
+def stop_backend(process):
+    process.send_signal(signal.SIGINT)
+    out, _ = process.communicate(timeout=10)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run_once(args, trace_allocations):
+    directory = tempfile.mkdtemp(prefix='agent-bench-')
+    backend, base_url = start_backend()
+    try:
+        proc, temp_path, config = make_fixtures(directory, args.config, args.speedup, args.keep_deadband)
+        procfs_reader.close_all()
+        procfs_reader.PROC_ROOT = proc
+        agent.BASE_URL = base_url
+        agent.CPU_TEMP_PATH = temp_path
+        agent.NETWORK_INTERFACE = 'bench0'
+        agent.CONFIG_CSV_PATH = config
+        agent.SPOOL_PATH = os.path.join(directory, 'spool.bin')
+        agent.DEFAULT_UPDATE_INTERVAL = AGENT_UPDATE_INTERVAL / args.speedup
+
+        session = agent.create_session()
+        token = agent.login(session)
+        if trace_allocations:
+            tracemalloc.start()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        stats = agent.upload_metrics(token, '01', session, max_ticks=args.ticks, stats=RecordingStats())
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        result = {}
+        if trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result = {'alloc_peak_kib': peak / 1024.0, 'alloc_retained_kib': current / 1024.0}
+        wire = stop_backend(backend)
+        backend = None
+        ticks = stats.tick_ms
+        result.update({
+            'cpu_ms_per_tick': cpu * 1000.0 / args.ticks,
+            'tick_ms_mean': statistics.mean(ticks),
+            'tick_ms_p95': statistics.quantiles(ticks, n=20)[-1],
+            'tick_ms_max': max(ticks),
+            'requests': wire['requests'],
+            'points': wire['points'],
+            'bytes_per_tick': (wire['header_bytes'] + wire['body_bytes']) / args.ticks,
+            'run_seconds': wall,
+        })
+        return result
+    finally:
+        if backend is not None:
+            backend.kill()
+        procfs_reader.close_all()
+        procfs_reader.PROC_ROOT = '/proc'
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def compare(results, args):
+    """Prints the change against a saved run; returns True if anything regressed."""
+    with open(args.compare) as f:
+        saved = json.load(f)
+    baseline = saved['results']
+    regressed = False
+    print(f"\ncompared with {args.compare}:")
+    if (saved['ticks'], saved['speedup']) != (args.ticks, args.speedup):
+        print(f"  warning: saved with --ticks {saved['ticks']} --speedup {saved['speedup']:g}; "
+              "the numbers are not directly comparable")
+    for name, threshold in REGRESSION_THRESHOLDS.items():
+        if name not in baseline or name not in results or not baseline[name]:
+            continue
+        change = (results[name] - baseline[name]) / baseline[name]
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"  {name:<18} {baseline[name]:10.3f} -> {results[name]:10.3f} ({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs; the median is reported')
+    parser.add_argument('--speedup', type=float, default=20.0, help='divide all sampling intervals by this')
+    parser.add_argument('--config', default=os.path.join(REPO_DIR, 'config.csv'))
+    parser.add_argument('--keep-deadband', action='store_true', help='keep the deadband column of the config')
+    parser.add_argument('--json', help='save the results to this file')
+    parser.add_argument('--compare', help='compare with results saved by --json; exits 1 on a regression')
+    args = parser.parse_args()
+
+    runs = [run_once(args, trace_allocations=False) for _ in range(args.repeat)]
+    results = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+    allocations = run_once(args, trace_allocations=True)
+    results['alloc_peak_kib'] = allocations['alloc_peak_kib']
+    results['alloc_retained_kib'] = allocations['alloc_retained_kib']
+
+    print(f"{args.ticks} ticks x {args.repeat} runs at {args.speedup:g}x speed (median)")
+    print(f"  CPU per tick:      {results['cpu_ms_per_tick']:.3f} ms (all agent threads)")
+    print(f"  tick latency:      mean {results['tick_ms_mean']:.3f} ms, p95 {results['tick_ms_p95']:.3f} ms, "
+          f"max {results['tick_ms_max']:.3f} ms")
+    print(f"  bytes per tick:    {results['bytes_per_tick']:.1f} B ({results['requests']:.0f} requests, "
+          f"{results['points']:.0f} points)")
+    print(f"  allocations:       peak {results['alloc_peak_kib']:.1f} KiB, "
+          f"{results['alloc_retained_kib']:.1f} KiB still allocated at exit")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'ticks': args.ticks, 'speedup': args.speedup, 'results': results}, f, indent=2)
+    if args.compare and compare(results, args):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Shows that a sample's latency is bounded by the collector deadline.
+
+Runs CollectorRunner with fast collectors next to artificially slow and hung
+ones and compares the per-sample latency with calling the same collectors
+one after another. Exits non-zero if any sample overran the deadline.
+
+    python3 bench/bench_collector_deadline.py --timeout 0.2 --ticks 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from collectors import CollectorRunner  # noqa: E402
+
+# Scheduling slack allowed on top of the deadline.
+SLACK = 0.05
+
+
+def fast(key):
+    return lambda: {key: 1.0}
+
+
+def slow(key, seconds):
+    def collect():
+        time.sleep(seconds)
+        return {key: 2.0}
+    return collect
+
+
+def hung(key, released):
+    def collect():
+        released.wait()
+        return {key: 3.0}
+    return collect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=0.2, help='per-collector deadline in seconds')
+    parser.add_argument('--ticks', type=int, default=20)
+    args = parser.parse_args()
+
+    released = threading.Event()
+    collectors = {
+        'cpu_temperature': (fast('CPU_Temperature'), None),
+        'sys_memory': (fast('SYS_Memory_Usage'), None),
+        'slow_every_time': (slow('Slow_Metric', args.timeout * 3), None),
+        'hung_nvidia_smi': (hung('GPU_Temperature', released), None),
+        'network': (fast('Network_Transmit_Speed_MBps'), None),
+    }
+    runner = CollectorRunner(collectors, default_timeout=args.timeout)
+
+    latencies = []
+    keys_seen = set()
+    for _ in range(args.ticks):
+        start = time.monotonic()
+        data = runner.run()
+        latencies.append(time.monotonic() - start)
+        keys_seen.update(data)
+    released.set()
+    runner.shutdown()
+
+    start = time.monotonic()
+    for fn, _ in collectors.values():
+        if fn is not collectors['hung_nvidia_smi'][0]:
+            fn()
+    sequential = time.monotonic() - start
+
+    worst = max(latencies)
+    print(f"deadline {args.timeout * 1000:.0f} ms, {args.ticks} samples")
+    print(f"concurrent: worst {worst * 1000:.1f} ms, mean {sum(latencies) / len(latencies) * 1000:.1f} ms")
+    print(f"sequential (without the hung collector): {sequential * 1000:.1f} ms")
+    print(f"gaps: {runner.gaps}")
+    print(f"keys delivered: {sorted(keys_seen)}")
+    if worst > args.timeout + SLACK:
+        print("FAIL: a sample overran the deadline")
+        return 1
+    print("OK: every sample finished within the deadline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
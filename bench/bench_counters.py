@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Cost per sample of the counter rates as the number of cores, disks and interfaces grows.
+
+Writes synthetic /proc/stat, /proc/diskstats and /proc/net/dev files for
+each size in --sizes (that many cores, disks and interfaces) and times one
+sample with counters.CounterRates, with NumPy (if installed) and with
+array('Q'), against parsing the files line by line into dicts and computing
+each row's rates in Python. The counters advance between samples, outside
+the timed part. With --proc it times the real files instead.
+
+Each run also checks that CounterRates found every row the line-by-line
+parser did (the files of the larger sizes and of a busy host are longer than
+a page, which procfs returns one read at a time), and that counters going
+backwards are told apart: a 64-bit network counter reset from below 2**32
+has no rate, while the 32-bit ms doing I/O of a disk wraps. It exits
+non-zero if either check fails.
+
+    python3 bench/bench_counters.py --sizes 4,64,256,1024 --samples 200
+    python3 bench/bench_counters.py --proc /proc     # the real /proc, read only
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import counters  # noqa: E402
+import procfs_reader  # noqa: E402
+
+
+class SyntheticCounters:
+    """/proc/stat, /proc/diskstats and /proc/net/dev of a host with `size` cores, disks and interfaces."""
+
+    def __init__(self, root, size, seed=1):
+        self.root = root
+        self.size = size
+        self.random = random.Random(seed)
+        self.cpu = [[self.random.randrange(10 ** 6) for _ in range(10)] for _ in range(size + 1)]
+        self.disks = [[self.random.randrange(10 ** 9) for _ in range(17)] for _ in range(size)]
+        self.net = [[self.random.randrange(10 ** 12) for _ in range(16)] for _ in range(size)]
+        os.makedirs(os.path.join(root, 'net'), exist_ok=True)
+        self.write()
+
+    def advance(self):
+        for rows in (self.cpu, self.disks, self.net):
+            for row in rows:
+                for column in range(len(row)):
+                    row[column] += self.random.randrange(1000)
+        self.write()
+
+    def write(self):
+        cpu = ''.join(f"cpu{index - 1 if index else ' '} {' '.join(map(str, row))}\n"
+                      for index, row in enumerate(self.cpu))
+        with open(os.path.join(self.root, 'stat'), 'w') as f:
+            f.write(cpu + "intr 12345 0 0 0\nctxt 123456\nbtime 1700000000\nprocesses 4321\n")
+        with open(os.path.join(self.root, 'diskstats'), 'w') as f:
+            f.write(''.join(f"{259:>4} {index:>7} nvme{index}n1 {' '.join(map(str, row))}\n"
+                            for index, row in enumerate(self.disks)))
+        with open(os.path.join(self.root, 'net', 'dev'), 'w') as f:
+            f.write("Inter-|   Receive |  Transmit\n face |bytes packets|bytes packets\n")
+            f.write(''.join(f"  eth{index}: {' '.join(map(str, row))}\n" for index, row in enumerate(self.net)))
+
+
+class LineByLine:
+    """Parses each file line by line into {row: counters} and computes each row's rates in Python."""
+
+    def __init__(self, root):
+        self.paths = {name: os.path.join(root, *path) for name, path, *_ in counters.SOURCES}
+        self.prev = None
+        self.prev_time = None
+
+    def _read(self):
+        rows = {}
+        with open(self.paths['stat'], 'rb') as f:
+            for line in f:
+                if line.startswith(b'cpu'):
+                    fields = line.split()
+                    rows[fields[0]] = [int(x) for x in fields[1:]]
+        with open(self.paths['diskstats'], 'rb') as f:
+            for line in f:
+                fields = line.split()
+                rows[fields[2]] = [int(x) for x in fields[3:]]
+        with open(self.paths['net'], 'rb') as f:
+            for line in f.readlines()[2:]:
+                name, _, rest = line.partition(b':')
+                rows[name.strip()] = [int(x) for x in rest.split()]
+        return rows
+
+    def sample(self):
+        now = time.monotonic()
+        rows = self._read()
+        rates = None
+        if self.prev is not None:
+            elapsed = now - self.prev_time
+            rates = {name: [(c - p) / elapsed for c, p in zip(values, self.prev[name])]
+                     for name, values in rows.items() if name in self.prev}
+        self.prev, self.prev_time = rows, now
+        return rates
+
+
+def measure(sample, between, samples):
+    sample()
+    total = 0.0
+    for _ in range(samples):
+        between()
+        start = time.perf_counter()
+        sample()
+        total += time.perf_counter() - start
+    return total / samples * 1e6
+
+
+def missing_rows(root):
+    """Rows found line by line that CounterRates did not find, with NumPy and without."""
+    expected = set(LineByLine(root)._read())
+    missing = set()
+    for use_numpy in ([False, True] if counters.numpy is not None else [False]):
+        rates = counters.CounterRates(root, use_numpy=use_numpy)
+        rates.sample()
+        missing |= expected - {name.encode() for names in rates.names.values() for name in names}
+        procfs_reader.close_all()
+    return sorted(name.decode() for name in missing)
+
+
+def wrong_deltas():
+    """Deltas that differ from the expected ones across a counter reset and a 32-bit wrap."""
+    directory = tempfile.mkdtemp(prefix='bench_counters_')
+    try:
+        synthetic = SyntheticCounters(directory, 1)
+        synthetic.net[0][0] = 10 ** 9                   # bytes received
+        synthetic.disks[0][9] = (1 << 32) - 100         # ms doing I/O
+        synthetic.write()
+        now = [0.0]
+        samplers = []
+        for use_numpy in ([False, True] if counters.numpy is not None else [False]):
+            samplers.append(counters.CounterRates(directory, use_numpy=use_numpy, clock=lambda: now[0]))
+            samplers[-1].sample()
+        procfs_reader.close_all()
+        synthetic.net[0][0] = 100                       # the interface was re-created
+        synthetic.disks[0][9] = 400
+        synthetic.write()
+        now[0] = 5.0
+        expected = {'net': 0 if counters.LONG_BITS == 64 else (1 << 32) - 10 ** 9 + 100, 'diskstats': 500}
+        wrong = []
+        for rates in samplers:
+            rates.sample()
+            got = {'net': int(rates.delta('net')[0][counters.NET_RX_BYTES]),
+                   'diskstats': int(rates.delta('diskstats')[0][counters.DISK_IO_MS])}
+            label = 'numpy' if rates.use_numpy else 'array'
+            wrong += [f"{label} {source} {got[source]} (expected {expected[source]})"
+                      for source in expected if got[source] != expected[source]]
+            procfs_reader.close_all()
+        return wrong
+    finally:
+        shutil.rmtree(directory)
+
+
+def run(root, variants, between, samples):
+    """Microseconds per sample of each variant."""
+    results = []
+    for _, use_numpy in variants:
+        if use_numpy is None:
+            sample = LineByLine(root).sample
+        else:
+            sample = counters.CounterRates(root, use_numpy=use_numpy).sample
+        results.append(measure(sample, between, samples))
+        procfs_reader.close_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='4,64,256,1024', help='cores, disks and interfaces per host')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--proc', help='read this /proc instead of synthetic files')
+    args = parser.parse_args()
+
+    variants = [('line by line', None), ('array', False)]
+    if counters.numpy is not None:
+        variants.append(('numpy', True))
+    else:
+        print("NumPy is not installed; timing the array('Q') buffers only.")
+    print(f"{'size':>6} " + ' '.join(f"{label:>14}" for label, _ in variants) + "   (us per sample)")
+    missing = []
+    sizes = [] if args.proc else [int(size) for size in args.sizes.split(',')]
+    if args.proc:
+        results = run(args.proc, variants, lambda: None, args.samples)
+        print(f"{'proc':>6} " + ' '.join(f"{result:>14.1f}" for result in results))
+        missing = missing_rows(args.proc)
+    for size in sizes:
+        directory = tempfile.mkdtemp(prefix='bench_counters_')
+        try:
+            synthetic = SyntheticCounters(directory, size)
+            results = run(directory, variants, synthetic.advance, args.samples)
+            print(f"{size:>6} " + ' '.join(f"{result:>14.1f}" for result in results))
+            missing += missing_rows(directory)
+        finally:
+            shutil.rmtree(directory)
+
+    if missing:
+        print(f"FAIL: {len(missing)} rows were not parsed: {', '.join(missing[:10])}")
+        return 1
+    wrong = wrong_deltas()
+    if wrong:
+        print(f"FAIL: wrong deltas after a counter went backwards: {'; '.join(wrong)}")
+        return 1
+    print("OK: every cpu, disk and interface row was parsed, and counter resets and wraps were told apart")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
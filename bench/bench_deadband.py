@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Measures how many data points the deadband filter saves on a trace.
+
+Replays a trace through the agent's window reduction and deadband filter,
+using the deadband, missingDataAllowance and sampleInterval columns of
+config.csv, and compares the number of points uploaded with and without
+the filter. Also checks that no key goes longer than its
+missingDataAllowance without a point, i.e. that the heartbeat works.
+
+The trace is a CSV of `seconds,key,value` rows (seconds since the start of
+the recording). Without --trace a seeded trace of a mostly idle GPU host
+with one short job is generated; --write-trace saves it for reuse.
+
+    python3 bench/bench_deadband.py --hours 6
+    python3 bench/bench_deadband.py --trace recorded.csv
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from collectors import read_plan  # noqa: E402
+from sampling import DeadbandFilter, WindowAggregator, read_deadbands  # noqa: E402
+
+UPDATE_INTERVAL = 5  # DEFAULT_UPDATE_INTERVAL of the agent
+HEARTBEAT_FRACTION = 0.5
+
+
+def synthetic_trace(hours, seed):
+    """Yields (seconds, key, value) for an idle GPU host with a 10 minute job in the middle."""
+    rng = random.Random(seed)
+    duration = int(hours * 3600)
+    job_start, job_end = duration // 2, duration // 2 + 600
+    gpu_temp, cpu_temp, memory = 35.0, 42.0, 3.2
+    for t in range(duration):
+        busy = job_start <= t < job_end
+        gpu_temp += rng.uniform(-0.3, 0.3) + (0.2 if busy and gpu_temp < 70 else 0.0)
+        if not busy and gpu_temp > 36:
+            gpu_temp -= 0.1
+        cpu_temp += rng.uniform(-0.25, 0.25)
+        cpu_temp = min(max(cpu_temp, 40.0), 45.0)
+        yield t, 'GPU_Temperature', float(round(gpu_temp))
+        yield t, 'CPU_Temperature', round(cpu_temp, 3)
+        yield t, 'GPU_Utilization', float(rng.randint(90, 100) if busy else (rng.random() < 0.01) * 2)
+        yield t, 'SM_Clock', 1905.0 if busy else 210.0
+        yield t, 'Memory_Clock', 9501.0 if busy else 405.0
+        yield t, 'MAX_Video_Graphic_Clock', 1905.0 if busy else 555.0
+        yield t, 'Power_Draw', round((280.0 if busy else 9.0) + rng.uniform(-0.8, 0.8), 2)
+        yield t, 'GPU_Memory_Usage', 18000.0 if busy else 312.0
+        if t % 5 == 0:
+            yield t, 'Network_Transmit_Speed_MBps', round(abs(rng.gauss(0, 0.01)), 4)
+        if t % 60 == 0:
+            memory = min(max(memory + rng.uniform(-0.02, 0.02), 3.0), 3.4)
+            yield t, 'SYS_Memory_Usage', round(memory, 3)
+
+
+def read_trace(path):
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield float(row['seconds']), row['key'], float(row['value'])
+
+
+def replay(trace, deadband_filter, allowances):
+    """Runs the trace through 5 s windows; returns (points sent, worst gap per key)."""
+    aggregator = WindowAggregator()
+    sent = 0
+    last_sent = {}
+    worst_gap = defaultdict(float)
+    window_end = UPDATE_INTERVAL
+
+    def flush(now):
+        nonlocal sent
+        window = aggregator.flush()
+        if deadband_filter is not None:
+            window = deadband_filter.filter(window, now=now)
+        sent += len(window)
+        for key in window:
+            if key in last_sent:
+                worst_gap[key] = max(worst_gap[key], now - last_sent[key])
+            last_sent[key] = now
+
+    for seconds, key, value in trace:
+        while seconds >= window_end:
+            flush(window_end)
+            window_end += UPDATE_INTERVAL
+        aggregator.add({key: value})
+    flush(window_end)
+    return sent, {key: gap for key, gap in worst_gap.items() if key in allowances}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace', help='recorded trace (CSV of seconds,key,value)')
+    parser.add_argument('--hours', type=float, default=6.0, help='length of the generated trace')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--write-trace', help='save the generated trace to this CSV file')
+    parser.add_argument('--config', default=os.path.join(REPO_DIR, 'config.csv'))
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = list(read_trace(args.trace))
+    else:
+        trace = list(synthetic_trace(args.hours, args.seed))
+        if args.write_trace:
+            with open(args.write_trace, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['seconds', 'key', 'value'])
+                writer.writerows(trace)
+
+    enabled = {key for keys in read_plan(args.config).values() for key in keys}
+    trace = [sample for sample in trace if sample[1] in enabled]
+    deadbands, heartbeats = read_deadbands(args.config, HEARTBEAT_FRACTION)
+    with open(args.config, newline='') as f:
+        allowances = {row['keyName']: float(row['missingDataAllowance'])
+                      for row in csv.DictReader(f) if row.get('missingDataAllowance')}
+
+    baseline, _ = replay(trace, None, allowances)
+    filtered, worst_gap = replay(trace, DeadbandFilter(deadbands, heartbeats), allowances)
+
+    duration = trace[-1][0] - trace[0][0] if trace else 0
+    print(f"trace: {len(trace)} samples over {duration / 3600:.1f} h")
+    print(f"points uploaded without deadband: {baseline}")
+    print(f"points uploaded with deadband:    {filtered}")
+    print(f"reduction: {baseline / max(filtered, 1):.1f}x")
+    late = {key: gap for key, gap in worst_gap.items() if gap > allowances[key]}
+    for key in sorted(worst_gap):
+        print(f"  {key:<28} longest gap {worst_gap[key]:6.0f} s (allowance {allowances[key]:.0f} s)")
+    if late:
+        print(f"FAIL: keys went silent past their missingDataAllowance: {sorted(late)}")
+        return 1
+    print("OK: every key was heard from within its missingDataAllowance")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
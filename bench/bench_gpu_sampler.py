@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Compares per-tick GPU collection latency: one-shot nvidia-smi vs GpuSampler.
+
+    python3 bench/bench_gpu_sampler.py --fake          # fake nvidia-smi from bench/fake_bin
+    python3 bench/bench_gpu_sampler.py --ticks 50      # real nvidia-smi on PATH
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from gpu_sampler import GpuSampler, query_gpu_once  # noqa: E402
+
+
+def summarize(name, samples_ms):
+    samples_ms = sorted(samples_ms)
+    p99 = samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.99))]
+    print(f"{name:<22} mean {statistics.mean(samples_ms):8.3f} ms   "
+          f"p50 {statistics.median(samples_ms):8.3f} ms   p99 {p99:8.3f} ms")
+    return statistics.mean(samples_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ticks', type=int, default=30, help='collection ticks per path')
+    parser.add_argument('--period-ms', type=int, default=100, help='sampler loop period and tick spacing')
+    parser.add_argument('--fake', action='store_true', help='put bench/fake_bin first on PATH')
+    args = parser.parse_args()
+
+    if args.fake:
+        os.environ['PATH'] = os.path.join(BENCH_DIR, 'fake_bin') + os.pathsep + os.environ['PATH']
+
+    one_shot = []
+    for _ in range(args.ticks):
+        start = time.perf_counter()
+        if query_gpu_once() is None:
+            print("nvidia-smi returned no sample; is it on PATH?")
+            return 1
+        one_shot.append((time.perf_counter() - start) * 1000)
+
+    sampler = GpuSampler(period_ms=args.period_ms).start()
+    if not sampler.wait_for_sample(10):
+        print("GpuSampler produced no sample within 10s.")
+        sampler.stop()
+        return 1
+    streamed = []
+    misses = 0
+    for _ in range(args.ticks):
+        time.sleep(args.period_ms / 1000.0)
+        start = time.perf_counter()
+        if sampler.latest(max_age=3 * args.period_ms / 1000.0) is None:
+            misses += 1
+        streamed.append((time.perf_counter() - start) * 1000)
+    sampler.stop()
+
+    print(f"{args.ticks} ticks per path")
+    before = summarize('one-shot nvidia-smi', one_shot)
+    after = summarize('GpuSampler.latest()', streamed)
+    print(f"saved per tick: {before - after:.3f} ms "
+          f"(samples {sampler.samples}, stale reads {misses}, restarts {sampler.restarts})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
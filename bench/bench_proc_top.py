@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Per-sample cost of the processes collector against a synthetic /proc tree.
+
+Builds a /proc-like tree of --processes pid directories (stat and statm
+files) and, on every tick, lets --busy processes use CPU and --churn
+processes exit and start. It then compares listing the tree and opening and
+reading stat and statm of every process each tick (a full walk) with
+proc_top.ProcessTop, which keeps the stat files of the busiest processes open,
+re-reads them in place and lists the tree only when the process count changes. Exits non-zero if an
+incremental tick took longer than its budget.
+
+    python3 bench/bench_proc_top.py --processes 2000 --ticks 50 --churn 2
+    python3 bench/bench_proc_top.py --proc /proc     # the real /proc, read only
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from proc_top import ProcessTop  # noqa: E402
+
+# Slack allowed on top of the budget: the read in progress and a listing of /proc may run past it.
+SLACK_MS = 2.0
+STAT_WIDTH = 320
+
+
+def stat_line(pid, name, ticks, rss):
+    """A /proc/[pid]/stat line, padded so it can be rewritten in place."""
+    line = (f"{pid} ({name}) S 1 {pid} {pid} 0 -1 4194560 2500 0 0 0 {ticks} {ticks // 4} 0 0 20 0 1 0 "
+            f"{1000 + pid} 123456789 {rss} 18446744073709551615 1 1 0 0 0 0 0 4096 0 0 0 0 17 3 0 0 0 0 0")
+    return (line.ljust(STAT_WIDTH - 1) + '\n').encode()
+
+
+class SyntheticProc:
+    """A /proc-like directory whose processes use CPU, exit and start."""
+
+    def __init__(self, root, processes, seed=1):
+        self.root = root
+        self.random = random.Random(seed)
+        self.ticks = {}
+        self.next_pid = 1
+        with open(os.path.join(root, 'stat'), 'w') as f:
+            f.write("cpu  1 2 3 4 5 6 7 0 0 0\nprocesses 1\n")
+        os.mkdir(os.path.join(root, 'self'))
+        for _ in range(processes):
+            self.start()
+
+    def _write(self, pid):
+        path = os.path.join(self.root, str(pid))
+        fd = os.open(os.path.join(path, 'stat'), os.O_WRONLY | os.O_CREAT)
+        try:
+            os.pwrite(fd, stat_line(pid, f"proc{pid % 97}", self.ticks[pid], 1000 + pid), 0)
+        finally:
+            os.close(fd)
+
+    def start(self):
+        pid = self.next_pid
+        self.next_pid += 1
+        os.mkdir(os.path.join(self.root, str(pid)))
+        self.ticks[pid] = self.random.randrange(1000)
+        self._write(pid)
+        with open(os.path.join(self.root, str(pid), 'statm'), 'w') as f:
+            f.write(f"{5000 + pid} {1000 + pid} 500 100 0 800 0\n")
+
+    def exit(self):
+        pid = self.random.choice(list(self.ticks))
+        del self.ticks[pid]
+        # A stat file that is still open reads as empty, like one of an exited process
+        os.truncate(os.path.join(self.root, str(pid), 'stat'), 0)
+        shutil.rmtree(os.path.join(self.root, str(pid)))
+
+    def step(self, busy, churn):
+        for pid in self.random.sample(list(self.ticks), min(busy, len(self.ticks))):
+            self.ticks[pid] += self.random.randrange(1, 5)
+            self._write(pid)
+        for _ in range(churn):
+            self.exit()
+            self.start()
+
+
+def full_walk(root):
+    """Lists the tree and opens and reads stat and statm of every process."""
+    count = 0
+    for name in os.listdir(root):
+        if not name.isdigit():
+            continue
+        for file in ('stat', 'statm'):
+            try:
+                with open(os.path.join(root, name, file), 'rb') as f:
+                    f.read()
+            except OSError:
+                continue
+        count += 1
+    return count
+
+
+def measure(fn, ticks, between):
+    times = []
+    for _ in range(ticks):
+        between()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def describe(label, times):
+    print(f"{label:<12} mean {sum(times) / len(times):7.2f} ms   max {max(times):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=2000)
+    parser.add_argument('--ticks', type=int, default=50)
+    parser.add_argument('--busy', type=int, default=50, help='processes that use CPU each tick')
+    parser.add_argument('--churn', type=int, default=0, help='processes that exit and start each tick')
+    parser.add_argument('--budget-ms', type=float, default=10.0)
+    parser.add_argument('--proc', help='read this /proc instead of a synthetic tree')
+    args = parser.parse_args()
+
+    directory = None
+    if args.proc:
+        root, between = args.proc, lambda: None
+    else:
+        directory = tempfile.mkdtemp(prefix='bench_proc_top_')
+        root = directory
+        synthetic = SyntheticProc(root, args.processes)
+        between = lambda: synthetic.step(args.busy, args.churn)  # noqa: E731
+    try:
+        walk = measure(lambda: full_walk(root), args.ticks, between)
+        top = ProcessTop(root, budget_ms=args.budget_ms)
+        top.refresh()
+        walks, reads = top.walks, top.reads
+        incremental = measure(top.refresh, args.ticks, between)
+        print(f"{len(top)} processes, {args.ticks} ticks, {args.busy} busy and {args.churn} churned per tick")
+        describe('full walk', walk)
+        describe('incremental', incremental)
+        print(f"incremental: {top.walks - walks} listings, {(top.reads - reads) / args.ticks:.0f} reads per tick, "
+              f"{len(top.held)} stat files open")
+        print(f"top: {top.summary()}")
+        top.close()
+    finally:
+        if directory:
+            shutil.rmtree(directory)
+
+    if max(incremental) > args.budget_ms + SLACK_MS:
+        print(f"FAIL: an incremental tick took longer than the {args.budget_ms:.0f} ms budget")
+        return 1
+    print(f"OK: every incremental tick stayed within the {args.budget_ms:.0f} ms budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
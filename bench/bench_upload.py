@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Bytes on the wire and latency of one bulk upload: per-call requests.post vs BulkUploader.
+
+Runs against the local stand-in backend, so no MongoDB is needed:
+
+    python3 bench/bench_upload.py --requests 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+# A CA bundle from the environment would override the agent's verify=False
+# for the stand-in's self-signed certificate.
+for name in ('REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE'):
+    os.environ.pop(name, None)
+
+import requests  # noqa: E402
+import upload_stat_loop as agent  # noqa: E402
+from standin_server import StandinBackend  # noqa: E402
+
+SAMPLE_DATA = {
+    "CPU_Temperature": 47.25,
+    "SYS_Memory_Usage": 12.873046875,
+    "GPU_Temperature": 44.0,
+    "GPU_Utilization": 3.0,
+    "SM_Clock": 210.0,
+    "Memory_Clock": 405.0,
+    "MAX_Video_Graphic_Clock": 555.0,
+    "Power_Draw": 18.53,
+    "GPU_Memory_Usage": 1043.0,
+    "Network_Transmit_Speed_MBps": 0.0123291015625,
+}
+
+
+def run(name, post, backend, count):
+    backend.stats.reset()
+    latencies = []
+    for _ in range(count):
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        payload = agent.build_payload(SAMPLE_DATA, '01', timestamp)
+        start = time.perf_counter()
+        response = post(payload)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 201:
+            print(f"{name}: unexpected status {response.status_code}")
+            return
+    stats = backend.stats.snapshot()
+    latencies.sort()
+    print(f"{name:<26} {stats['connections']:>5} conns  "
+          f"{stats['body_bytes'] / count:>7.0f} B body  "
+          f"{(stats['header_bytes'] + stats['body_bytes']) / count:>7.0f} B req  "
+          f"p50 {statistics.median(latencies):6.2f} ms  "
+          f"p99 {latencies[min(count - 1, int(count * 0.99))]:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100)
+    args = parser.parse_args()
+
+    backend = StandinBackend().start()
+    agent.BASE_URL = backend.base_url
+    headers = {"Authorization": f"Bearer {agent.login_hardcoded()}"}
+    try:
+        print(f"{args.requests} uploads of {len(SAMPLE_DATA)} points "
+              "(request bytes exclude TLS handshakes)")
+        run('before: requests.post', lambda payload: requests.post(
+            f"{agent.BASE_URL}/data/bulk", headers=headers, json=payload), backend, args.requests)
+        uploader = agent.BulkUploader(agent.create_session(), agent.login_hardcoded())
+        run('after: BulkUploader+gzip', uploader.post, backend, args.requests)
+    finally:
+        backend.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""Simulates a fleet of upload agents hitting the backend's ingest route.
+
+N devices x M keys post the same payloads as upload_metrics() (built and
+gzip-encoded by the agent's own build_payload and BulkUploader) over a
+pool of keep-alive HTTPS connections driven by asyncio. The token comes
+from the agent's login flow. Scenarios:
+
+  steady     every device uploads one window every --interval seconds
+  storm      every device logs in and uploads its spooled windows at the
+             same moment on fresh connections, as after a backend outage
+  backfill   every device replays --batches spool chunks of --batch-points
+             points as fast as the pool allows
+
+Reports throughput, p50/p99 latency (including any wait for a pooled
+connection, so an overloaded backend shows up as latency rather than as a
+lower send rate) and error rates per scenario.
+
+    python3 bench/fleet_loadgen.py --url https://localhost:3443/api --username admin --password ... \\
+        --devices 1000 --keys 10 --scenario steady --duration 60
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import ssl
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+for name in ('REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE'):
+    os.environ.pop(name, None)
+
+import upload_stat_loop as agent  # noqa: E402
+
+SYNTHETIC_KEY_PREFIX = 'Fleet_Key_'
+
+
+class ConnectionPool:
+    """Up to `size` keep-alive HTTP/1.1 connections to one host."""
+
+    def __init__(self, host, port, use_tls, size):
+        self.host = host
+        self.port = port
+        self.ssl = None
+        if use_tls:
+            # The backend uses a self-signed certificate, like the agent assumes.
+            self.ssl = ssl.create_default_context()
+            self.ssl.check_hostname = False
+            self.ssl.verify_mode = ssl.CERT_NONE
+        self.idle = []
+        self.slots = asyncio.Semaphore(size)
+        self.opened = 0
+
+    async def _open(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+
+    async def request(self, method, path, headers, body=b'', keep_alive=True):
+        """Sends one request; returns (status, response body)."""
+        async with self.slots:
+            connection = self.idle.pop() if self.idle and keep_alive else await self._open()
+            reader, writer = connection
+            try:
+                head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                        f"Content-Length: {len(body)}",
+                        "Connection: keep-alive" if keep_alive else "Connection: close"]
+                head.extend(f"{name}: {value}" for name, value in headers.items())
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+                status, response_headers, data = await self._read_response(reader)
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive and response_headers.get('connection', '').lower() != 'close':
+                self.idle.append(connection)
+            else:
+                writer.close()
+            return status, data
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by the server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                data += chunk[:-2]
+        else:
+            data = await reader.readexactly(int(headers.get('content-length', 0)))
+        return status, headers, data
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+class Results:
+    """Latency and outcome of every request in a scenario."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.points = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, seconds, status, points, size):
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+        self.bytes += size
+        if status == 201:
+            self.points += points
+
+    def report(self, connections):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        count = len(self.latencies) + sum(self.errors.values())
+        failed = count - self.statuses[201]
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))] * 1000.0 if latencies else 0.0
+
+        print(f"\n== {self.name}: {count} requests in {elapsed:.1f} s over {connections} new connections")
+        print(f"  throughput: {count / elapsed:.1f} req/s, {self.points / elapsed:.0f} points/s stored, "
+              f"{self.bytes / elapsed / 1024:.0f} KiB/s sent")
+        print(f"  latency:    p50 {percentile(50):.1f} ms, p99 {percentile(99):.1f} ms, max {percentile(100):.1f} ms")
+        print(f"  errors:     {failed} ({failed / max(count, 1):.2%})"
+              + ''.join(f", HTTP {status}: {n}" for status, n in sorted(self.statuses.items()) if status != 201)
+              + ''.join(f", {error}: {n}" for error, n in self.errors.most_common()))
+
+
+def load_keys(count, config_path):
+    """The agent's float keys from config.csv, topped up with synthetic keys."""
+    with open(config_path, newline='') as f:
+        keys = [row['keyName'] for row in csv.DictReader(f) if row.get('dataType') == 'float']
+    keys = keys[:count]
+    keys.extend(f"{SYNTHETIC_KEY_PREFIX}{i:03d}" for i in range(count - len(keys)))
+    return keys
+
+
+def create_synthetic_keys(session, token, keys):
+    """Creates the Fleet_Key_* DataTypes the backend needs before it accepts them."""
+    for key in keys:
+        if not key.startswith(SYNTHETIC_KEY_PREFIX):
+            continue
+        response = session.post(f"{agent.BASE_URL}/keys", headers={"Authorization": f"Bearer {token}"},
+                                json={"keyName": key, "dataType": "float", "missingDataAllowance": 300},
+                                timeout=agent.UPLOAD_TIMEOUT)
+        if response.status_code not in (201, 400):
+            print(f"Failed to create key '{key}': HTTP {response.status_code}")
+
+
+class Fleet:
+    def __init__(self, args, token):
+        self.args = args
+        self.token = token
+        self.keys = load_keys(args.keys, args.config)
+        self.devices = [f"fleet-{i:05d}" for i in range(args.devices)]
+        self.encoder = agent.BulkUploader(None, token, columnar=args.columnar)
+        self.path = urlsplit(agent.BASE_URL).path + ('/data/columnar' if args.columnar else '/data/bulk')
+        self.pool = None
+        self.rng = random.Random(args.seed)
+
+    def window(self, device, timestamp):
+        data = {key: round(self.rng.uniform(0, 100), 2) for key in self.keys}
+        return agent.build_payload(data, device, timestamp)
+
+    def encode(self, points):
+        payload = agent.to_columnar(points) if self.args.columnar else points
+        return self.encoder.encode(payload)
+
+    async def upload(self, results, points, keep_alive=True):
+        body, headers, _ = self.encode(points)
+        start = time.perf_counter()
+        try:
+            status, _ = await asyncio.wait_for(
+                self.pool.request('POST', self.path, headers, body, keep_alive), self.args.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            results.errors[type(e).__name__] += 1
+            return
+        results.record(time.perf_counter() - start, status, len(points), len(body))
+
+    async def steady(self):
+        results = Results(f"steady: {len(self.devices)} devices x {len(self.keys)} keys every {self.args.interval:g} s")
+        deadline = time.monotonic() + self.args.duration
+
+        async def device_loop(device):
+            # Devices are spread over the interval, as real agents are.
+            await asyncio.sleep(self.rng.uniform(0, self.args.interval))
+            next_upload = time.monotonic()
+            while next_upload < deadline:
+                timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                await self.upload(results, self.window(device, timestamp))
+                next_upload += self.args.interval
+                await asyncio.sleep(max(0.0, next_upload - time.monotonic()))
+
+        await asyncio.gather(*(device_loop(device) for device in self.devices))
+        results.finished = time.perf_counter()
+        return results
+
+    async def storm(self):
+        results = Results(f"storm: {len(self.devices)} devices reconnect at once with "
+                          f"{self.args.storm_windows} windows each")
+        login_body = agent.json.dumps({"username": agent.USERNAME, "password": agent.PASSWORD}).encode('utf-8')
+        login_path = urlsplit(agent.BASE_URL).path + '/auth/login'
+        login_results = Results('storm logins')
+        now = time.time()
+
+        async def reconnect(device):
+            start = time.perf_counter()
+            try:
+                status, _ = await asyncio.wait_for(self.pool.request(
+                    'POST', login_path, {"Content-Type": "application/json"}, login_body, keep_alive=False),
+                    self.args.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                login_results.errors[type(e).__name__] += 1
+                return
+            login_results.record(time.perf_counter() - start, 201 if status == 200 else status, 0, len(login_body))
+            points = []
+            for window in range(self.args.storm_windows):
+                timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - window * self.args.interval))
+                points.extend(self.window(device, timestamp))
+            await self.upload(results, points, keep_alive=False)
+
+        await asyncio.gather(*(reconnect(device) for device in self.devices))
+        login_results.finished = results.finished = time.perf_counter()
+        login_results.name = f"storm logins: {len(self.devices)} concurrent POST /auth/login"
+        login_results.report(len(self.devices))
+        return results
+
+    async def backfill(self):
+        results = Results(f"backfill: {len(self.devices)} devices x {self.args.batches} batches of "
+                          f"{self.args.batch_points} points")
+        windows = max(1, self.args.batch_points // len(self.keys))
+        now = time.time()
+
+        async def replay(device):
+            for batch in range(self.args.batches):
+                points = []
+                for window in range(windows):
+                    age = ((batch * windows) + window) * self.args.interval
+                    points.extend(self.window(device, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - age))))
+                await self.upload(results, points)
+
+        await asyncio.gather(*(replay(device) for device in self.devices))
+        results.finished = time.perf_counter()
+        return results
+
+    async def run(self, scenario):
+        # Each scenario starts from cold connections in its own event loop.
+        url = urlsplit(agent.BASE_URL)
+        self.pool = ConnectionPool(url.hostname, url.port or 443, url.scheme == 'https', self.args.connections)
+        results = await getattr(self, scenario)()
+        results.report(self.pool.opened)
+        self.pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=agent.BASE_URL, help='backend API base URL')
+    parser.add_argument('--username', default=agent.USERNAME)
+    parser.add_argument('--password', default=agent.PASSWORD)
+    parser.add_argument('--scenario', choices=('steady', 'storm', 'backfill', 'all'), default='steady')
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--keys', type=int, default=10, help='keys per device; beyond the float keys of '
+                        'config.csv synthetic Fleet_Key_* keys are used')
+    parser.add_argument('--create-keys', action='store_true', help='create the synthetic keys first (admin login)')
+    parser.add_argument('--interval', type=float, default=agent.DEFAULT_UPDATE_INTERVAL,
+                        help='seconds between a device\'s uploads')
+    parser.add_argument('--duration', type=float, default=30.0, help='length of the steady scenario in seconds')
+    parser.add_argument('--storm-windows', type=int, default=12, help='spooled windows per device in the storm')
+    parser.add_argument('--batches', type=int, default=5, help='backfill batches per device')
+    parser.add_argument('--batch-points', type=int, default=agent.REPLAY_CHUNK_POINTS)
+    parser.add_argument('--connections', type=int, default=64, help='size of the keep-alive pool')
+    parser.add_argument('--timeout', type=float, default=agent.UPLOAD_TIMEOUT)
+    parser.add_argument('--columnar', action='store_true', help='post columnar batches to /data/columnar')
+    parser.add_argument('--config', default=os.path.join(REPO_DIR, 'config.csv'))
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    agent.BASE_URL = args.url.rstrip('/')
+    agent.USERNAME = args.username
+    agent.PASSWORD = args.password
+    session = agent.create_session()
+    token = agent.login_hardcoded(session)
+    fleet = Fleet(args, token)
+    if args.create_keys:
+        create_synthetic_keys(session, token, fleet.keys)
+
+    scenarios = ('steady', 'storm', 'backfill') if args.scenario == 'all' else (args.scenario,)
+    for scenario in scenarios:
+        asyncio.run(fleet.run(scenario))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Local HTTPS stand-in for the backend's login and ingest routes.
+
+Implements just enough of the API for the agent to run against it with no
+MongoDB: POST /api/auth/login hands out a fixed token, POST /api/data/bulk
+accepts (optionally gzip-compressed) JSON arrays and POST /api/data/columnar
+columnar batches in JSON or MessagePack (if msgpack is installed). Every
+connection, request and byte received is counted so benchmarks can report
+what the agent put on the wire.
+
+    python3 bench/standin_server.py --port 3443
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+TOKEN = 'standin-token'
+
+
+def make_self_signed_cert(directory):
+    """Creates a throwaway localhost key/cert pair with openssl."""
+    key_path = os.path.join(directory, 'server.key')
+    cert_path = os.path.join(directory, 'server.cert')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', key_path, '-out', cert_path],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return key_path, cert_path
+
+
+class Stats:
+    """Counters shared by all handler threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.requests = 0
+        self.header_bytes = 0
+        self.body_bytes = 0
+        self.decoded_bytes = 0
+        self.points = 0
+        self.errors = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: value for name, value in vars(self).items() if name != 'lock'}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Node's HTTP server disables Nagle too; without it every keep-alive
+        # response would stall on the client's delayed ACK.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.stats.add(connections=1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        header_bytes = len(self.requestline) + 2 + len(self.headers.as_bytes())
+        self.server.stats.add(requests=1, header_bytes=header_bytes, body_bytes=len(body))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        self.server.stats.add(decoded_bytes=len(body))
+        return body
+
+    def do_POST(self):
+        try:
+            body = self._read_body()
+        except (OSError, ValueError) as e:
+            self.server.stats.add(errors=1)
+            return self._reply(400, {'message': f'Bad body: {e}'})
+
+        if self.path == '/api/auth/login':
+            return self._reply(200, {'token': TOKEN})
+
+        if self.headers.get('Authorization') != f'Bearer {TOKEN}':
+            self.server.stats.add(errors=1)
+            return self._reply(403, {'message': 'Invalid token.'})
+
+        if self.path == '/api/data/bulk':
+            try:
+                points = json.loads(body)
+            except ValueError:
+                self.server.stats.add(errors=1)
+                return self._reply(400, {'message': 'Invalid JSON.'})
+            if not isinstance(points, list) or not points:
+                self.server.stats.add(errors=1)
+                return self._reply(400, {'message': 'Expected an array of data values.'})
+            self.server.stats.add(points=len(points))
+            return self._reply(201, {'message': 'Data uploaded successfully.', 'count': len(points)})
+
+        if self.path == '/api/data/columnar':
+            try:
+                if self.headers.get('Content-Type') == 'application/msgpack':
+                    if msgpack is None:
+                        raise ValueError('msgpack is not installed')
+                    batch = msgpack.unpackb(body)
+                else:
+                    batch = json.loads(body)
+                points = sum(value is not None for column in batch['values'].values() for value in column)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                self.server.stats.add(errors=1)
+                return self._reply(400, {'message': f'Invalid columnar batch: {e}'})
+            self.server.stats.add(points=points)
+            return self._reply(201, {'message': 'Data uploaded successfully.', 'count': points})
+
+        self._reply(404, {'message': 'Not found.'})
+
+
+class StandinBackend:
+    """Runs the stand-in server on a background thread."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.cert_dir = tempfile.mkdtemp(prefix='standin-')
+        key_path, cert_path = make_self_signed_cert(self.cert_dir)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_path, key_path)
+        self.httpd = ThreadingHTTPServer((host, port), StandinHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self.httpd.stats = Stats()
+        self.thread = None
+
+    @property
+    def stats(self):
+        return self.httpd.stats
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"https://{host}:{port}/api"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='standin-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.cert_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3443)
+    args = parser.parse_args()
+
+    backend = StandinBackend(args.host, args.port)
+    print(f"Stand-in backend listening on {backend.base_url}", flush=True)
+    try:
+        backend.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(backend.stats.snapshot()))
+        backend.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Registry, schedule and concurrent execution of the agent's metric collectors.
+
+A collector is registered with the keys it can produce, a default sampling
+interval, a relative cost (1 = one procfs read) and a "module:factory"
+target. config.csv decides which keys are collected and how often through
+its `collector` and `sampleInterval` columns. Collector modules are only
+imported when at least one of their keys is enabled, so a host without a
+GPU never loads or runs the GPU code.
+"""
+import concurrent.futures
+import csv
+import importlib
+import time
+
+
+class Collector:
+    """A registered metric source."""
+
+    def __init__(self, name, keys, interval, cost, target):
+        self.name = name
+        self.keys = tuple(keys)
+        self.interval = interval
+        self.cost = cost
+        self.target = target
+
+    def load(self, context, interval):
+        """Imports the collector's module and returns its callable."""
+        module_name, factory_name = self.target.split(':')
+        factory = getattr(importlib.import_module(module_name), factory_name)
+        return factory(context, interval)
+
+
+REGISTRY = {}
+
+
+def register(name, keys, interval, cost, target):
+    """Adds a collector to the registry."""
+    REGISTRY[name] = Collector(name, keys, interval, cost, target)
+
+
+register('cpu_temperature', ['CPU_Temperature'], 1, 1, 'procfs_reader:cpu_temperature_collector')
+register('sys_memory', ['SYS_Memory_Usage'], 60, 1, 'procfs_reader:memory_collector')
+register('network', ['Network_Transmit_Speed_MBps'], 5, 1, 'procfs_reader:NetworkSpeedCollector')
+register('gpu', ['GPU_Temperature', 'GPU_Utilization', 'SM_Clock', 'Memory_Clock',
+                 'MAX_Video_Graphic_Clock', 'Power_Draw', 'GPU_Memory_Usage'],
+         1, 5, 'gpu_sampler:GpuCollector')
+register('spool', ['Agent_Spool_Depth', 'Agent_Replay_Points_per_s'], 5, 1, 'spool:spool_collector')
+register('agent', ['Agent_Tick_ms', 'Agent_Upload_ms', 'Agent_CPU_Percent', 'Agent_RSS_MB'],
+         60, 1, 'agent_stats:agent_collector')
+register('processes', ['Process_Count', 'Top_Process_CPU_Percent', 'Top_Process_RSS_MB', 'Top_Processes'],
+         5, 20, 'proc_top:ProcessTopCollector')
+register('counters', ['CPU_Usage_Percent', 'CPU_Core_Max_Percent', 'Disk_Read_MBps', 'Disk_Write_MBps',
+                      'Disk_Busy_Percent', 'Network_RX_MBps', 'Network_TX_MBps'],
+         5, 3, 'counters:CounterRateCollector')
+
+
+def read_plan(config_path):
+    """Reads config.csv into {collector: {key: interval}} for the enabled keys."""
+    plan = {}
+    with open(config_path, newline='') as f:
+        for row in csv.DictReader(f):
+            key = row.get('keyName')
+            name = (row.get('collector') or '').strip()
+            if not name:
+                continue
+            collector = REGISTRY.get(name)
+            if collector is None:
+                print(f"Unknown collector '{name}' for key '{key}' in {config_path}.")
+                continue
+            if key not in collector.keys:
+                print(f"Collector '{name}' does not produce key '{key}'.")
+                continue
+            interval = float(row.get('sampleInterval') or collector.interval)
+            if interval > 0:
+                plan.setdefault(name, {})[key] = interval
+    return plan
+
+
+def load_collectors(plan, context):
+    """Loads the planned collectors; returns {name: (callable, timeout)}, costliest first."""
+    loaded = {}
+    for name in sorted(plan, key=lambda n: -REGISTRY[n].cost):
+        try:
+            loaded[name] = (REGISTRY[name].load(context, min(plan[name].values())), None)
+        except Exception as e:
+            print(f"Could not load collector '{name}': {e}")
+    return loaded
+
+
+class CollectorSchedule:
+    """Tracks when each planned key is next due.
+
+    Keys are due on a fixed grid of their own interval; a key that fell
+    behind is rescheduled from now instead of firing repeatedly.
+    """
+
+    def __init__(self, plan, clock=time.monotonic):
+        self.plan = plan
+        self.clock = clock
+        now = clock()
+        self.next_due = {(name, key): now for name, keys in plan.items() for key in keys}
+
+    @property
+    def tick(self):
+        """The base sampling interval: the shortest interval of any key."""
+        return min(interval for keys in self.plan.values() for interval in keys.values())
+
+    def due(self, now=None):
+        """Returns {collector: set(keys)} that are due and advances their deadlines."""
+        now = self.clock() if now is None else now
+        # Half a tick of tolerance so keys on a multiple of the tick do not slip a sample.
+        horizon = now + self.tick / 2
+        due = {}
+        for (name, key), deadline in self.next_due.items():
+            if deadline <= horizon:
+                interval = self.plan[name][key]
+                deadline += interval
+                if deadline <= now:
+                    deadline = now + interval
+                self.next_due[(name, key)] = deadline
+                due.setdefault(name, set()).add(key)
+        return due
+
+
+class CollectorRunner:
+    """Runs collectors concurrently on a thread pool, each with its own deadline.
+
+    A collector is a callable returning {key: value}, optionally with a
+    close() method. One that misses its deadline leaves a gap for that
+    sample and keeps running in the background; it is not started again
+    until it has returned, so a hung collector ties up one thread at most
+    and never delays the others. on_timing(name, seconds), if given, is
+    called with how long each collector took.
+    """
+
+    def __init__(self, collectors, default_timeout=1.0, on_timing=None):
+        # name -> (callable, timeout in seconds or None for the default),
+        # submitted in this order each sample
+        self.collectors = dict(collectors)
+        self.default_timeout = default_timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, len(self.collectors)), thread_name_prefix='collector')
+        self.on_timing = on_timing
+        self.gaps = {name: 0 for name in self.collectors}
+        self._running = {}
+        self._failing = set()
+
+    def run(self, names=None):
+        """Runs the named collectors (all by default) and merges their results."""
+        start = time.monotonic()
+        futures = []
+        for name in (self.collectors if names is None else names):
+            fn, timeout = self.collectors[name]
+            running = self._running.get(name)
+            if running is not None:
+                if not running.done():
+                    self._gap(name, "is still running from an earlier sample")
+                    continue
+                del self._running[name]
+            deadline = start + (self.default_timeout if timeout is None else timeout)
+            if self.on_timing is None:
+                future = self.executor.submit(fn)
+            else:
+                future = self.executor.submit(self._timed, name, fn)
+            futures.append((deadline, name, future))
+
+        data = {}
+        for deadline, name, future in sorted(futures, key=lambda item: item[0]):
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                self._running[name] = future
+                self._gap(name, "missed its deadline")
+                continue
+            except Exception as e:
+                self._gap(name, f"failed: {e}")
+                continue
+            if name in self._failing:
+                self._failing.discard(name)
+                print(f"Collector '{name}' recovered.")
+            if result:
+                for key, value in result.items():
+                    if value is not None:
+                        data[key] = value
+        return data
+
+    def _timed(self, name, fn):
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self.on_timing(name, time.perf_counter() - start)
+
+    def _gap(self, name, reason):
+        self.gaps[name] += 1
+        if name not in self._failing:
+            # Reported once per outage; the count keeps track of every gap.
+            self._failing.add(name)
+            print(f"Collector '{name}' {reason}; leaving a gap.")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for fn, _ in self.collectors.values():
+            close = getattr(fn, 'close', None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as e:
+                    print(f"Error closing collector: {e}")
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Per-second rates of the kernel's cumulative counters, computed in one pass.
+
+CounterRates reads /proc/stat (the cpu lines), /proc/diskstats and
+/proc/net/dev, strips the row names with one regular expression per file
+and parses all their counters at once. Only the columns the rates need are
+kept, in a flat buffer of unsigned 64-bit integers. Each sample subtracts
+the previous buffer from the current one, so every per-core, per-disk and
+per-interface delta comes out of a single vector operation, and the number
+of Python statements per sample does not grow with the number of cores,
+disks or interfaces. With NumPy installed the buffers are preallocated NumPy
+arrays; without it they are array('Q') and the arithmetic is done in Python,
+with the same results.
+
+Timestamps come from the monotonic clock, so a clock change cannot distort a
+rate. A 32-bit counter that went backwards wrapped around 2**32, unless that
+wrapped delta is more than the counter could have advanced in the interval.
+A 64-bit counter never wraps in practice, so one that went backwards was
+reset (an interface re-created, a disk re-attached, a driver reloaded), as
+was an implausible 32-bit one, and its delta is 0. When
+a core, disk or interface appears or disappears the buffers are laid out
+again and that sample has no rates.
+"""
+import os
+import re
+import sys
+import time
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import procfs_reader
+
+MB = 1024.0 * 1024.0
+SECTOR_BYTES = 512
+WRAP_32 = 1 << 32
+
+# Row names: cpu/cpuN in /proc/stat, "major minor name" in /proc/diskstats,
+# "name:" in /proc/net/dev. Each starts with the newline before the row, which
+# lets the regular expression engine skip ahead to the next line.
+CPU_ROW = re.compile(rb'\n(cpu\d*)')
+DISK_ROW = re.compile(rb'\n *\d+ +\d+ +(\S+)')
+NET_ROW = re.compile(rb'\n *([^:\s]+):')
+
+# Only whole disks count towards the disk keys: partitions, loop and RAM disks
+# and device-mapper/md devices would count the same I/O again.
+DISK_EXCLUDE = re.compile(rb'^(loop|ram|zram|dm-|md|sr|fd)\d|^(sd|hd|vd|xvd)[a-z]+\d+$|^(nvme\d+n\d+|mmcblk\d+)p\d+$')
+# Loopback and virtual (container, bridge, tunnel) interfaces would count the
+# same traffic again.
+INTERFACE_EXCLUDE = re.compile(rb'^(lo|veth|docker|br-|virbr|ifb|tun|tap)')
+
+# Columns kept from each row (counted after the name), then their positions
+# among the kept ones
+CPU_COLUMNS = tuple(range(8))       # user..steal; guest is already in user
+CPU_IDLE, CPU_IOWAIT = 3, 4
+DISK_COLUMNS = (2, 6, 9)            # sectors read, sectors written, ms spent doing I/O
+DISK_SECTORS_READ, DISK_SECTORS_WRITTEN, DISK_IO_MS = 0, 1, 2
+NET_COLUMNS = (0, 8)                # bytes received, bytes transmitted
+NET_RX_BYTES, NET_TX_BYTES = 0, 1
+
+# Width of each kept column: the cpu times are u64, the ms doing I/O in
+# diskstats an unsigned int, and the other disk and network counters an
+# unsigned long, which is as wide as this Python's on the same kernel.
+LONG_BITS = 64 if sys.maxsize > WRAP_32 else 32
+CPU_BITS = (64,) * len(CPU_COLUMNS)
+DISK_BITS = (LONG_BITS, LONG_BITS, 32)
+NET_BITS = (LONG_BITS, LONG_BITS)
+
+# Fastest each kept column can plausibly advance, per second. A wrapped
+# 32-bit delta beyond that is a reset.
+MAX_BYTES_PER_SECOND = 1 << 36      # 64 GiB/s
+CPU_TICKS_PER_SECOND = os.sysconf('SC_CLK_TCK') * (os.cpu_count() or 1)
+CPU_MAX_RATES = (CPU_TICKS_PER_SECOND,) * len(CPU_COLUMNS)
+DISK_MAX_RATES = (MAX_BYTES_PER_SECOND / SECTOR_BYTES, MAX_BYTES_PER_SECOND / SECTOR_BYTES, 2000)
+NET_MAX_RATES = (MAX_BYTES_PER_SECOND, MAX_BYTES_PER_SECOND)
+
+
+def cpu_rows(data):
+    """The cpu lines at the top of /proc/stat."""
+    end = data.find(b'\n', data.rfind(b'\ncpu') + 1)
+    return b'\n' + (data[:end] if end >= 0 else data)
+
+
+def disk_rows(data):
+    return b'\n' + data
+
+
+def net_rows(data):
+    """/proc/net/dev from the newline before its first interface."""
+    return data[data.find(b'\n', data.find(b'\n') + 1):]
+
+
+# name, path below PROC_ROOT, rows of the file, row name pattern, columns kept,
+# their widths and their fastest rates
+SOURCES = (
+    ('stat', ('stat',), cpu_rows, CPU_ROW, CPU_COLUMNS, CPU_BITS, CPU_MAX_RATES),
+    ('diskstats', ('diskstats',), disk_rows, DISK_ROW, DISK_COLUMNS, DISK_BITS, DISK_MAX_RATES),
+    ('net', ('net', 'dev'), net_rows, NET_ROW, NET_COLUMNS, NET_BITS, NET_MAX_RATES),
+)
+
+
+class CounterRates:
+    """Deltas of the kept columns of every row of SOURCES between successive sample() calls."""
+
+    def __init__(self, proc_root=None, use_numpy=None, clock=time.monotonic):
+        root = proc_root or procfs_reader.PROC_ROOT
+        self.paths = [os.path.join(root, *source[1]) for source in SOURCES]
+        self.use_numpy = numpy is not None if use_numpy is None else use_numpy
+        self.clock = clock
+        self.names = {}      # source -> row names
+        self.shapes = {}     # source -> (offset, rows, columns) in the buffers
+        self.layout = None
+        self.count = 0       # counters in the files, kept or not
+        self.index = None    # position of each kept counter among them
+        self.limits = None   # fastest rate of each kept counter
+        self.wide = None     # whether each kept counter is 64-bit
+        self.prev = self.cur = self.deltas = None
+        self.prev_time = None
+        self.elapsed = None
+        self.layouts = 0
+        self.resets = 0
+
+    def _read(self):
+        """Returns the row names and the counter text (row names removed) of each source."""
+        names = []
+        texts = []
+        for source, path in zip(SOURCES, self.paths):
+            rows, pattern = source[2], source[3]
+            # split() alternates counter text and row names
+            parts = pattern.split(rows(procfs_reader.open_file(path).read()))
+            names.append(tuple(parts[1::2]))
+            texts.append(b' '.join(parts[0::2]))
+        return tuple(names), texts
+
+    def _lay_out(self, names, texts):
+        """Sizes the buffers for the current rows of each source."""
+        index = []
+        limits = []
+        wide = []
+        first = 0
+        for (source, _, _, _, kept, bits, rates), rows, text in zip(SOURCES, names, texts):
+            count = len(text.split())
+            width = count // len(rows) if rows else 0
+            if width <= max(kept):
+                # A kernel whose rows lack a column we need: the source has no rows.
+                rows = ()
+            self.names[source] = [name.decode() for name in rows]
+            self.shapes[source] = (len(index), len(rows), len(kept))
+            for row in range(len(rows)):
+                index.extend(first + row * width + column for column in kept)
+                limits.extend(rates)
+                wide.extend(width == 64 for width in bits)
+            first += count
+        self.count = first
+        self.layout = names
+        self.layouts += 1
+        self.prev_time = None
+        size = len(index)
+        if self.use_numpy:
+            self.index = numpy.array(index, dtype=numpy.intp)
+            self.limits = numpy.array(limits, dtype=numpy.float64)
+            self.wide = numpy.array(wide, dtype=bool)
+            self.prev = numpy.zeros(size, dtype=numpy.uint64)
+            self.cur = numpy.zeros(size, dtype=numpy.uint64)
+            self.deltas = numpy.zeros(size, dtype=numpy.uint64)
+            self._wrapped = numpy.zeros(size, dtype=bool)
+            self._reset = numpy.zeros(size, dtype=bool)
+        else:
+            self.index = index
+            self.limits = limits
+            self.wide = wide
+            self.prev = array('Q', bytes(8 * size))
+            self.cur = array('Q', bytes(8 * size))
+            self.deltas = array('Q', bytes(8 * size))
+
+    def sample(self):
+        """Reads every source; returns the seconds since the last sample, or None without a previous one."""
+        now = self.clock()
+        names, texts = self._read()
+        if names != self.layout:
+            self._lay_out(names, texts)
+        text = b' '.join(texts)
+        if self.use_numpy:
+            parsed = numpy.fromstring(text, dtype=numpy.uint64, sep=' ')
+        else:
+            parsed = text.split()
+        if len(parsed) != self.count:
+            # Rows of the same names but a different number of columns; lay out again next time.
+            self.layout = None
+            return None
+        self.prev, self.cur = self.cur, self.prev
+        if self.use_numpy:
+            numpy.take(parsed, self.index, out=self.cur)
+        else:
+            # Only the kept counters are converted from text.
+            self.cur[:] = array('Q', [int(parsed[i]) for i in self.index])
+        elapsed = None
+        if self.prev_time is not None and now > self.prev_time:
+            elapsed = now - self.prev_time
+            self._subtract(elapsed)
+        self.prev_time = now
+        self.elapsed = elapsed
+        return elapsed
+
+    def _subtract(self, elapsed):
+        cur, prev, deltas = self.cur, self.prev, self.deltas
+        if self.use_numpy:
+            numpy.subtract(cur, prev, out=deltas)
+            numpy.less(cur, prev, out=self._wrapped)
+            if not self._wrapped.any():
+                return
+            # Unsigned subtraction wraps by 2**64; 32-bit counters wrap by 2**32.
+            numpy.bitwise_and(deltas, WRAP_32 - 1, out=deltas, where=~self.wide)
+            numpy.greater(deltas, self.limits * elapsed, out=self._reset)
+            self._reset |= self.wide
+            self._reset &= self._wrapped
+            self.resets += int(numpy.count_nonzero(self._reset))
+            numpy.copyto(deltas, 0, where=self._reset)
+            return
+        values = [c - p for c, p in zip(cur, prev)]
+        if values and min(values) < 0:
+            for i in [i for i, value in enumerate(values) if value < 0]:
+                value = values[i] + WRAP_32
+                if self.wide[i] or value > self.limits[i] * elapsed:
+                    value = 0
+                    self.resets += 1
+                values[i] = value
+        deltas[:] = array('Q', values)
+
+    def delta(self, source):
+        """The deltas of one source since the previous sample, as rows of its kept columns."""
+        offset, rows, columns = self.shapes[source]
+        values = self.deltas[offset:offset + rows * columns]
+        if self.use_numpy:
+            return values.reshape(rows, columns)
+        return [values[row * columns:(row + 1) * columns] for row in range(rows)]
+
+
+def cpu_percent(deltas):
+    """Busy percent of each cpu row: time not idle or waiting for I/O over all time."""
+    if numpy is not None and isinstance(deltas, numpy.ndarray):
+        times = deltas.sum(axis=1, dtype=numpy.float64)
+        idle = deltas[:, CPU_IDLE].astype(numpy.float64) + deltas[:, CPU_IOWAIT]
+        return (times - idle) * 100.0 / numpy.maximum(times, 1.0)
+    percents = []
+    for row in deltas:
+        times = sum(row)
+        percents.append((times - row[CPU_IDLE] - row[CPU_IOWAIT]) * 100.0 / max(times, 1))
+    return percents
+
+
+def column_sum(deltas, column, mask):
+    """Sum of one column over the rows whose mask is true."""
+    if numpy is not None and isinstance(deltas, numpy.ndarray):
+        return float(deltas[:, column][mask].sum(dtype=numpy.float64))
+    return float(sum(row[column] for row, keep in zip(deltas, mask) if keep))
+
+
+def column_max(deltas, column, mask):
+    """Largest value of one column over the rows whose mask is true."""
+    if numpy is not None and isinstance(deltas, numpy.ndarray):
+        values = deltas[:, column][mask]
+        return float(values.max()) if len(values) else 0.0
+    return float(max((row[column] for row, keep in zip(deltas, mask) if keep), default=0))
+
+
+class CounterRateCollector:
+    """CPU, disk and network rates of the whole host from CounterRates.
+
+    Every key has to be registered in config.csv, so the keys are host-wide
+    rather than one per core, disk or interface, whose names differ from host
+    to host. The per-row deltas still give the busiest core and the busiest
+    disk, and tell which disks and interfaces count.
+    """
+
+    KEYS = ('CPU_Usage_Percent', 'CPU_Core_Max_Percent', 'Disk_Read_MBps', 'Disk_Write_MBps',
+            'Disk_Busy_Percent', 'Network_RX_MBps', 'Network_TX_MBps')
+
+    def __init__(self, context, interval):
+        self.rates = CounterRates()
+        self.masks = (None, None)
+        self.layouts = None
+        self.rates.sample()
+
+    def _masks(self):
+        """Which disks and interfaces count, worked out again when the rows change."""
+        if self.layouts != self.rates.layouts:
+            disks = [not DISK_EXCLUDE.match(name.encode()) for name in self.rates.names['diskstats']]
+            interfaces = [not INTERFACE_EXCLUDE.match(name.encode()) for name in self.rates.names['net']]
+            if self.rates.use_numpy:
+                disks, interfaces = numpy.array(disks, dtype=bool), numpy.array(interfaces, dtype=bool)
+            self.masks = (disks, interfaces)
+            self.layouts = self.rates.layouts
+        return self.masks
+
+    def __call__(self):
+        rates = self.rates
+        elapsed = rates.sample()
+        if elapsed is None:
+            return {}
+        disks, interfaces = self._masks()
+        data = {}
+        cpu = cpu_percent(rates.delta('stat'))
+        if len(cpu):
+            # The first row is the total over all cores.
+            data["CPU_Usage_Percent"] = float(cpu[0])
+            data["CPU_Core_Max_Percent"] = float(max(cpu[1:])) if len(cpu) > 1 else float(cpu[0])
+        disk = rates.delta('diskstats')
+        if rates.shapes['diskstats'][1]:
+            data["Disk_Read_MBps"] = column_sum(disk, DISK_SECTORS_READ, disks) * SECTOR_BYTES / MB / elapsed
+            data["Disk_Write_MBps"] = column_sum(disk, DISK_SECTORS_WRITTEN, disks) * SECTOR_BYTES / MB / elapsed
+            data["Disk_Busy_Percent"] = min(100.0, column_max(disk, DISK_IO_MS, disks) / 10.0 / elapsed)
+        net = rates.delta('net')
+        if rates.shapes['net'][1]:
+            data["Network_RX_MBps"] = column_sum(net, NET_RX_BYTES, interfaces) / MB / elapsed
+            data["Network_TX_MBps"] = column_sum(net, NET_TX_BYTES, interfaces) / MB / elapsed
+        return data
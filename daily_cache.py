@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Local SQLite cache of the points fetched from /data/daily.
+
+Each (device, key) series keeps the points already retrieved, the earliest
+timestamp it covers and the backend's cursor from the last fetch. A repeat
+query within the covered window only asks for the points stored after that
+cursor (`since`) and merges them in; points are keyed by timestamp, so the
+overlap the backend leaves for in-flight inserts is de-duplicated, and the
+points older than the window are dropped. The cache holds at most
+`max_points` points and evicts whole series, least recently used first.
+"""
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    device TEXT NOT NULL,
+    key TEXT NOT NULL,
+    type TEXT,
+    covered_from TEXT NOT NULL,
+    cursor TEXT NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (device, key)
+);
+CREATE TABLE IF NOT EXISTS points (
+    device TEXT NOT NULL,
+    key TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    value,
+    PRIMARY KEY (device, key, timestamp)
+) WITHOUT ROWID;
+"""
+
+
+def isoformat(epoch_seconds):
+    """Formats a time like the backend's JSON dates, so strings compare in time order."""
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(epoch_seconds)) + f".{int(epoch_seconds * 1000) % 1000:03d}Z"
+
+
+class DailyCache:
+    """Points per (device, key) series, bounded by a total point count."""
+
+    def __init__(self, path, max_points=1000000):
+        self.max_points = max_points
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def cursor_for(self, device, key, window_start):
+        """The `since` cursor to fetch this series with, or None if it needs a full fetch."""
+        row = self.db.execute("SELECT covered_from, cursor FROM series WHERE device = ? AND key = ?",
+                              (device, key)).fetchone()
+        if row is None or row[0] > window_start:
+            return None
+        return row[1]
+
+    def merge(self, device, key, details, window_start, cursor, full):
+        """Stores the points of one series from a /data/daily response."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO points (device, key, timestamp, value) VALUES (?, ?, ?, ?)",
+                ((device, key, entry.get('timestamp'), entry.get('value')) for entry in details.get('values', [])))
+            # Points that slid out of the window are not needed again; the series
+            # now covers the window only.
+            self.db.execute("DELETE FROM points WHERE device = ? AND key = ? AND timestamp < ?",
+                            (device, key, window_start))
+            count = self.db.execute("SELECT COUNT(*) FROM points WHERE device = ? AND key = ?",
+                                    (device, key)).fetchone()[0]
+            covered_from = window_start
+            if not full:
+                covered_from = max(window_start, self.db.execute(
+                    "SELECT covered_from FROM series WHERE device = ? AND key = ?", (device, key)).fetchone()[0])
+            self.db.execute(
+                "INSERT OR REPLACE INTO series (device, key, type, covered_from, cursor, points, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (device, key, details.get('type'), covered_from, cursor, count, time.time()))
+
+    def read(self, device, key, window_start):
+        """The cached series from window_start on, in the /data/daily response format, or None."""
+        row = self.db.execute("SELECT type FROM series WHERE device = ? AND key = ?", (device, key)).fetchone()
+        if row is None:
+            return None
+        values = [{"timestamp": timestamp, "value": value} for timestamp, value in self.db.execute(
+            "SELECT timestamp, value FROM points WHERE device = ? AND key = ? AND timestamp >= ? ORDER BY timestamp",
+            (device, key, window_start))]
+        return {"type": row[0], "values": values}
+
+    def evict(self):
+        """Drops least recently used series until the cache holds at most max_points points."""
+        with self.db:
+            total = self.db.execute("SELECT COALESCE(SUM(points), 0) FROM series").fetchone()[0]
+            for device, key, points in self.db.execute(
+                    "SELECT device, key, points FROM series ORDER BY last_used").fetchall():
+                if total <= self.max_points:
+                    break
+                self.db.execute("DELETE FROM points WHERE device = ? AND key = ?", (device, key))
+                self.db.execute("DELETE FROM series WHERE device = ? AND key = ?", (device, key))
+                total -= points
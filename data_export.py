@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Resumable export of raw data points from /data/export to CSV or Parquet.
+
+Each key of a device goes to its own output: <device>_<key>.csv, or a
+directory <device>_<key>.parquet of part files. Points are written in chunks
+of CHUNK_POINTS as they stream in, so memory does not grow with the size of
+the export. A sidecar <output>.export.json records the export parameters and
+how far the output is known to be complete: the timestamp of the last point
+and, for CSV, the file length, or for Parquet, the number of finished parts.
+An interrupted export run again resumes from there; run later, it appends
+the points that have arrived since.
+
+Parquet needs pyarrow (pip install pyarrow).
+"""
+import csv
+import datetime
+import glob
+import json
+import os
+
+CHUNK_POINTS = 10000
+# Points per Parquet part file. Only finished parts survive an interruption.
+PARQUET_PART_POINTS = 1000000
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class ExportError(Exception):
+    pass
+
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CsvOutput:
+    """timestamp,value rows appended to one file."""
+
+    def __init__(self, path, state):
+        self.path = path
+        if state is not None:
+            # Drop rows written after the last saved chunk
+            self.file = open(path, 'r+', newline='')
+            self.file.truncate(state['offset'])
+            self.file.seek(state['offset'])
+        else:
+            self.file = open(path, 'w', newline='')
+            self.file.write('timestamp,value\n')
+        self.writer = csv.writer(self.file)
+
+    def write(self, rows):
+        """Writes rows; returns the state that makes them part of the output."""
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'after': rows[-1][0], 'offset': self.file.tell()}
+
+    def close(self):
+        self.file.close()
+        return None
+
+    abort = close
+
+
+class ParquetOutput:
+    """Part files of (timestamp, value) in one directory."""
+
+    def __init__(self, path, state, value_type):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow (pip install pyarrow).")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        for leftover in glob.glob(os.path.join(path, '*.tmp')):
+            os.remove(leftover)
+        self.schema = pyarrow.schema([
+            ('timestamp', pyarrow.timestamp('ms', tz='UTC')),
+            ('value', pyarrow.float64() if value_type == 'float' else pyarrow.string()),
+        ])
+        self.parts = state['parts'] if state is not None else 0
+        self.writer = None
+        self.points = 0
+        self.last = None
+
+    def write(self, rows):
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self._part_path() + '.tmp', self.schema)
+        timestamps = [datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00')) for timestamp, _ in rows]
+        self.writer.write_table(self.pa.table([
+            self.pa.array(timestamps, self.schema.field('timestamp').type),
+            self.pa.array([value for _, value in rows], self.schema.field('value').type),
+        ], schema=self.schema))
+        self.points += len(rows)
+        self.last = rows[-1][0]
+        if self.points >= PARQUET_PART_POINTS:
+            return self._finish_part()
+        return None
+
+    def close(self):
+        if self.writer is not None:
+            return self._finish_part()
+        return None
+
+    def abort(self):
+        """Discards the unfinished part."""
+        if self.writer is not None:
+            self.writer.close()
+            os.remove(self._part_path() + '.tmp')
+            self.writer = None
+
+    def _part_path(self):
+        return os.path.join(self.path, f'part-{self.parts:05d}.parquet')
+
+    def _finish_part(self):
+        self.writer.close()
+        os.replace(self._part_path() + '.tmp', self._part_path())
+        self.writer = None
+        self.points = 0
+        self.parts += 1
+        return {'after': self.last, 'parts': self.parts}
+
+
+def export_key(session, base_url, token, device, key, directory, file_format, start=None, end=None):
+    """Exports one key to directory; returns (points written, output path).
+
+    Raises ExportError, or a requests exception, when the export stops early;
+    running it again resumes where it stopped.
+    """
+    extension = 'parquet' if file_format == 'parquet' else 'csv'
+    path = os.path.join(directory, f"{device}_{key}.{extension}")
+    state_path = path + '.export.json'
+    params = {"device": device, "key": key, "from": start, "to": end, "format": extension}
+    state = load_state(state_path)
+    if state is not None and not os.path.exists(path):
+        state = None
+    if state is not None and state['params'] != params:
+        raise ExportError(f"{path} was exported with other parameters; remove it or use another directory.")
+
+    query = {name: params[name] for name in ("device", "key", "from", "to") if params[name] is not None}
+    if state is not None:
+        query["after"] = state['after']
+    with session.get(f"{base_url}/data/export", headers={"Authorization": f"Bearer {token}"},
+                     params=query, stream=True, timeout=(10, 300)) as response:
+        if response.status_code != 200:
+            try:
+                message = response.json().get('message')
+            except ValueError:
+                message = response.text
+            raise ExportError(message)
+
+        lines = response.iter_lines(chunk_size=READ_CHUNK_BYTES)
+        header = json.loads(next(lines))
+        if extension == 'parquet':
+            output = ParquetOutput(path, state, header.get('type'))
+        else:
+            output = CsvOutput(path, state)
+        written = 0
+        complete = False
+        rows = []
+        try:
+            for line in lines:
+                if not line:
+                    continue
+                point = json.loads(line)
+                if 'end' in point:
+                    complete = True
+                    break
+                rows.append((point['timestamp'], point['value']))
+                if len(rows) >= CHUNK_POINTS:
+                    saved = output.write(rows)
+                    written += len(rows)
+                    rows = []
+                    if saved is not None:
+                        save_state(state_path, dict(saved, params=params))
+            if rows:
+                saved = output.write(rows)
+                written += len(rows)
+                if saved is not None:
+                    save_state(state_path, dict(saved, params=params))
+        finally:
+            if complete:
+                saved = output.close()
+                if saved is not None:
+                    save_state(state_path, dict(saved, params=params))
+            else:
+                output.abort()
+
+    if not complete:
+        raise ExportError("the backend stopped before the end of the data; run the export again to resume.")
+    return written, path
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Idempotent import of historical data points through /data/bulk.
+
+Reads a CSV file or an agent spool file (spool.py) in chunks and uploads
+the chunks from a bounded pool of workers, capped at a number of rows per
+second. The backend skips points it already has (same key, machine and
+timestamp), so an import can simply be run again after a failure.
+
+CSV files need `timestamp` and `value` columns; `key` and `machine` (or
+`device`) columns are optional and default to the values given, so the
+files written by data_export.py can be imported as they are.
+"""
+import csv
+import gzip
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+import spool
+
+CHUNK_ROWS = 5000
+RETRIES = 3
+RETRY_BACKOFF = 2.0  # seconds, doubled after each failed attempt
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines
+
+
+class DataImportError(Exception):
+    pass
+
+
+def csv_chunks(path, chunk_rows, machine=None, key=None):
+    """Yields lists of bulk data points read from a CSV file."""
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        columns = set(reader.fieldnames or ())
+        if not {'timestamp', 'value'} <= columns:
+            raise DataImportError(f"{path} needs timestamp and value columns.")
+        machine_column = 'machine' if 'machine' in columns else 'device' if 'device' in columns else None
+        if machine_column is None and not machine:
+            raise DataImportError(f"{path} has no machine column; give the device ID.")
+        if 'key' not in columns and not key:
+            raise DataImportError(f"{path} has no key column; give the key.")
+        chunk = []
+        for row in reader:
+            if row['value'] in (None, ''):
+                continue
+            chunk.append({
+                "key": row.get('key') or key,
+                "machine": (row.get(machine_column) if machine_column else None) or machine,
+                "value": row['value'],
+                "timestamp": row['timestamp']
+            })
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def spool_chunks(path, chunk_rows):
+    """Yields lists of bulk data points from an agent spool file."""
+    with open(path, 'rb') as f:
+        if f.read(len(spool.MAGIC)) != spool.MAGIC:
+            raise DataImportError(f"{path} is not an agent spool file.")
+    source = spool.Spool(path)
+    try:
+        yield from source.batches(chunk_rows)
+    finally:
+        source.close()
+
+
+class Importer:
+    """Uploads chunks of points in parallel and counts what the backend stored."""
+
+    def __init__(self, session, base_url, token, workers=8, max_rows_per_sec=0, chunk_rows=CHUNK_ROWS):
+        self.session = session
+        self.url = f"{base_url}/data/bulk"
+        self.headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json",
+                        "Content-Encoding": "gzip"}
+        self.workers = workers
+        self.limiter = spool.RateLimiter(max_rows_per_sec, chunk_rows) if max_rows_per_sec else None
+        self.rows = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.started = None
+
+    def post(self, chunk):
+        """Uploads one chunk, retrying failures that may pass; returns (inserted, duplicates)."""
+        body = gzip.compress(json.dumps(chunk).encode('utf-8'), 6)
+        backoff = RETRY_BACKOFF
+        for attempt in range(RETRIES + 1):
+            try:
+                response = self.session.post(self.url, headers=self.headers, data=body, timeout=(10, 120))
+                if response.status_code == 201:
+                    result = response.json()
+                    return result.get('count', len(chunk)), result.get('duplicates', 0)
+                message = f"HTTP {response.status_code}: {response.json().get('message')}"
+                if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    raise DataImportError(message)
+            except requests.exceptions.RequestException as e:
+                message = str(e)
+            except ValueError:
+                message = f"HTTP {response.status_code}: {response.text[:200]}"
+            if attempt < RETRIES:
+                time.sleep(backoff)
+                backoff *= 2
+        raise DataImportError(message)
+
+    def throttle(self, rows):
+        if self.limiter is None:
+            return
+        while self.limiter.available() < min(rows, self.limiter.burst):
+            time.sleep(0.05)
+        self.limiter.consume(rows)
+
+    def run(self, chunks):
+        """Uploads every chunk, keeping at most 2 x workers chunks in memory."""
+        self.started = time.monotonic()
+        last_progress = self.started
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+            for chunk in chunks:
+                self.throttle(len(chunk))
+                pending[executor.submit(self.post, chunk)] = len(chunk)
+                while len(pending) >= 2 * self.workers:
+                    self._collect(pending)
+                if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                    print(self.progress())
+                    last_progress = time.monotonic()
+            while pending:
+                self._collect(pending)
+        return self.progress()
+
+    def _collect(self, pending):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            rows = pending.pop(future)
+            self.rows += rows
+            try:
+                inserted, duplicates = future.result()
+                self.inserted += inserted
+                self.duplicates += duplicates
+            except DataImportError as e:
+                self.failed += rows
+                print(f"Failed to import {rows} rows: {e}")
+
+    def progress(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.rows / elapsed if elapsed > 0 else 0.0
+        return (f"{self.rows} rows in {elapsed:.1f} s ({rate:.0f} rows/s): {self.inserted} inserted, "
+                f"{self.duplicates} duplicates skipped, {self.failed} failed")
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""GPU metrics from a single long-lived nvidia-smi child.
+
+Forking nvidia-smi once per tick pays for process start-up and driver
+initialisation every time. GpuSampler instead keeps one looping
+`nvidia-smi --loop-ms` child alive, parses its CSV output as it streams in
+and keeps the newest sample for the upload loop to pick up.
+"""
+import subprocess
+import threading
+import time
+
+# 'index' comes first so samples from multi-GPU hosts can be told apart.
+GPU_QUERY_FIELDS = [
+    'index',
+    'temperature.gpu',
+    'utilization.gpu',
+    'clocks.current.sm',
+    'clocks.current.memory',
+    'clocks.current.video',
+    'clocks.current.graphics',
+    'power.draw',
+    'memory.used',
+]
+
+
+def gpu_query_command(command='nvidia-smi', period_ms=None):
+    """Builds the nvidia-smi command line, looping every period_ms if given."""
+    cmd = [
+        command,
+        f"--query-gpu={','.join(GPU_QUERY_FIELDS)}",
+        '--format=csv,noheader,nounits'
+    ]
+    if period_ms:
+        cmd.append(f"--loop-ms={int(period_ms)}")
+    return cmd
+
+
+def parse_gpu_line(line):
+    """Parses one CSV line of the GPU query into (gpu_index, metrics)."""
+    fields = [field.strip() for field in line.split(',')]
+    if len(fields) < len(GPU_QUERY_FIELDS):
+        raise ValueError(f"Unexpected GPU metrics format: {line.strip()!r}")
+    gpu_index = int(fields[0])
+    (gpu_temperature, gpu_utilization, sm_clock, memory_clock,
+     video_clock, graphics_clock, power_draw, memory_used) = [float(x) for x in fields[1:9]]
+
+    return gpu_index, {
+        "GPU_Temperature": gpu_temperature,
+        "GPU_Utilization": gpu_utilization,
+        "SM_Clock": sm_clock,
+        "Memory_Clock": memory_clock,
+        "MAX_Video_Graphic_Clock": max(video_clock, graphics_clock),
+        "Power_Draw": power_draw,
+        "GPU_Memory_Usage": memory_used
+    }
+
+
+def query_gpu_once(command='nvidia-smi', gpu_index=0):
+    """Runs nvidia-smi once and returns the metrics of one GPU (the old per-tick path)."""
+    try:
+        result = subprocess.run(gpu_query_command(command), stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True, check=True)
+        for line in result.stdout.splitlines():
+            if not line.strip():
+                continue
+            index, metrics = parse_gpu_line(line)
+            if index == gpu_index:
+                return metrics
+        print("Unexpected GPU metrics format.")
+        return None
+    except subprocess.CalledProcessError as e:
+        print(f"Error fetching GPU metrics: {e.stderr}")
+        return None
+    except Exception as e:
+        print(f"Unexpected error fetching GPU metrics: {e}")
+        return None
+
+
+class GpuSampler:
+    """Keeps one looping nvidia-smi child running and holds its latest sample.
+
+    A reader thread parses lines as they arrive; latest() only takes a lock
+    and copies a dict, so the upload loop never waits on the child. When the
+    child exits it is restarted with exponential backoff, and a child that
+    stops producing output is killed so that the same restart path applies.
+    """
+
+    def __init__(self, period_ms=1000, command='nvidia-smi', gpu_index=0,
+                 max_restart_delay=60.0, hang_timeout=None):
+        self.period_ms = period_ms
+        self.command = command
+        self.gpu_index = gpu_index
+        self.max_restart_delay = max_restart_delay
+        # A child that has been silent for this long is considered hung.
+        self.hang_timeout = hang_timeout or max(10.0, 5 * period_ms / 1000.0)
+        self.restarts = 0
+        self.parse_errors = 0
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._sample = None
+        self._sample_time = None
+        self._child_started = None
+        self._first_sample = threading.Event()
+        self._stopping = threading.Event()
+        self._proc = None
+        self._thread = None
+
+    def start(self):
+        """Starts the reader thread (and with it the nvidia-smi child)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='gpu-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def wait_for_sample(self, timeout):
+        """Blocks until the first sample has arrived or timeout seconds passed."""
+        return self._first_sample.wait(timeout)
+
+    def latest(self, max_age=None):
+        """Returns a copy of the newest sample, or None if there is none fresh enough."""
+        with self._lock:
+            sample, sample_time = self._sample, self._sample_time
+            last_activity = max(sample_time or 0.0, self._child_started or 0.0)
+        now = time.monotonic()
+        if self._child_started is not None and now - last_activity > self.hang_timeout:
+            self._kill_child()
+        if sample is None or (max_age is not None and now - sample_time > max_age):
+            return None
+        return dict(sample)
+
+    def stop(self):
+        """Stops the child and the reader thread."""
+        self._stopping.set()
+        self._kill_child()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _kill_child(self):
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def _handle_line(self, line):
+        if not line.strip():
+            return
+        try:
+            gpu_index, metrics = parse_gpu_line(line)
+        except ValueError:
+            self.parse_errors += 1
+            return
+        if gpu_index != self.gpu_index:
+            return
+        with self._lock:
+            self._sample = metrics
+            self._sample_time = time.monotonic()
+        self.samples += 1
+        self._first_sample.set()
+
+    def _run(self):
+        delay = 1.0
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                self._proc = subprocess.Popen(gpu_query_command(self.command, self.period_ms),
+                                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                              text=True, bufsize=1)
+            except OSError as e:
+                print(f"Error starting nvidia-smi: {e}")
+            else:
+                # Counts as activity, so a child that never prints is also caught as hung.
+                with self._lock:
+                    self._child_started = started
+                for line in self._proc.stdout:
+                    self._handle_line(line)
+                self._proc.stdout.close()
+                returncode = self._proc.wait()
+                if self._stopping.is_set():
+                    break
+                print(f"nvidia-smi exited with code {returncode}, restarting.")
+
+            # A child that ran for a good while earns a fresh backoff.
+            if time.monotonic() - started > self.max_restart_delay:
+                delay = 1.0
+            if self._stopping.wait(delay):
+                break
+            delay = min(delay * 2, self.max_restart_delay)
+            self.restarts += 1
+
+
+class GpuCollector:
+    """Collector (see collectors.REGISTRY): the sampler's newest GPU sample."""
+
+    def __init__(self, context, interval):
+        period_ms = max(100, int(interval * 1000))
+        self.sampler = GpuSampler(period_ms=period_ms, command=context.get('gpu_command', 'nvidia-smi')).start()
+        self.sampler.wait_for_sample(timeout=5)
+        # A stale sample is left out rather than waited for
+        self.max_age = 3 * period_ms / 1000.0
+
+    def __call__(self):
+        return self.sampler.latest(max_age=self.max_age)
+
+    def close(self):
+        self.sampler.stop()
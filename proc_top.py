@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Top CPU and memory consumers from incrementally re-read /proc/[pid]/stat files.
+
+Listing /proc and opening every /proc/[pid]/stat on each tick costs a
+directory walk plus an open, read and close per process, which adds up on
+hosts with thousands of processes. ProcessTop instead keeps one slot per
+process in flat arrays (pid, start time, CPU ticks, RSS, last read time).
+The stat files of up to MAX_OPEN_FILES processes stay open and are re-read in
+place with pread(); when that many are open, the one whose process was busy
+least recently is closed to make room for a busy one, and idle processes
+beyond the limit are opened and closed on every read. /proc only has to be
+listed again when the number of processes changes: the link count of /proc
+is a constant plus the number of processes, and a process that exited shows
+up as a failed read. Each tick stops reading once its time budget is spent
+and carries on with the remaining processes on the next one, so the
+collector's cost stays bounded however many processes there are.
+
+CPU and RSS both come from stat (utime, stime and rss, which is the resident
+size statm reports), so one read per process per tick is enough.
+"""
+import errno
+import heapq
+import os
+import time
+from array import array
+from collections import OrderedDict
+
+import procfs_reader
+
+# Processes listed in the Top_Processes message (which may hold 200 characters)
+TOP_N = 3
+# Milliseconds of reading per tick; processes not reached are read next tick
+BUDGET_MS = 10.0
+# /proc is listed at least this often, even if the process count looks unchanged
+RESCAN_SECONDS = 60.0
+# Stat files kept open between ticks, for the processes busy most recently
+MAX_OPEN_FILES = 256
+
+# Field positions after the ")" that ends the command name in /proc/[pid]/stat
+_UTIME, _STIME, _STARTTIME, _RSS = 11, 12, 19, 21
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+class ProcessTop:
+    """Per-process CPU percent and RSS, refreshed within a time budget per call."""
+
+    def __init__(self, proc_root=None, budget_ms=BUDGET_MS, rescan_seconds=RESCAN_SECONDS,
+                 max_open=MAX_OPEN_FILES, clock=time.monotonic):
+        self.proc_root = proc_root or procfs_reader.PROC_ROOT
+        self.budget = budget_ms / 1000.0
+        self.rescan_seconds = rescan_seconds
+        self.max_open = max_open
+        self.clock = clock
+        # One slot per process; removing a process moves the last slot into its place.
+        self.pids = array('l')
+        self.starts = array('Q')      # start time in clock ticks, tells a reused pid apart
+        self.ticks = array('Q')       # utime + stime at the last read
+        self.rss = array('Q')         # resident pages at the last read
+        self.read_at = array('d')     # monotonic time of the last read, 0 before the first
+        self.cpu = array('d')         # CPU percent between the last two reads
+        self.fds = array('l')         # open stat descriptor, or -1
+        self.names = []
+        self.slots = {}               # pid -> slot
+        # pids whose stat file is open, least recently busy first
+        self.held = OrderedDict()
+        self.cursor = 0
+        self.base_links = None
+        self.next_rescan = 0.0
+        self.buf = bytearray(1024)
+        self.walks = 0
+        self.reads = 0
+
+    def __len__(self):
+        return len(self.pids)
+
+    def _stat_path(self, pid):
+        return os.path.join(self.proc_root, str(pid), 'stat')
+
+    def _links(self):
+        return os.stat(self.proc_root).st_nlink
+
+    def _pid_set_changed(self, now):
+        if self.base_links is None or now >= self.next_rescan:
+            return True
+        try:
+            return self._links() - self.base_links != len(self.pids)
+        except OSError:
+            return True
+
+    def _walk(self, now):
+        """Lists /proc, dropping the processes that are gone and adding the new ones."""
+        links = self._links()
+        current = {int(name) for name in os.listdir(self.proc_root) if name.isdigit()}
+        for pid in [pid for pid in self.slots if pid not in current]:
+            self._remove(self.slots[pid])
+        for pid in current:
+            if pid not in self.slots:
+                self.slots[pid] = len(self.pids)
+                self.pids.append(pid)
+                self.starts.append(0)
+                self.ticks.append(0)
+                self.rss.append(0)
+                self.read_at.append(0.0)
+                self.cpu.append(0.0)
+                self.fds.append(-1)
+                self.names.append('')
+        self.base_links = links - len(current)
+        self.next_rescan = now + self.rescan_seconds
+        self.walks += 1
+
+    def _remove(self, slot):
+        fd = self.fds[slot]
+        if fd >= 0:
+            os.close(fd)
+            del self.held[self.pids[slot]]
+        del self.slots[self.pids[slot]]
+        last = len(self.pids) - 1
+        if slot != last:
+            for column in (self.pids, self.starts, self.ticks, self.rss, self.read_at, self.cpu, self.fds):
+                column[slot] = column[last]
+            self.names[slot] = self.names[last]
+            self.slots[self.pids[slot]] = slot
+        for column in (self.pids, self.starts, self.ticks, self.rss, self.read_at, self.cpu, self.fds):
+            del column[last]
+        del self.names[last]
+
+    def _read(self, slot):
+        """Reads the slot's stat file into self.buf; returns the length, or 0 if the process is gone."""
+        fd = self.fds[slot]
+        try:
+            if fd >= 0:
+                return os.preadv(fd, [self.buf], 0)
+            pid = self.pids[slot]
+            fd = os.open(self._stat_path(pid), os.O_RDONLY | os.O_CLOEXEC)
+            if self.max_open and len(self.held) >= self.max_open and self.cpu[slot] > 0:
+                # Busy at its last read: takes the place of the least recently busy
+                victim = self.slots[next(iter(self.held))]
+                os.close(self.fds[victim])
+                self.fds[victim] = -1
+                self.held.popitem(last=False)
+            if len(self.held) < self.max_open:
+                self.fds[slot] = fd
+                self.held[pid] = None
+                return os.preadv(fd, [self.buf], 0)
+            try:
+                return os.preadv(fd, [self.buf], 0)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ESRCH):
+                return 0
+            raise
+
+    def _update(self, slot, n, now):
+        buf = self.buf
+        close = buf.rfind(b')', 0, n)
+        fields = bytes(buf[close + 2:n]).split(None, _RSS + 1)
+        ticks = int(fields[_UTIME]) + int(fields[_STIME])
+        start = int(fields[_STARTTIME])
+        last = self.read_at[slot]
+        if last and start == self.starts[slot] and now > last:
+            self.cpu[slot] = cpu = (ticks - self.ticks[slot]) * 100.0 / CLOCK_TICKS / (now - last)
+            if cpu > 0 and self.fds[slot] >= 0:
+                self.held.move_to_end(self.pids[slot])
+        else:
+            # First read, or the pid now belongs to another process
+            self.cpu[slot] = 0.0
+            self.names[slot] = buf[buf.find(b'(', 0, n) + 1:close].decode('utf-8', 'replace')
+        self.starts[slot] = start
+        self.ticks[slot] = ticks
+        self.rss[slot] = int(fields[_RSS])
+        self.read_at[slot] = now
+
+    def refresh(self):
+        """Re-reads as many processes as the budget allows, starting where the last call stopped."""
+        started = time.perf_counter()
+        now = self.clock()
+        if self._pid_set_changed(now):
+            self._walk(now)
+        count = len(self.pids)
+        gone = []
+        read = 0
+        slot = self.cursor if self.cursor < count else 0
+        while read < count:
+            n = self._read(slot)
+            if n:
+                self._update(slot, n, now)
+            else:
+                gone.append(slot)
+            read += 1
+            slot = slot + 1 if slot + 1 < count else 0
+            if time.perf_counter() - started > self.budget:
+                break
+        self.cursor = slot
+        self.reads += read
+        for slot in sorted(gone, reverse=True):
+            self._remove(slot)
+        if self.cursor >= len(self.pids):
+            self.cursor = 0
+
+    def top(self, n=TOP_N, by='cpu'):
+        """Returns the n slots with the highest CPU percent (by='cpu') or RSS (by='rss')."""
+        column = self.cpu if by == 'cpu' else self.rss
+        return heapq.nlargest(n, range(len(self.pids)), key=column.__getitem__)
+
+    def rss_mb(self, slot):
+        return self.rss[slot] * PAGE_SIZE / (1024.0 * 1024.0)
+
+    def summary(self, n=TOP_N):
+        """The top-n processes by CPU and by RSS, as one line of at most 200 characters."""
+        cpu = ', '.join(f"{self.names[s]}({self.pids[s]}) {self.cpu[s]:.0f}%" for s in self.top(n, 'cpu'))
+        rss = ', '.join(f"{self.names[s]}({self.pids[s]}) {self.rss_mb(s):.0f}MB" for s in self.top(n, 'rss'))
+        return f"cpu: {cpu}; rss: {rss}"[:200]
+
+    def close(self):
+        for slot, fd in enumerate(self.fds):
+            if fd >= 0:
+                os.close(fd)
+                self.fds[slot] = -1
+        self.held.clear()
+
+
+class ProcessTopCollector:
+    """Process_Count, the CPU percent and RSS of the top process and a Top_Processes message."""
+
+    def __init__(self, context, interval):
+        self.top = ProcessTop(budget_ms=context.get('process_budget_ms', BUDGET_MS))
+        self.top_n = context.get('top_processes', TOP_N)
+        self.top.refresh()
+
+    def __call__(self):
+        top = self.top
+        top.refresh()
+        if not len(top):
+            return {}
+        cpu = top.top(1, 'cpu')[0]
+        rss = top.top(1, 'rss')[0]
+        return {
+            "Process_Count": float(len(top)),
+            "Top_Process_CPU_Percent": top.cpu[cpu],
+            "Top_Process_RSS_MB": top.rss_mb(rss),
+            "Top_Processes": top.summary(self.top_n)
+        }
+
+    def close(self):
+        self.top.close()
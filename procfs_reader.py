@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Subprocess-free readers for the procfs/sysfs files the agent samples.
+
+Each file is opened once and re-read with pread() at offset 0 into a
+buffer that is reused across ticks, so a sample costs one syscall and no
+fork, no file open and no per-line string allocation.
+"""
+import os
+import time
+
+PROC_ROOT = '/proc'
+
+
+class ProcFile:
+    """An open procfs/sysfs file that is re-read in place on every call."""
+
+    def __init__(self, path, bufsize=4096):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        self.buf = bytearray(bufsize)
+
+    def read(self):
+        """Returns the current file contents as bytes."""
+        # procfs files generated with seq_file return about a page per read
+        # however large the buffer, so a short read is not the end of the file;
+        # only a read of 0 bytes is.
+        size = 0
+        while True:
+            if size == len(self.buf):
+                # The file outgrew the buffer (e.g. new interfaces); grow it.
+                self.buf.extend(bytes(len(self.buf)))
+            n = os.preadv(self.fd, [memoryview(self.buf)[size:]], size)
+            if n == 0:
+                return bytes(memoryview(self.buf)[:size])
+            size += n
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+_open_files = {}
+
+
+def open_file(path):
+    """Returns the shared ProcFile for path, opening it on first use."""
+    proc_file = _open_files.get(path)
+    if proc_file is None:
+        proc_file = _open_files[path] = ProcFile(path)
+    return proc_file
+
+
+def close_all():
+    """Closes every file opened through open_file()."""
+    for proc_file in _open_files.values():
+        proc_file.close()
+    _open_files.clear()
+
+
+def parse_meminfo(data, fields=(b'MemTotal', b'MemFree', b'MemAvailable', b'Buffers', b'Cached', b'SReclaimable')):
+    """Parses /proc/meminfo contents into {field: kB} for the requested fields."""
+    wanted = set(fields)
+    values = {}
+    for line in data.split(b'\n'):
+        name, sep, rest = line.partition(b':')
+        if sep and name in wanted:
+            values[name.decode()] = int(rest.split()[0])
+            if len(values) == len(wanted):
+                break
+    return values
+
+
+def parse_net_dev(data, interface):
+    """Returns (rx_bytes, tx_bytes) for exactly `interface` from /proc/net/dev, or None."""
+    target = interface.encode()
+    # The first two lines are column headers.
+    for line in data.split(b'\n')[2:]:
+        name, sep, counters = line.partition(b':')
+        if sep and name.strip() == target:
+            fields = counters.split()
+            return int(fields[0]), int(fields[8])
+    return None
+
+
+def read_meminfo():
+    """Reads /proc/meminfo into {field: kB}."""
+    return parse_meminfo(open_file(os.path.join(PROC_ROOT, 'meminfo')).read())
+
+
+def read_used_memory_gb():
+    """Used system memory in GB, excluding cache, as reported by `free`."""
+    info = read_meminfo()
+    if 'MemAvailable' in info:
+        used_kb = info['MemTotal'] - info['MemAvailable']
+    else:
+        # Kernels before 3.14 have no MemAvailable; use free's classic formula.
+        used_kb = (info['MemTotal'] - info['MemFree'] - info['Buffers']
+                   - info['Cached'] - info.get('SReclaimable', 0))
+    return used_kb / 1024.0 / 1024.0
+
+
+def read_net_dev(interface):
+    """Reads (rx_bytes, tx_bytes) of one interface from /proc/net/dev."""
+    return parse_net_dev(open_file(os.path.join(PROC_ROOT, 'net', 'dev')).read(), interface)
+
+
+def read_rss_bytes():
+    """Resident set size of this process from /proc/self/statm."""
+    return int(open_file(os.path.join(PROC_ROOT, 'self', 'statm')).read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def read_hwmon_temperature(path):
+    """Reads a hwmon temp*_input file and converts millidegrees to Celsius."""
+    return int(open_file(path).read()) / 1000.0
+
+
+# Collector factories (see collectors.REGISTRY). Read errors are left to the
+# collector runner, which records a gap and reports it once.
+
+def cpu_temperature_collector(context, interval):
+    path = context['cpu_temp_path']
+    return lambda: {"CPU_Temperature": read_hwmon_temperature(path)}
+
+
+def memory_collector(context, interval):
+    return lambda: {"SYS_Memory_Usage": read_used_memory_gb()}
+
+
+class NetworkSpeedCollector:
+    """Network_Transmit_Speed_MBps (received plus transmitted) from successive counter readings."""
+
+    def __init__(self, context, interval):
+        self.interface = context['network_interface']
+        self.prev_bytes = self._read_bytes()
+        self.prev_time = time.monotonic()
+
+    def _read_bytes(self):
+        counters = read_net_dev(self.interface)
+        return None if counters is None else counters[0] + counters[1]
+
+    def __call__(self):
+        current_bytes = self._read_bytes()
+        now = time.monotonic()
+        speed = None
+        if current_bytes is not None and self.prev_bytes is not None and now > self.prev_time:
+            speed = (current_bytes - self.prev_bytes) / ((now - self.prev_time) * 1024 * 1024)
+        self.prev_bytes = current_bytes
+        self.prev_time = now
+        return {"Network_Transmit_Speed_MBps": speed}
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Sampling schedule, per-window reduction and deadband filtering for the upload agent."""
+import csv
+import time
+
+
+class DeadlineScheduler:
+    """Fires at start + k * interval on the monotonic clock.
+
+    Sleeping until an absolute deadline instead of sleeping for the full
+    interval after the work is done keeps the period from drifting by the
+    time the work took. Deadlines that have already passed are skipped
+    rather than fired back to back.
+    """
+
+    def __init__(self, interval, clock=time.monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.next_deadline = clock()
+        self.missed = 0
+
+    def wait(self):
+        """Sleeps until the next deadline; returns how many deadlines were skipped."""
+        self.next_deadline += self.interval
+        now = self.clock()
+        missed = 0
+        if now > self.next_deadline:
+            missed = int((now - self.next_deadline) // self.interval) + 1
+            self.next_deadline += missed * self.interval
+            self.missed += missed
+        self.sleep(self.next_deadline - now)
+        return missed
+
+
+class WindowAggregator:
+    """Reduces the samples of one upload window to min/max/mean/last/count per key."""
+
+    def __init__(self):
+        self._windows = {}
+
+    def add(self, data):
+        """Adds one sample ({key: value}) to the current window."""
+        for key, value in data.items():
+            window = self._windows.get(key)
+            numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if window is None:
+                # min, max, sum, last, count, numeric
+                self._windows[key] = [value, value, value if numeric else 0.0, value, 1, numeric]
+                continue
+            window[3] = value
+            window[4] += 1
+            if numeric and window[5]:
+                if value < window[0]:
+                    window[0] = value
+                if value > window[1]:
+                    window[1] = value
+                window[2] += value
+            else:
+                window[5] = False
+
+    def flush(self):
+        """Returns {key: (last, aggregate)} and starts a new window.
+
+        aggregate is None for keys sampled once (or holding non-numeric
+        values), so a window of one sample reduces to exactly that sample.
+        """
+        result = {}
+        for key, (low, high, total, last, count, numeric) in self._windows.items():
+            if count > 1 and numeric:
+                result[key] = (last, {"min": low, "max": high, "mean": total / count, "count": count})
+            else:
+                result[key] = (last, None)
+        self._windows = {}
+        return result
+
+
+def read_deadbands(config_path, heartbeat_fraction=0.5):
+    """Reads the deadband and missingDataAllowance columns of config.csv.
+
+    Returns ({key: deadband}, {key: heartbeat seconds}) for the keys that
+    have a deadband; the heartbeat is heartbeat_fraction of the allowance.
+    """
+    deadbands = {}
+    heartbeats = {}
+    with open(config_path, newline='') as f:
+        for row in csv.DictReader(f):
+            if not row.get('deadband'):
+                continue
+            key = row['keyName']
+            deadbands[key] = float(row['deadband'])
+            if row.get('missingDataAllowance'):
+                heartbeats[key] = float(row['missingDataAllowance']) * heartbeat_fraction
+    return deadbands, heartbeats
+
+
+class DeadbandFilter:
+    """Leaves out keys whose window stayed within their deadband of the last value sent.
+
+    A key is sent when its last value, or the min/max of its window, moved
+    more than the deadband away from the value last sent, and at least every
+    heartbeat seconds so the backend's missing-data detection keeps seeing
+    it. Keys without a deadband, and non-numeric values, are always sent.
+    """
+
+    def __init__(self, deadbands, heartbeats=None, clock=time.monotonic):
+        self.deadbands = deadbands
+        self.heartbeats = heartbeats or {}
+        self.clock = clock
+        self._sent = {}  # key -> (value, time sent)
+        self.passed = 0
+        self.suppressed = 0
+
+    def filter(self, window, now=None):
+        """Returns the part of a reduced window ({key: (last, aggregate)}) worth sending."""
+        now = self.clock() if now is None else now
+        result = {}
+        for key, (last, aggregate) in window.items():
+            deadband = self.deadbands.get(key)
+            sent = self._sent.get(key)
+            if deadband is not None and sent is not None and self._within(last, aggregate, sent[0], deadband):
+                heartbeat = self.heartbeats.get(key)
+                if heartbeat is None or now - sent[1] < heartbeat:
+                    self.suppressed += 1
+                    continue
+            if deadband is not None:
+                self._sent[key] = (last, now)
+            result[key] = (last, aggregate)
+            self.passed += 1
+        return result
+
+    @staticmethod
+    def _within(last, aggregate, sent, deadband):
+        if not isinstance(last, (int, float)) or not isinstance(sent, (int, float)):
+            return False
+        if aggregate:
+            return aggregate["max"] - sent <= deadband and sent - aggregate["min"] <= deadband
+        return abs(last - sent) <= deadband
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""Crash-safe, size-bounded on-disk spool for batches that failed to upload.
+
+The spool is a fixed-size file mapped into memory and used as a ring of
+records. Each record holds one zlib-compressed JSON list of data points:
+
+    header  | magic, head, tail, records, points, used, first_seq, dropped, crc
+    records | length, points, crc32, body ... [wrap marker] ...
+
+A record is written completely before the header is updated to include
+it, and the header carries its own checksum, so a crash at any point
+leaves either the old or the new state. When the file is full the oldest
+records are dropped to make room.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b'SMSPOOL1'
+HEADER = struct.Struct('<8s7Q')
+HEADER_CRC = struct.Struct('<I')
+DATA_START = 128
+RECORD = struct.Struct('<III')  # body length, point count, crc32 of body
+WRAP = 0xFFFFFFFF
+
+
+class Spool:
+    """Append-only ring of point batches in a memory-mapped file."""
+
+    def __init__(self, path, capacity=64 * 1024 * 1024):
+        self.path = path
+        self._lock = threading.Lock()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            size = os.fstat(fd).st_size
+            if size < DATA_START + RECORD.size:
+                os.ftruncate(fd, capacity)
+                size = capacity
+            self.capacity = size
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if not self._load_header():
+            self._reset()
+
+    # Header handling
+
+    def _load_header(self):
+        fields = HEADER.unpack_from(self._map, 0)
+        (crc,) = HEADER_CRC.unpack_from(self._map, HEADER.size)
+        if fields[0] != MAGIC:
+            return False
+        if crc != zlib.crc32(self._map[:HEADER.size]):
+            print(f"Spool header in {self.path} is corrupt; starting empty.")
+            return False
+        (_, self.head, self.tail, self.records, self.points,
+         self.used, self.first_seq, self.dropped) = fields
+        return True
+
+    def _store_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, self.head, self.tail, self.records,
+                         self.points, self.used, self.first_seq, self.dropped)
+        HEADER_CRC.pack_into(self._map, HEADER.size, zlib.crc32(self._map[:HEADER.size]))
+        self._map.flush()
+
+    def _reset(self):
+        self.head = self.tail = DATA_START
+        self.records = self.points = self.used = self.first_seq = self.dropped = 0
+        self._store_header()
+
+    # Record layout
+
+    def _record_at(self, offset):
+        """Returns (offset, length, points, crc) of the record at or wrapped from offset."""
+        if self.capacity - offset < RECORD.size:
+            offset = DATA_START
+        length, points, crc = RECORD.unpack_from(self._map, offset)
+        if length == WRAP:
+            offset = DATA_START
+            length, points, crc = RECORD.unpack_from(self._map, offset)
+        return offset, length, points, crc
+
+    def _drop_oldest(self):
+        offset, length, points, _ = self._record_at(self.head)
+        self.head = offset + RECORD.size + length
+        self.records -= 1
+        self.points -= points
+        self.used -= RECORD.size + length
+        self.first_seq += 1
+        if self.records == 0:
+            self.head = self.tail = DATA_START
+            self.used = self.points = 0
+
+    def _make_room(self, size):
+        """Moves tail to a spot with size contiguous free bytes, dropping old records if needed."""
+        while True:
+            if self.records == 0:
+                self.head = self.tail = DATA_START
+            if self.records == 0 or self.tail > self.head:
+                # Live data is [head, tail); free space is after tail and before head.
+                if self.capacity - self.tail >= size:
+                    return
+                if self.head - DATA_START >= size:
+                    if self.capacity - self.tail >= RECORD.size:
+                        RECORD.pack_into(self._map, self.tail, WRAP, 0, 0)
+                    self.tail = DATA_START
+                    continue
+            elif self.head - self.tail >= size:
+                # Wrapped: live data is [head, end) + [DATA_START, tail).
+                return
+            self._drop_oldest()
+            self.dropped += 1
+
+    # Public API
+
+    def append(self, points):
+        """Adds a batch of data points; returns False if it can never fit."""
+        body = zlib.compress(json.dumps(points, allow_nan=False).encode('utf-8'), 6)
+        size = RECORD.size + len(body)
+        with self._lock:
+            if size > (self.capacity - DATA_START) // 2:
+                print(f"Batch of {len(points)} points is too large for the spool; dropped.")
+                return False
+            self._make_room(size)
+            RECORD.pack_into(self._map, self.tail, len(body), len(points), zlib.crc32(body))
+            self._map[self.tail + RECORD.size:self.tail + size] = body
+            self.tail += size
+            self.records += 1
+            self.points += len(points)
+            self.used += size
+            self._store_header()
+        return True
+
+    def read_batch(self, max_points):
+        """Returns (points, end_seq) for the oldest records holding up to max_points points.
+
+        At least one record is returned when the spool is not empty. Pass
+        end_seq to commit() once the points have been delivered.
+        """
+        with self._lock:
+            batch = []
+            seq = self.first_seq
+            offset = self.head
+            for _ in range(self.records):
+                offset, length, points, crc = self._record_at(offset)
+                if batch and len(batch) + points > max_points:
+                    break
+                body = self._map[offset + RECORD.size:offset + RECORD.size + length]
+                offset += RECORD.size + length
+                seq += 1
+                if zlib.crc32(body) != crc:
+                    print("Skipping corrupt spool record.")
+                    continue
+                batch.extend(json.loads(zlib.decompress(body)))
+            return batch, seq
+
+    def batches(self, max_points):
+        """Yields every spooled point, oldest first, in lists of up to max_points.
+
+        Nothing is committed, so this is for reading a spool that no agent
+        is using, e.g. one copied from another host.
+        """
+        with self._lock:
+            offset, records = self.head, self.records
+        batch = []
+        for _ in range(records):
+            with self._lock:
+                offset, length, points, crc = self._record_at(offset)
+                body = self._map[offset + RECORD.size:offset + RECORD.size + length]
+            offset += RECORD.size + length
+            if zlib.crc32(body) != crc:
+                print("Skipping corrupt spool record.")
+                continue
+            batch.extend(json.loads(zlib.decompress(body)))
+            while len(batch) >= max_points:
+                yield batch[:max_points]
+                batch = batch[max_points:]
+        if batch:
+            yield batch
+
+    def commit(self, end_seq):
+        """Drops every record before end_seq (records already dropped are skipped)."""
+        with self._lock:
+            while self.records and self.first_seq < end_seq:
+                self._drop_oldest()
+            self._store_header()
+
+    def close(self):
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+
+
+class RateLimiter:
+    """Token bucket: `rate` units per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def available(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return int(self.tokens)
+
+    def consume(self, amount):
+        self.tokens -= amount
+
+
+class Replayer:
+    """Drains a Spool through `post` in large chunks with backoff and a rate cap.
+
+    `post(points)` returns the HTTP status code, or None when the backend
+    could not be reached. 201 commits the chunk; other 4xx answers (except
+    auth, timeout and throttling) mean the chunk can never be accepted, so it
+    is dropped instead of blocking the spool forever.
+    """
+
+    RETRYABLE = (401, 403, 408, 429)
+
+    def __init__(self, spool, post, chunk_points=5000, max_points_per_sec=2000,
+                 max_chunks_per_step=4, initial_backoff=5.0, max_backoff=300.0):
+        self.spool = spool
+        self.post = post
+        self.chunk_points = chunk_points
+        self.max_chunks_per_step = max_chunks_per_step
+        self.limiter = RateLimiter(max_points_per_sec, chunk_points)
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+        self.replayed = 0
+        self.rejected = 0
+        self._rate_points = 0
+        self._rate_since = time.monotonic()
+
+    def step(self):
+        """Replays as much as the rate cap allows; returns the number of points delivered."""
+        delivered = 0
+        for _ in range(self.max_chunks_per_step):
+            if self.spool.records == 0 or time.monotonic() < self.next_attempt:
+                break
+            allowed = self.limiter.available()
+            if allowed <= 0:
+                break
+            points, end_seq = self.spool.read_batch(min(self.chunk_points, allowed))
+            if not points:
+                self.spool.commit(end_seq)
+                continue
+            status = self.post(points)
+            if status == 201:
+                self.spool.commit(end_seq)
+                self.limiter.consume(len(points))
+                delivered += len(points)
+                self.backoff = 0.0
+            elif status is not None and 400 <= status < 500 and status not in self.RETRYABLE:
+                print(f"Backend rejected {len(points)} spooled points (HTTP {status}); dropping them.")
+                self.spool.commit(end_seq)
+                self.rejected += len(points)
+            else:
+                self.backoff = min(self.max_backoff, self.backoff * 2 or self.initial_backoff)
+                self.next_attempt = time.monotonic() + self.backoff
+                break
+        self.replayed += delivered
+        self._rate_points += delivered
+        return delivered
+
+    def resume(self):
+        """Clears the backoff, e.g. once live uploads succeed again."""
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+
+    def metrics(self):
+        """Spool depth and replay throughput since the previous call, as agent keys."""
+        now = time.monotonic()
+        elapsed = now - self._rate_since
+        rate = self._rate_points / elapsed if elapsed > 0 else 0.0
+        self._rate_points = 0
+        self._rate_since = now
+        return {
+            "Agent_Spool_Depth": float(self.spool.points),
+            "Agent_Replay_Points_per_s": rate
+        }
+
+
+def spool_collector(context, interval):
+    """Collector factory (see collectors.REGISTRY): the replayer's agent keys."""
+    return context['replayer'].metrics
@@ -1,9 +1,33 @@
 // pages/daily-monitor.js
 import { useState, useEffect } from 'react';
 import api from '../services/api';
+import { openLiveStream } from '../services/liveStream';
 import GraphComponent from '../components/GraphComponent';
 import LogComponent from '../components/LogComponent';
 
+// Most points per graph; the backend downsamples longer ranges to this
+const GRAPH_POINTS = 1000;
+
+const RANGE_UNITS = { s: 1000, m: 60 * 1000, h: 60 * 60 * 1000 };
+const rangeToMs = (range) => parseInt(range, 10) * RANGE_UNITS[range.slice(-1)];
+
+// Appends the points of `extra` ({ key: [points] }) newer than the last point
+// of each key in `data` (the /data/daily response format) and drops points
+// older than `since`
+const appendNewer = (data, extra, since) => {
+  const merged = {};
+  Object.entries(data).forEach(([key, series]) => {
+    const values = series.values;
+    const last = values.length > 0 ? Date.parse(values[values.length - 1].timestamp) : -Infinity;
+    const newer = (extra[key] || []).filter((point) => Date.parse(point.timestamp) > last);
+    merged[key] = {
+      ...series,
+      values: values.concat(newer).filter((point) => Date.parse(point.timestamp) >= since),
+    };
+  });
+  return merged;
+};
+
 export default function DailyMonitor() {
   const [devices, setDevices] = useState([]);
   const [keys, setKeys] = useState([]);
@@ -58,29 +82,62 @@ export default function DailyMonitor() {
     fetchDevicesAndKeys();
   }, []);
 
-  // Fetch data when selections change
+  // Load the range once, then append the points the backend pushes
+  // (services/liveStream.js) instead of reloading the range every few seconds
   useEffect(() => {
     if (!selectedDevice || selectedKeys.length === 0) return;
+    const rangeMs = rangeToMs(timeRange);
+    let livePoints = 0;
+    // Live points received while the range is loading, by key
+    let pending = null;
+    let closed = false;
 
     const fetchData = async () => {
+      livePoints = 0;
+      pending = {};
       try {
         const res = await api.get('/data/daily', {
           params: {
             device: selectedDevice,
             keys: selectedKeys,
             range: timeRange,
+            points: GRAPH_POINTS,
           },
         });
-        setData(res.data.data);
+        if (closed) return;
+        setData(appendNewer(res.data.data, pending, Date.now() - rangeMs));
         setError('');
       } catch (err) {
         setError('Failed to fetch data.');
       }
+      pending = null;
     };
 
-    fetchData();
-    const interval = setInterval(fetchData, 5000);
-    return () => clearInterval(interval);
+    setData({});
+    const close = openLiveStream(selectedDevice, selectedKeys, {
+      onOpen: fetchData,
+      onPoints: (points) => {
+        if (pending) {
+          Object.entries(points).forEach(([key, values]) => {
+            pending[key] = (pending[key] || []).concat(values);
+          });
+        }
+        setData((current) => appendNewer(current, points, Date.now() - rangeMs));
+        // Live points are not downsampled; reload the range once they would
+        // double the points per graph
+        livePoints += Object.values(points).reduce((sum, values) => sum + values.length, 0);
+        if (livePoints > GRAPH_POINTS * selectedKeys.length) {
+          fetchData();
+        }
+      },
+      // Without a live connection the range is reloaded on each retry, as
+      // the page used to poll
+      onDisconnect: fetchData,
+    });
+    return () => {
+      closed = true;
+      close();
+    };
   }, [selectedDevice, selectedKeys, timeRange]);
 
   // Handle orientation and calculate graph dimensions
@@ -0,0 +1,73 @@
+// services/liveStream.js
+// Client for the backend's live updates (GET /data/live, Server-Sent Events).
+// EventSource cannot send the Authorization header, so the stream is read
+// with fetch. The connection is reopened RETRY_MS after it fails or ends.
+import api from './api';
+
+const RETRY_MS = 5000;
+
+// Parses complete events out of buffered text; returns the unparsed rest
+const parseEvents = (text, onEvent) => {
+  const blocks = text.split('\n\n');
+  const rest = blocks.pop();
+  blocks.forEach((block) => {
+    let event = 'message';
+    const data = [];
+    block.split('\n').forEach((line) => {
+      if (line.startsWith('event:')) {
+        event = line.slice(6).trim();
+      } else if (line.startsWith('data:')) {
+        data.push(line.slice(5).trim());
+      }
+    });
+    if (data.length > 0) {
+      onEvent(event, JSON.parse(data.join('\n')));
+    }
+  });
+  return rest;
+};
+
+// Watches `keys` of `device`. Calls onOpen() each time the stream is
+// subscribed, onPoints({ key: [{ timestamp, value }] }) for new points and
+// onDisconnect() each time a connection attempt fails or ends. Returns a
+// function that closes the stream.
+export function openLiveStream(device, keys, { onOpen, onPoints, onDisconnect }) {
+  const controller = new AbortController();
+  let retryTimer = null;
+
+  const connect = async () => {
+    try {
+      const params = new URLSearchParams({ device });
+      keys.forEach((key) => params.append('keys', key));
+      const res = await fetch(`${api.defaults.baseURL}/data/live?${params}`, {
+        headers: { Authorization: api.defaults.headers.Authorization },
+        signal: controller.signal,
+      });
+      if (!res.ok) {
+        throw new Error(`HTTP ${res.status}`);
+      }
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = '';
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered = parseEvents(buffered + decoder.decode(value, { stream: true }), (event, data) => {
+          if (event === 'ready') onOpen();
+          else if (event === 'points') onPoints(data);
+        });
+      }
+    } catch (err) {
+      // Retried below unless the stream was closed
+    }
+    if (controller.signal.aborted) return;
+    onDisconnect();
+    retryTimer = setTimeout(connect, RETRY_MS);
+  };
+
+  connect();
+  return () => {
+    controller.abort();
+    clearTimeout(retryTimer);
+  };
+}
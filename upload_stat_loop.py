@@ -1,13 +1,26 @@
 #!/usr/bin/env python3
+import argparse
+import cProfile
+import pstats
 import requests
 import sys
 import time
-import subprocess
 import csv
 import os
-import requests
+import gzip
+import json
+import queue
+import threading
 import urllib3
-time.sleep(10)
+from requests.adapters import HTTPAdapter
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+from agent_stats import AgentStats
+from collectors import CollectorRunner, CollectorSchedule, load_collectors, read_plan
+from sampling import DeadbandFilter, DeadlineScheduler, WindowAggregator, read_deadbands
+from spool import Replayer, Spool
 # Suppress only the InsecureRequestWarning from urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -33,210 +46,425 @@ BASE_URL = 'https://localhost:"TODO"/api'
 # Hardcoded credentials
 USERNAME = '"TODO"'
 PASSWORD = '"TODO"'
+# Long-lived ingest token of this device (backend_script.py, "Issue Device
+# Ingest Token"); when set, the agent uploads with it instead of logging in.
+INGEST_TOKEN = ''
 
 # Default settings
+STARTUP_DELAY = 10  # in seconds, lets the backend come up first when started at boot
 DEFAULT_UPDATE_INTERVAL = 5  # in seconds
+COLLECTOR_TIMEOUT = 1.0  # seconds a collector may take (at most one tick) before its sample is skipped
 DEFAULT_DEVICE_ID = '01'
 
-def login_hardcoded():
-    """Logs in using hardcoded credentials."""
-    print("=== Auto Login ===")
+# Which keys are collected and how often comes from the collector and
+# sampleInterval columns of config.csv. Keys sampled faster than
+# DEFAULT_UPDATE_INTERVAL upload their last value plus min/max/mean/count.
+CONFIG_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.csv')
+# Keys with a deadband in config.csv are only sent when they move by more than
+# it, or after this fraction of their missingDataAllowance as a heartbeat.
+HEARTBEAT_FRACTION = 0.5
+
+# Host metric sources
+CPU_TEMP_PATH = '"TODO"/temp1_input'
+NETWORK_INTERFACE = 'wlp10s0'
+# Processes listed in Top_Processes, and the milliseconds per sample the
+# processes collector may spend reading /proc (see proc_top.py)
+TOP_PROCESSES = 3
+PROCESS_BUDGET_MS = 10
+
+# Upload settings
+UPLOAD_TIMEOUT = 10  # in seconds
+GZIP_MIN_BYTES = 256  # smaller bodies are not worth compressing
+# Upload one columnar batch per request to /data/columnar instead of one JSON
+# object per point to /data/bulk; falls back to /data/bulk on older backends.
+COLUMNAR_UPLOADS = True
+# Encode columnar batches as MessagePack (needs the msgpack package). Off by
+# default: gzipped JSON came out smaller and cheaper to parse on the backend.
+USE_MSGPACK = False
+
+# Failed batches are kept in an on-disk spool and replayed once the backend is back
+SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload_spool.bin')
+SPOOL_CAPACITY_MB = 64
+REPLAY_CHUNK_POINTS = 5000
+REPLAY_MAX_POINTS_PER_SEC = 2000  # keeps a reconnect from flooding MongoDB
+REPLAY_MAX_BACKOFF = 300  # in seconds
+UPLOAD_QUEUE_SIZE = 12  # windows waiting for the upload thread before they are spooled directly
+
+def create_session():
+    """Creates the keep-alive session shared by login and uploads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def to_columnar(points):
+    """Converts /data/bulk points into one /data/columnar batch, or None if they span machines."""
+    machine = points[0]["machine"]
+    rows = {}
+    for point in points:
+        if point["machine"] != machine:
+            return None
+        rows.setdefault(point["timestamp"], len(rows))
+    values = {}
+    aggregates = {}
+    for point in points:
+        key = point["key"]
+        column = values.get(key)
+        if column is None:
+            column = values[key] = [None] * len(rows)
+        row = rows[point["timestamp"]]
+        column[row] = point["value"]
+        if "agg" in point:
+            if key not in aggregates:
+                aggregates[key] = [None] * len(rows)
+            aggregates[key][row] = point["agg"]
+    batch = {"machine": machine, "timestamps": list(rows), "values": values}
+    if aggregates:
+        batch["agg"] = aggregates
+    return batch
+
+class BulkUploader:
+    """Posts bulk payloads over one keep-alive session, gzip-compressed.
+
+    Payloads are lists of /data/bulk points. With columnar=True they are sent
+    as one columnar batch (MessagePack-encoded if use_msgpack and msgpack is
+    installed) to /data/columnar, falling back to /data/bulk for good if the
+    backend does not have that route. Keeps running totals so the cost of
+    uploading can be reported: raw_bytes is the encoded size, wire_bytes the
+    body actually sent. on_request(seconds, wire_bytes), if set, is called
+    after every request.
+    """
+
+    def __init__(self, session, token, compress=True, columnar=False, use_msgpack=False):
+        self.session = session
+        self.compress = compress
+        self.columnar = columnar
+        self.use_msgpack = use_msgpack and msgpack is not None
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+        self.on_request = None
+        self.requests = 0
+        self.retries = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.latency_total = 0.0
+        self.last_error = None
+        self.backend_down = False
+
+    def encode(self, payload, binary=False):
+        """Serializes a payload as JSON (or MessagePack if binary), then gzips it."""
+        headers = self.headers
+        if binary:
+            body = msgpack.packb(payload, use_bin_type=True)
+            headers = dict(headers, **{"Content-Type": "application/msgpack"})
+        else:
+            body = json.dumps(payload, allow_nan=False).encode('utf-8')
+        raw_size = len(body)
+        if self.compress and raw_size >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            headers = dict(headers, **{"Content-Encoding": "gzip"})
+        return body, headers, raw_size
+
+    def post(self, payload, path='/data/bulk', binary=False):
+        """Sends one payload and returns the response."""
+        body, headers, raw_size = self.encode(payload, binary)
+        start = time.perf_counter()
+        try:
+            return self.session.post(f"{BASE_URL}{path}", data=body, headers=headers, timeout=UPLOAD_TIMEOUT)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.latency_total += elapsed
+            self.requests += 1
+            self.raw_bytes += raw_size
+            self.wire_bytes += len(body)
+            if self.on_request is not None:
+                self.on_request(elapsed, len(body))
+
+    def send(self, payload):
+        """Posts a payload; returns the HTTP status, or None if the backend was unreachable."""
+        if self.columnar:
+            batch = to_columnar(payload)
+            if batch is not None:
+                status = self._send(batch, '/data/columnar', self.use_msgpack)
+                if status != 404:
+                    return status
+                print("Backend has no /data/columnar route; uploading to /data/bulk instead.")
+                self.columnar = False
+        return self._send(payload, '/data/bulk')
+
+    def _send(self, payload, path, binary=False):
+        try:
+            response = self.post(payload, path, binary)
+        except requests.exceptions.RequestException as e:
+            self.last_error = str(e)
+            return None
+        if response.status_code != 201:
+            try:
+                self.last_error = response.json().get('message')
+            except ValueError:
+                self.last_error = response.text[:200]
+        return response.status_code
+
+    def set_token(self, token):
+        self.headers = dict(self.headers, Authorization=f"Bearer {token}")
+
+def build_payload(data, device_id, timestamp, aggregates=None):
+    """Turns {key: value} into the /data/bulk list of data points.
+
+    Keys sampled more than once in the window carry their min/max/mean/count
+    in "agg"; without aggregates the payload is the plain one-sample form.
+    """
+    payload = []
+    for key, value in data.items():
+        point = {
+            "key": key,
+            "machine": device_id,
+            "value": value,
+            "timestamp": timestamp
+        }
+        if aggregates and key in aggregates:
+            point["agg"] = aggregates[key]
+        payload.append(point)
+    return payload
+
+def login(session=None):
+    """Logs in using hardcoded credentials; returns the token or None."""
     try:
-        response = requests.post(f"{BASE_URL}/auth/login", json={
+        response = (session or requests).post(f"{BASE_URL}/auth/login", json={
             "username": USERNAME,
             "password": PASSWORD
-        })
+        }, timeout=UPLOAD_TIMEOUT)
         if response.status_code == 200:
             token = response.json().get('token')
             if token:
-                print("Login successful!")
                 return token
-            else:
-                print("Login failed: No token received.")
-                sys.exit(1)
+            print("Login failed: No token received.")
         else:
             print(f"Login failed: {response.json().get('message')}")
-            sys.exit(1)
     except requests.exceptions.RequestException as e:
         print(f"An error occurred during login: {e}")
+    return None
+
+def login_hardcoded(session=None):
+    """Returns the ingest token if set, else logs in using hardcoded credentials, exiting on failure."""
+    if INGEST_TOKEN:
+        print("Using the device ingest token.")
+        return INGEST_TOKEN
+    print("=== Auto Login ===")
+    token = login(session)
+    if not token:
         sys.exit(1)
+    print("Login successful!")
+    return token
 
-def get_cpu_temperature():
-    """Reads CPU temperature from sysfs and converts to Celsius."""
-    try:
-        with open('"TODO"/temp1_input', 'r') as f:
-            temp_str = f.read().strip()
-            temp_millidegree = int(temp_str)
-            temp_celsius = temp_millidegree / 1000.0
-            return temp_celsius
-    except FileNotFoundError:
-        print("CPU temperature file not found.")
-        return None
-    except Exception as e:
-        print(f"Error reading CPU temperature: {e}")
-        return None
-
-def get_gpu_metrics():
-    """Uses nvidia-smi to get GPU metrics."""
+class UploadWorker:
+    """Uploads windows from a queue on a background thread.
+
+    The sampling loop only enqueues, so a slow or unreachable backend never
+    delays the next sample. When the queue is full the window goes straight
+    to the spool.
+    """
+
+    def __init__(self, uploader, spool, replayer, device_id, max_pending=UPLOAD_QUEUE_SIZE):
+        self.uploader = uploader
+        self.spool = spool
+        self.replayer = replayer
+        self.device_id = device_id
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name='uploader', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, window, timestamp):
+        """Queues a reduced window for upload without blocking."""
+        try:
+            self.queue.put_nowait((window, timestamp))
+        except queue.Full:
+            data, aggregates = split_window(window)
+            self.spool.append(build_payload(data, self.device_id, timestamp, aggregates))
+
+    def stop(self, timeout=None):
+        """Uploads what is already queued, then stops the thread."""
+        self.queue.put((None, None))
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            window, timestamp = self.queue.get()
+            if window is None:
+                break
+            try:
+                upload_window(self.uploader, self.spool, self.replayer, window, self.device_id, timestamp)
+            except Exception as e:
+                print(f"[{timestamp}] Unexpected error while uploading metrics: {e}")
+
+def upload_metrics(token, device_id, session=None, max_ticks=None, stats=None):
+    """Collects metrics and uploads them to the server.
+
+    Runs forever unless max_ticks is given; then returns the AgentStats once
+    the queued uploads are done.
+    """
+    stats = stats or AgentStats()
+    uploader = BulkUploader(session or create_session(), token, columnar=COLUMNAR_UPLOADS, use_msgpack=USE_MSGPACK)
+    uploader.on_request = stats.record_upload
+    stats.uploader = uploader
+    spool = Spool(SPOOL_PATH, SPOOL_CAPACITY_MB * 1024 * 1024)
     try:
-        cmd = [
-            'nvidia-smi',
-            '--query-gpu=temperature.gpu,utilization.gpu,clocks.current.sm,clocks.current.memory,clocks.current.video,clocks.current.graphics,power.draw,memory.used',
-            '--format=csv,noheader,nounits'
-        ]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        metrics = result.stdout.strip().split(', ')
-        if len(metrics) < 8:
-            print("Unexpected GPU metrics format.")
-            return None
-        gpu_temperature = float(metrics[0])
-        gpu_utilization = float(metrics[1])
-        sm_clock = float(metrics[2])
-        memory_clock = float(metrics[3])
-        video_clock = float(metrics[4])
-        graphics_clock = float(metrics[5])
-        power_draw = float(metrics[6])
-        memory_used = float(metrics[7])
-        
-        return {
-            "GPU_Temperature": gpu_temperature,
-            "GPU_Utilization": gpu_utilization,
-            "SM_Clock": sm_clock,
-            "Memory_Clock": memory_clock,
-            "MAX_Video_Graphic_Clock": max(video_clock, graphics_clock),
-            "Power_Draw": power_draw,
-            "GPU_Memory_Usage": memory_used  # This will be overridden by actual SYS memory usage
+        replayer = Replayer(spool, uploader.send, chunk_points=REPLAY_CHUNK_POINTS,
+                            max_points_per_sec=REPLAY_MAX_POINTS_PER_SEC, max_backoff=REPLAY_MAX_BACKOFF)
+        if spool.points:
+            print(f"Replaying {spool.points} spooled data points from {SPOOL_PATH}.")
+        plan = read_plan(CONFIG_CSV_PATH)
+        if not plan:
+            print(f"No collectors are enabled in {CONFIG_CSV_PATH}.")
+            return stats
+        context = {
+            'cpu_temp_path': CPU_TEMP_PATH,
+            'network_interface': NETWORK_INTERFACE,
+            'top_processes': TOP_PROCESSES,
+            'process_budget_ms': PROCESS_BUDGET_MS,
+            'replayer': replayer,
+            'agent_stats': stats
         }
-    except subprocess.CalledProcessError as e:
-        print(f"Error fetching GPU metrics: {e.stderr}")
-        return None
-    except Exception as e:
-        print(f"Unexpected error fetching GPU metrics: {e}")
-        return None
-def get_network_transmit_bytes(interface='wlp10s0'):
-    """Gets the number of transmitted bytes for the specified network interface."""
-    try:
-        with open('/proc/net/dev', 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                if interface in line:
-                    data = line.split()
-                    # The 9th column is the transmitted bytes
-                    return int(data[9]) + int(data[1]) 
-        return None
-    except Exception as e:
-        print(f"Error reading network statistics: {e}")
-        return None
-
-def calculate_network_speed(initial_tx_bytes, current_tx_bytes, interval=1):
-    """Calculates the network transmission speed in MB/s."""
-    # Calculate speed in MBps
-    speed_mbps = (current_tx_bytes - initial_tx_bytes) / (interval * 1024 * 1024)
-    return speed_mbps
-
-def get_sys_memory_usage():
-    """Uses free to get system memory usage in GB (excluding cached)."""
-    try:
-        result = subprocess.run(['free', '-m'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        lines = result.stdout.strip().split('\n')
-        mem_line = next((line for line in lines if line.startswith('Mem:')), None)
-        if mem_line:
-            parts = mem_line.split()
-            # total_mem = float(parts[1])  # Total memory in GB
-            used_mem = float(parts[2]) / float(1024)  # Used memory in GB
-            # Excluding cached memory if needed
-            return used_mem
-        else:
-            print("Memory information not found.")
-            return None
-    except subprocess.CalledProcessError as e:
-        print(f"Error fetching memory usage: {e.stderr}")
-        return None
-    except Exception as e:
-        print(f"Unexpected error fetching memory usage: {e}")
-        return None
-
-def upload_metrics(token, device_id):
-    """Collects metrics and uploads them to the server."""
-    prev_tx_bytes = get_network_transmit_bytes()
-    last_timestamp = time.time()
-    TOTAL_fail = 0
-    while True:
-        data = {}
-        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-
-        # Get CPU Temperature
-        cpu_temp = get_cpu_temperature()
-        # print(cpu_temp)
-        if cpu_temp is not None:
-            data["CPU_Temperature"] = cpu_temp
-        sys_mem = get_sys_memory_usage()
-        if sys_mem is not None:
-            data["SYS_Memory_Usage"] = sys_mem
-
-        # Get GPU Metrics
-        gpu_metrics = get_gpu_metrics()
-        # print(gpu_metrics)
-        if gpu_metrics:
-            # Overriding SYS_Memory_Usage with actual system memory usage
-
-            # Remove LOG as per requirement
-            if "LOG" in data:
-                del data["LOG"]
-
-            # Exclude LOG key
-            # Note: Assuming LOG is handled separately
-            # If LOG needs to be updated, implement separately
-
-            # Prepare payload
-            for key, value in gpu_metrics.items():
-                if key != "LOG":
-                    data[key] = value
-        current_tx_bytes = get_network_transmit_bytes()
-        current_timestamp = time.time()
-        if current_tx_bytes is not None and prev_tx_bytes is not None:
-            interval = current_timestamp - last_timestamp
-            net_speed = calculate_network_speed(prev_tx_bytes, current_tx_bytes, interval)
-            data["Network_Transmit_Speed_MBps"] = net_speed
-        prev_tx_bytes = current_tx_bytes
-        last_timestamp = current_timestamp
-        # Prepare data payload
-        payload = []
-        for key, value in data.items():
-            payload.append({
-                "key": key,
-                "machine": device_id,
-                "value": value,
-                "timestamp": timestamp
-            })
-
-        # Send data
+        schedule = CollectorSchedule(plan)
+        tick = schedule.tick
+        runner = CollectorRunner(load_collectors(plan, context), default_timeout=min(COLLECTOR_TIMEOUT, tick),
+                                 on_timing=stats.record_collector)
+        worker = UploadWorker(uploader, spool, replayer, device_id).start()
+        samples_per_upload = max(1, round(DEFAULT_UPDATE_INTERVAL / tick))
+        scheduler = DeadlineScheduler(tick)
+        aggregator = WindowAggregator()
+        deadband = DeadbandFilter(*read_deadbands(CONFIG_CSV_PATH, HEARTBEAT_FRACTION))
+        samples = 0
+        ticks = 0
         try:
-            response = requests.post(f"{BASE_URL}/data/bulk",  # Assuming a bulk endpoint exists
-                                     headers={"Authorization": f"Bearer {token}"},
-                                     json=payload)
-            if response.status_code == 201:
-                # print(f"[{timestamp}] Metrics uploaded successfully.")
-                pass
-            else:
-                print(f"[{timestamp}] Failed to upload metrics: {response.json().get('message')}")
-                TOTAL_fail += 1
-        except requests.exceptions.RequestException as e:
-            print(f"[{timestamp}] An error occurred while uploading metrics: {e}")
-            TOTAL_fail += 1
-
-        # Wait for the next update
-        time.sleep(DEFAULT_UPDATE_INTERVAL)
-        if TOTAL_fail >= 5:
-            print("Failed to upload metrics 5 times. Exiting...")
-            break
+            while True:
+                tick_start = time.perf_counter()
+                timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+                # Every collector that is due runs concurrently; one that misses its
+                # deadline leaves a gap. Only the due keys go into the window.
+                due = schedule.due()
+                due_keys = set().union(*due.values())
+                data = runner.run([name for name in runner.collectors if name in due])
+                aggregator.add({key: value for key, value in data.items() if key in due_keys})
+                samples += 1
+                if samples >= samples_per_upload:
+                    samples = 0
+                    window = deadband.filter(aggregator.flush())
+                    if window:
+                        worker.submit(window, timestamp)
+                stats.record_tick(time.perf_counter() - tick_start)
+                ticks += 1
+                if ticks == max_ticks:
+                    # Upload the partial window before returning
+                    window = deadband.filter(aggregator.flush())
+                    if window:
+                        worker.submit(window, timestamp)
+                    break
+
+                # Wait for the next sample
+                scheduler.wait()
+        finally:
+            worker.stop(timeout=2 * UPLOAD_TIMEOUT)
+            runner.shutdown()
+    finally:
+        spool.close()
+    return stats
+
+def split_window(window):
+    """Splits a reduced window into ({key: last}, {key: aggregate})."""
+    data = {key: last for key, (last, aggregate) in window.items()}
+    aggregates = {key: aggregate for key, (last, aggregate) in window.items() if aggregate}
+    return data, aggregates
+
+def upload_window(uploader, spool, replayer, window, device_id, timestamp):
+    """Uploads one reduced window; batches the backend could not take go to the spool."""
+    data, aggregates = split_window(window)
+    # Prepare data payload
+    payload = build_payload(data, device_id, timestamp, aggregates)
+
+    # Send data
+    status = uploader.send(payload)
+    if status in (401, 403) and not INGEST_TOKEN:
+        # The token expired; log in again and retry once
+        new_token = login(uploader.session)
+        if new_token:
+            uploader.set_token(new_token)
+            uploader.retries += 1
+            status = uploader.send(payload)
+    if status == 201:
+        if uploader.backend_down:
+            print(f"[{timestamp}] Backend is back; replaying {spool.points} spooled data points.")
+            uploader.backend_down = False
+            replayer.resume()
+        replayer.step()
+    elif status is None or status >= 500 or status in Replayer.RETRYABLE:
+        if not uploader.backend_down:
+            print(f"[{timestamp}] Failed to upload metrics ({uploader.last_error}); spooling to {SPOOL_PATH}.")
+            uploader.backend_down = True
+        spool.append(payload)
+    else:
+        print(f"[{timestamp}] Failed to upload metrics: {uploader.last_error}")
+
+def profile_ticks(token, device_id, session, ticks, output=None):
+    """Runs a number of ticks under cProfile and prints the hottest functions and the agent stats."""
+    # The collectors and the uploader run on their own threads, which the
+    # main thread's profiler does not see; give every new thread its own.
+    thread_profilers = []
+
+    def profile_thread(frame, event, arg):
+        profiler = cProfile.Profile()
+        thread_profilers.append(profiler)
+        profiler.enable()
+
+    threading.setprofile(profile_thread)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        stats = upload_metrics(token, device_id, session, max_ticks=ticks)
+    finally:
+        profiler.disable()
+        threading.setprofile(None)
+
+    report = pstats.Stats(profiler)
+    for thread_profiler in thread_profilers:
+        thread_profiler.disable()
+        report.add(thread_profiler)
+    if output:
+        report.dump_stats(output)
+        print(f"Saved profile to {output}")
+    report.sort_stats('cumulative').print_stats(30)
+    print(stats.report())
+
 def main():
+    parser = argparse.ArgumentParser(description="Automated System Monitor and Uploader")
+    parser.add_argument('--profile', type=int, metavar='TICKS',
+                        help="run TICKS sampling ticks under cProfile, print a report and exit")
+    parser.add_argument('--profile-output', metavar='FILE', help="also save the raw profile for pstats/snakeviz")
+    args = parser.parse_args()
+
+    if args.profile:
+        session = create_session()
+        token = INGEST_TOKEN or login(session)
+        if not token:
+            print("Profiling without a backend; uploads will be spooled.")
+        profile_ticks(token, DEFAULT_DEVICE_ID, session, args.profile, args.profile_output)
+        return
+
+    time.sleep(STARTUP_DELAY)
     print("Welcome to the Automated System Monitor and Uploader")
-    token = login_hardcoded()
+    session = create_session()
+    token = login_hardcoded(session)
     
     # Start uploading metrics
     print(f"Starting to upload metrics every {DEFAULT_UPDATE_INTERVAL} seconds for device ID '{DEFAULT_DEVICE_ID}'...")
-    upload_metrics(token, DEFAULT_DEVICE_ID)
+    upload_metrics(token, DEFAULT_DEVICE_ID, session)
 
 if __name__ == "__main__":
     main()